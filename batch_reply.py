@@ -1,75 +1,249 @@
+import asyncio
+import cProfile
 import json
+import pstats
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
+import threading
+import time
+import tracing
+from jsonl_io import iter_records, append_record, load_completed_ids
 from parrot_bot import ParrotBot
 
 
-def batch_replay(input_file: str, output_file: str = None):
+def replay_dialogue(bot, dialogue):
     """
-    Run a batch of multi-turn dialogues through the dialogue system.
-    Keeps both system-generated responses and ground-truth assistant utterances.
+    Replay a single multi-turn dialogue through `bot`.
+    The bot is reset first, so every dialogue starts from an empty history.
+    Returns the list of per-turn results (generated + ground-truth replies).
     """
+    bot.reset()
+    dialogue_result = []
 
-    # Load test dialogues
-    with open(input_file, "r", encoding="utf-8") as f:
-        test_dialogues = json.load(f)
+    for turn_idx, turn in enumerate(dialogue, start=1):
+        speaker = turn["speaker"]
+        utterance = turn["utterance"]
 
-    print(f"Running batch replay with {len(test_dialogues)} dialogues...\n")
+        if speaker.lower() == "user":
+            # Record user utterance
+            bot.append_turn("user", utterance)
 
-    bot = ParrotBot()
-    all_results = []
+            # System response
+            result = bot.chat(utterance)
+            generated_reply = result["text"]
 
-    for d_idx, dialogue in enumerate(test_dialogues, start=1):
-        print(f"--- Start of Dialogue {d_idx} ---\n")
-        bot.reset()
-        dialogue_result = []
-
-        for turn_idx, turn in enumerate(dialogue, start=1):
-            speaker = turn["speaker"]
-            utterance = turn["utterance"]
-
-            if speaker.lower() == "user":
-                # Record user utterance
-                bot.append_turn("user", utterance)
-                print(f"[{turn_idx}] User: {utterance}")
-
-                # System response
-                result = bot.chat(utterance)
-                generated_reply = result["text"]
-
-                # Find ground-truth reply (if exists next)
-                gt_reply = None
-                if turn_idx < len(dialogue) and dialogue[turn_idx]["speaker"] == "assistant":
-                    gt_reply = dialogue[turn_idx]["utterance"]
-
-                # Append both generated and ground-truth responses
-                dialogue_result.append({
-                    "user_utterance": utterance,
-                    "ground_truth": gt_reply,
-                    "system_response": generated_reply,
-                    "meta": {k: v for k, v in result.items() if k != "text"},
-                    "timestamp": datetime.now().strftime("%H:%M:%S")
-                })
-
-                bot.append_turn("assistant", generated_reply)
-                print(f"     Bot: {generated_reply}\n")
-
-        all_results.append({
-            "dialogue_id": d_idx,
-            "turns": dialogue_result
-        })
-        print(f"--- End of Dialogue {d_idx} ---\n")
+            # Find ground-truth reply (if exists next)
+            gt_reply = None
+            if turn_idx < len(dialogue) and dialogue[turn_idx]["speaker"] == "assistant":
+                gt_reply = dialogue[turn_idx]["utterance"]
+
+            # Append both generated and ground-truth responses
+            dialogue_result.append({
+                "user_utterance": utterance,
+                "ground_truth": gt_reply,
+                "system_response": generated_reply,
+                "meta": {k: v for k, v in result.items() if k != "text"},
+                "timestamp": datetime.now().strftime("%H:%M:%S")
+            })
+
+            bot.append_turn("assistant", generated_reply)
+
+    return dialogue_result
+
+
+def _print_dialogue(d_idx, dialogue, dialogue_result):
+    """Print a finished dialogue as a single block, so concurrent runs don't interleave."""
+    print(f"--- Start of Dialogue {d_idx} ---\n")
+    results = iter(dialogue_result)
+    for turn_idx, turn in enumerate(dialogue, start=1):
+        if turn["speaker"].lower() == "user":
+            result = next(results)
+            print(f"[{turn_idx}] User: {result['user_utterance']}")
+            print(f"     Bot: {result['system_response']}\n")
+    print(f"--- End of Dialogue {d_idx} ---\n")
+
+
+def _make_worker(bot_factory, profilers=None):
+    """
+    Build the per-dialogue job for the worker pool.
+    Each worker thread lazily creates its own bot and reuses it across dialogues,
+    so expensive set-up (e.g. loading a knowledge base) happens once per thread.
+    With a `profilers` list, each thread also profiles its replays with its own
+    cProfile.Profile (cProfile only sees the thread it runs on) and adds it to the list.
+    """
+    local = threading.local()
+
+    def run(job):
+        d_idx, dialogue = job
+        bot = getattr(local, "bot", None)
+        if bot is None:
+            bot = local.bot = bot_factory()
+        if profilers is None:
+            return d_idx, dialogue, replay_dialogue(bot, dialogue)
+        profiler = getattr(local, "profiler", None)
+        if profiler is None:
+            profiler = local.profiler = cProfile.Profile()
+            profilers.append(profiler)
+        profiler.enable()
+        try:
+            return d_idx, dialogue, replay_dialogue(bot, dialogue)
+        finally:
+            profiler.disable()
+
+    return run
+
+
+def _run_serial(run, jobs):
+    for job in jobs:
+        yield run(job)
+
+
+def _run_threads(run, jobs, workers):
+    """Run jobs on a thread pool, yielding results in input order with a bounded window."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(run, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _run_asyncio(run, jobs, workers):
+    """Same contract as `_run_threads`, but scheduled from an asyncio event loop."""
+    loop = asyncio.new_event_loop()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for job in jobs:
+            pending.append(loop.run_in_executor(pool, run, job))
+            if len(pending) >= 2 * workers:
+                yield loop.run_until_complete(pending.popleft())
+        while pending:
+            yield loop.run_until_complete(pending.popleft())
+    finally:
+        pool.shutdown(wait=True)
+        loop.close()
+
+
+def _report_profile(profilers, stage_stats, profile: str):
+    """Write the merged cProfile stats and the stage flame graph input, and print the hottest functions."""
+    stats = pstats.Stats(*profilers)
+    stats.dump_stats(profile + ".prof")
+    stage_stats.write_folded(profile + ".folded")
+    print(f"Profile saved to {profile}.prof (pstats, snakeviz) and stage stacks to {profile}.folded "
+          f"(flamegraph.pl, speedscope)")
+    stats.sort_stats("cumulative").print_stats(15)
+
+
+def batch_replay(input_file: str, output_file: str = None, bot_factory=ParrotBot,
+                 workers: int = 1, executor: str = "thread",
+                 stream: bool = False, resume: bool = False,
+                 trace: bool = False, profile: str = None):
+    """
+    Run a batch of multi-turn dialogues through the dialogue system.
+    Keeps both system-generated responses and ground-truth assistant utterances.
+
+    bot_factory: callable returning a DialogueSystem (e.g. GPTBot or RAGBot).
+    workers: number of dialogues replayed in parallel; 1 keeps the serial loop.
+    executor: "thread" or "asyncio", the pool used when workers > 1.
+    stream: read the input lazily (JSONL or JSON array) and write one JSONL line
+        per dialogue as soon as it finishes, instead of one JSON document at the end.
+    resume: with stream=True, skip dialogue_ids already present in output_file.
+    trace: time each turn's stages (see tracing); the timings are kept in every turn's
+        meta["stages_ms"] and summarised as per-stage p50/p95/p99 at the end.
+    profile: also run cProfile over the replays (implies trace) and write <profile>.prof
+        plus <profile>.folded, the per-stage folded stacks for a flame graph.
+    Results are always written in input order.
+    """
+    if executor not in ("thread", "asyncio"):
+        raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'asyncio'.")
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    if resume and not (stream and output_file):
+        raise ValueError("resume requires stream=True and an explicit output_file.")
 
-    # Save to file
     os.makedirs("logs", exist_ok=True)
     if output_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = os.path.join("logs", f"batch_output_{timestamp}.json")
+        extension = "jsonl" if stream else "json"
+        output_file = os.path.join("logs", f"batch_output_{timestamp}.{extension}")
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(all_results, f, indent=4, ensure_ascii=False)
+    # Load test dialogues
+    done_ids = set()
+    if stream:
+        test_dialogues = iter_records(input_file)
+        if resume:
+            done_ids = load_completed_ids(output_file)
+            print(f"Resuming: {len(done_ids)} dialogues already in {output_file}")
+        print(f"Running streaming batch replay from {input_file}...\n")
+    else:
+        test_dialogues = list(iter_records(input_file))
+        print(f"Running batch replay with {len(test_dialogues)} dialogues...\n")
+
+    profilers = [] if profile else None
+    stage_stats = tracing.StageStats()
+    tracing_was_enabled = tracing.enabled()
+    if trace or profile:
+        tracing.enable()
+
+    run = _make_worker(bot_factory, profilers)
+    jobs = ((d_idx, dialogue) for d_idx, dialogue in enumerate(test_dialogues, start=1)
+            if d_idx not in done_ids)
+    if workers == 1:
+        results = _run_serial(run, jobs)
+    elif executor == "thread":
+        results = _run_threads(run, jobs, workers)
+    else:
+        results = _run_asyncio(run, jobs, workers)
 
+    all_results = []
+    num_dialogues = 0
+    num_turns = 0
+    start_time = time.perf_counter()
+
+    sink = open(output_file, "a" if resume else "w", encoding="utf-8") if stream else None
+    try:
+        for d_idx, dialogue, dialogue_result in results:
+            _print_dialogue(d_idx, dialogue, dialogue_result)
+            num_dialogues += 1
+            num_turns += len(dialogue_result)
+            for turn in dialogue_result:
+                if "stages_ms" in turn["meta"]:
+                    stage_stats.add(turn["meta"]["stages_ms"])
+            record = {
+                "dialogue_id": d_idx,
+                "turns": dialogue_result
+            }
+            if sink is not None:
+                append_record(sink, record)
+            else:
+                all_results.append(record)
+    finally:
+        if sink is not None:
+            sink.close()
+        tracing.enable(tracing_was_enabled)
+
+    elapsed = time.perf_counter() - start_time
+
+    # Save to file
+    if not stream:
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, indent=4, ensure_ascii=False)
+
+    mode = "serial" if workers == 1 else f"{executor} pool, {workers} workers"
+    print(f"Replayed {num_dialogues} dialogues ({num_turns} turns) in {elapsed:.2f}s "
+          f"[{mode}]: {num_dialogues / max(elapsed, 1e-9):.2f} dialogues/sec, "
+          f"{num_turns / max(elapsed, 1e-9):.2f} turns/sec")
     print(f"Batch replay completed. Results saved to {output_file}\n")
+    if stage_stats.turns:
+        print(f"Per-stage latency over {stage_stats.turns} turns:")
+        print(stage_stats.format() + "\n")
+    if profilers:
+        _report_profile(profilers, stage_stats, profile)
     return output_file
 
 
@@ -0,0 +1,93 @@
+import argparse
+import difflib
+import json
+import random
+import string
+import time
+from gelato_api import CatalogueMatcher, CONTAINERS, SIZES, flavor_colors
+
+
+def difflib_top1(catalogue, values):
+    """The original find_most_similar: one get_close_matches call per value."""
+    matches = []
+    for value in values:
+        best = difflib.get_close_matches(value, catalogue, n=1, cutoff=0.0)
+        matches.append(best[0] if best else None)
+    return matches
+
+
+def perturb(text: str, rng: random.Random) -> str:
+    """A plausible customer spelling: casing changes, dropped words, typos."""
+    words = text.split()
+    if len(words) > 1 and rng.random() < 0.3:
+        words = rng.sample(words, rng.randint(1, len(words) - 1))
+    text = " ".join(words)
+    if rng.random() < 0.5:
+        text = text.lower()
+    chars = list(text)
+    for _ in range(rng.randint(0, 2)):
+        if chars:
+            chars[rng.randrange(len(chars))] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def synthetic_menu(size: int, rng: random.Random):
+    words = ["Vanilla", "Chocolate", "Salted", "Caramel", "Pistachio", "Hazelnut", "Raspberry", "Mango",
+             "Lemon", "Sorbet", "Honey", "Fig", "Ripple", "Cookie", "Dough", "Coffee", "Mint", "Chip",
+             "Coconut", "Cherry", "Almond", "Praline", "Yoghurt", "Stracciatella", "(vegan)"]
+    menu = set(flavor_colors)
+    while len(menu) < size:
+        menu.add(" ".join(rng.sample(words, rng.randint(1, 4))))
+    return sorted(menu)
+
+
+def compare(name: str, catalogue, values, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        expected = difflib_top1(catalogue, values)
+    before = (time.perf_counter() - start) / (repeats * len(values))
+
+    matcher = CatalogueMatcher(catalogue, memo_size=0)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        got = matcher.match_many(values)
+    after = (time.perf_counter() - start) / (repeats * len(values))
+
+    memoised = CatalogueMatcher(catalogue)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        memoised.match_many(values)
+    cached = (time.perf_counter() - start) / (repeats * len(values))
+
+    mismatches = sum(a != b for a, b in zip(expected, got))
+    print(f"{name:<28} {len(catalogue):>6} {1e6 * before:>12.1f} {1e6 * after:>12.1f} {1e6 * cached:>12.2f} {mismatches:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalogue normalisation: difflib per value vs CatalogueMatcher.")
+    parser.add_argument("--data", default="huggingface_demo/dialogue_data.json")
+    parser.add_argument("--menu-size", type=int, default=500)
+    parser.add_argument("--values", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # Slot values as the parsers produce them, from the gold dialogue states
+    with open(args.data, "r", encoding="utf-8") as f:
+        dialogues = json.load(f)
+    states = [t["state"] for d in dialogues for t in d if t.get("state")]
+    flavours = [v for s in states for v in s.get("flavours", [])]
+    sizes = [s["size"] for s in states if s.get("size")]
+    containers = [s["container"] for s in states if s.get("container")]
+
+    print(f"{'catalogue':<28} {'size':>6} {'difflib us':>12} {'matcher us':>12} {'memoised us':>12} {'mismatches':>10}")
+    compare("flavours (dialogue data)", list(flavor_colors), flavours, args.repeats)
+    compare("sizes (dialogue data)", list(SIZES), sizes, args.repeats)
+    compare("containers (dialogue data)", CONTAINERS, containers, args.repeats)
+    menu = synthetic_menu(args.menu_size, rng)
+    compare("synthetic menu, typos", menu, [perturb(rng.choice(menu), rng) for _ in range(args.values)], args.repeats)
+
+
+if __name__ == "__main__":
+    main()
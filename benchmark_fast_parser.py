@@ -0,0 +1,77 @@
+import argparse
+import json
+import time
+from gelato_api import get_matcher, flavor_colors, SIZES, CONTAINERS
+from gelato_fast_parser import EMPTY_ORDER, FastOrderParser
+
+
+def customer_turns(data_path: str):
+    """(dialogue history up to the turn, previous gold state, utterance, gold state) for every customer turn."""
+    with open(data_path, "r", encoding="utf-8") as f:
+        dialogues = json.load(f)
+    for dialogue in dialogues:
+        previous = EMPTY_ORDER
+        for i, turn in enumerate(dialogue):
+            if turn["speaker"] == "customer" and "state" in turn:
+                yield dialogue[:i + 1], previous, turn["utterance"], turn["state"]
+                previous = turn["state"]
+
+
+def canonical_state(state):
+    """Map slot values onto the menu, so "Gianduja" and "Gianduja (vegan)" compare equal."""
+    flavours = get_matcher(flavor_colors).match_many(state.get("flavours", []))
+    size = get_matcher(SIZES).match(state["size"]) if state.get("size") else ""
+    container = get_matcher(CONTAINERS).match(state["container"]) if state.get("container") else ""
+    return flavours, size, container
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-path order parser: hit rate and accuracy on the dialogue data.")
+    parser.add_argument("--data", default="huggingface_demo/dialogue_data.json")
+    parser.add_argument("--threshold", type=float, default=0.8, help="minimum confidence to skip the fallback parser")
+    parser.add_argument("--t5-model", default=None,
+                        help="GelatoParsingModel checkpoint to use as the fallback (default: gold state, i.e. a perfect fallback)")
+    parser.add_argument("--show-errors", type=int, default=0, help="print this many confident but wrong parses")
+    args = parser.parse_args()
+
+    fallback_model = None
+    if args.t5_model:
+        from huggingface_demo.parsing_models import GelatoParsingModel
+        fallback_model = GelatoParsingModel(model_path=args.t5_model)
+
+    fast_parser = FastOrderParser()
+    turns = list(customer_turns(args.data))
+    hits = correct_hits = correct_all = fallback_correct = 0
+    fast_seconds = 0.0
+    errors = []
+    for history, previous, utterance, gold in turns:
+        start = time.perf_counter()
+        order, confidence = fast_parser.parse(previous, utterance)
+        fast_seconds += time.perf_counter() - start
+        right = canonical_state(order) == canonical_state(gold)
+        correct_all += right
+        if confidence >= args.threshold:
+            hits += 1
+            correct_hits += right
+            if not right:
+                errors.append((previous, utterance, order, gold, confidence))
+        elif fallback_model is not None:
+            fallback_correct += canonical_state(fallback_model.predict(history)) == canonical_state(gold)
+        else:
+            fallback_correct += 1
+
+    n = len(turns)
+    print(f"Customer turns: {n} (previous state: gold)")
+    print(f"Fast-path hit rate:          {hits / n:.1%} ({hits} turns skip the fallback parser, threshold {args.threshold})")
+    print(f"Joint accuracy on hits:      {correct_hits / max(hits, 1):.1%}")
+    print(f"Joint accuracy, rules only:  {correct_all / n:.1%} (every turn parsed by the fast path)")
+    fallback_name = "T5 fallback" if fallback_model is not None else "perfect fallback"
+    print(f"Joint accuracy with {fallback_name}: {(correct_hits + fallback_correct) / n:.1%}")
+    print(f"Fast-path cost: {1e6 * fast_seconds / n:.0f} us/turn")
+
+    for previous, utterance, order, gold, confidence in errors[:args.show_errors]:
+        print(f"\n  previous: {previous}\n  customer: {utterance}\n  parsed:   {order} ({confidence:.2f})\n  gold:     {gold}")
+
+
+if __name__ == "__main__":
+    main()
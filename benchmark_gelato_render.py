@@ -0,0 +1,59 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from PIL import ImageChops
+from gelato_api import GelatoRenderer, draw_ice_cream, draw_ice_cream_image
+
+
+def random_orders(renderer: GelatoRenderer, n: int, seed: int):
+    catalogue = list(renderer.catalogue())
+    rng = random.Random(seed)
+    return [rng.choice(catalogue) for _ in range(n)]
+
+
+def renders_per_sec(render, orders) -> float:
+    start = time.perf_counter()
+    for order in orders:
+        render(*order)
+    return len(orders) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gelato image renders/sec: draw + save to disk vs in-memory renderer.")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="check the renderer is pixel-identical over the whole catalogue")
+    args = parser.parse_args()
+
+    renderer = GelatoRenderer(max_entries=10000)
+    orders = random_orders(renderer, args.orders, args.seed)
+
+    if args.verify:
+        mismatches = sum(ImageChops.difference(draw_ice_cream_image(*order), renderer.render_image(*order).convert("RGB")).getbbox() is not None
+                         for order in renderer.catalogue())
+        print(f"Pixel mismatches over the catalogue: {mismatches}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        img_path = os.path.join(workdir, "ice_cream.png")
+        before = renders_per_sec(lambda *order: draw_ice_cream(*order, img_path=img_path), orders)
+    uncached = GelatoRenderer(max_entries=0)
+    sprites = renders_per_sec(uncached.render, orders)
+    cold = renders_per_sec(renderer.render, orders)
+
+    start = time.perf_counter()
+    warm_renderer = GelatoRenderer(max_entries=10000)
+    warm_renderer.prewarm()
+    prewarm_s = time.perf_counter() - start
+    warm = renders_per_sec(warm_renderer.render, orders)
+
+    print(f"{args.orders} random orders from a catalogue of {len(list(renderer.catalogue()))} combinations\n")
+    print(f"draw_ice_cream (draw + save PNG to disk): {before:>10.0f} renders/sec")
+    print(f"GelatoRenderer, sprites, no cache:        {sprites:>10.0f} renders/sec")
+    print(f"GelatoRenderer, LRU filling up:           {cold:>10.0f} renders/sec (hit rate {renderer.stats()['hit_rate']:.0%})")
+    print(f"GelatoRenderer, pre-warmed:               {warm:>10.0f} renders/sec (prewarm took {prewarm_s:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
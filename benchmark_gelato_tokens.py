@@ -0,0 +1,60 @@
+import argparse
+import contextlib
+import json
+import os
+import openai_clients
+from fake_openai import FakeBackend, FakeOpenAI, Latency
+from gelato_bot import GelatoBot
+
+
+def customer_sessions(data_path: str, chain: int):
+    """Customer utterances per session; `chain` dialogues are joined into one long session."""
+    with open(data_path, "r", encoding="utf-8") as f:
+        dialogues = json.load(f)
+    utterances = [[t["utterance"] for t in d if t["speaker"] == "customer"] for d in dialogues]
+    for start in range(0, len(utterances), chain):
+        yield [u for dialogue in utterances[start:start + chain] for u in dialogue]
+
+
+def tokens_per_turn(data_path: str, chain: int, **bot_kwargs):
+    """Mean prompt tokens (parse + reply) at each turn index, replayed against the fake backend."""
+    backend = FakeBackend(latency=Latency("fixed", 0.0))
+    openai_clients.set_client(FakeOpenAI(backend))
+    totals, counts = [], []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for session in customer_sessions(data_path, chain):
+            bot = GelatoBot(**bot_kwargs)
+            for turn_idx, utterance in enumerate(session):
+                before = len(backend.prompt_tokens)
+                bot.chat(utterance)
+                tokens = sum(backend.prompt_tokens[before:])
+                if turn_idx == len(totals):
+                    totals.append(0)
+                    counts.append(0)
+                totals[turn_idx] += tokens
+                counts[turn_idx] += 1
+    openai_clients.reset_clients()
+    return [t / c for t, c in zip(totals, counts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens per turn: full re-parse vs incremental state tracking.")
+    parser.add_argument("--data", default="huggingface_demo/dialogue_data.json")
+    parser.add_argument("--chain", type=int, default=4, help="dialogues joined into one session, to simulate long orders")
+    parser.add_argument("--max-context-turns", type=int, default=6)
+    args = parser.parse_args()
+
+    full = tokens_per_turn(args.data, args.chain)
+    incremental = tokens_per_turn(args.data, args.chain, state_tracking="incremental",
+                                  max_context_turns=args.max_context_turns)
+
+    print(f"Prompt tokens per turn (parse + reply), sessions of {args.chain} chained dialogues\n")
+    print(f"{'turn':>4} {'full':>8} {'incremental':>12}")
+    for turn_idx, (a, b) in enumerate(zip(full, incremental), start=1):
+        print(f"{turn_idx:>4} {a:>8.0f} {b:>12.0f}")
+    print(f"\nTotal per session: full {sum(full):.0f}, incremental {sum(incremental):.0f} "
+          f"({100 * (1 - sum(incremental) / sum(full)):.0f}% fewer prompt tokens)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import contextlib
+import os
+import random
+import time
+import openai_clients
+from fake_openai import FakeBackend, FakeOpenAI, Latency
+from gpt_bot import GPTBot
+from load_test import SYNTHETIC_UTTERANCES
+
+
+def replay_long_session(turns: int, seed: int, **bot_kwargs):
+    """(prompt tokens, seconds) per turn for one long GPTBot session against the fake backend."""
+    backend = FakeBackend(latency=Latency("fixed", 0.0), reply_words=60, seed=seed)
+    openai_clients.set_client(FakeOpenAI(backend))
+    rng = random.Random(seed)
+    samples = []
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        bot = GPTBot(**bot_kwargs)
+        for _ in range(turns):
+            utterance = rng.choice(SYNTHETIC_UTTERANCES)
+            before = len(backend.prompt_tokens)
+            start = time.perf_counter()
+            result = bot.chat(utterance)
+            seconds = time.perf_counter() - start
+            samples.append((sum(backend.prompt_tokens[before:]), seconds))
+            bot.append_turn("user", utterance)
+            bot.append_turn("assistant", result["text"])
+    openai_clients.reset_clients()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens per turn: unbounded history vs token-budgeted history.")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500, help="history token budget")
+    parser.add_argument("--keep-recent-turns", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    full = replay_long_session(args.turns, args.seed)
+    bounded = replay_long_session(args.turns, args.seed, history_token_budget=args.budget,
+                                  keep_recent_turns=args.keep_recent_turns)
+
+    print(f"Prompt tokens per turn (including summariser calls), history budget {args.budget}\n")
+    print(f"{'turn':>5} {'unbounded':>10} {'budgeted':>10}")
+    checkpoints = sorted({1, 5, 10, 25, 50, 100, 150, 200, args.turns} & set(range(1, args.turns + 1)))
+    for turn in checkpoints:
+        print(f"{turn:>5} {full[turn - 1][0]:>10} {bounded[turn - 1][0]:>10}")
+    total_full = sum(t for t, _ in full)
+    total_bounded = sum(t for t, _ in bounded)
+    print(f"\nTotal: unbounded {total_full}, budgeted {total_bounded} "
+          f"({100 * (1 - total_bounded / total_full):.0f}% fewer prompt tokens)")
+    print(f"Max per turn: unbounded {max(t for t, _ in full)}, budgeted {max(t for t, _ in bounded)}")
+    print(f"Client-side ms/turn (last 10 turns): unbounded {1000 * sum(s for _, s in full[-10:]) / 10:.2f}, "
+          f"budgeted {1000 * sum(s for _, s in bounded[-10:]) / 10:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import openai_clients
+from fake_openai import FakeBackend, FakeOpenAI, Latency
+from load_test import SYNTHETIC_UTTERANCES, _bot_factories
+from session_manager import SessionManager
+
+
+def traced(build):
+    """(result, bytes still allocated by build(), seconds)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, allocated, seconds
+
+
+def drive(manager, sessions, exchanges, clients, seed):
+    """`exchanges` turns for each of `sessions` conversations, interleaved, from `clients` threads."""
+    rng = random.Random(seed)
+    jobs = [(f"user-{s}", rng.choice(SYNTHETIC_UTTERANCES)) for _ in range(exchanges) for s in range(sessions)]
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda job: manager.chat(*job), jobs))
+    return len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SessionManager: memory per active session, eviction and rehydration.")
+    parser.add_argument("--bot", default="rag", choices=["parrot", "gpt", "rag"])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--exchanges", type=int, default=3, help="user + assistant turns per session")
+    parser.add_argument("--max-active", type=int, default=500, help="for the eviction run")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    devnull = open(os.devnull, "w")
+    try:
+        key_path = os.path.join(workdir, "openai.key")
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write("sk-fake-benchmark")
+        kb_path = os.path.join(workdir, "knowledge.json")
+        shutil.copy("cambridge_knowledge_list.json", kb_path)
+        openai_clients.set_client(FakeOpenAI(FakeBackend(latency=Latency("fixed", 0.0), seed=args.seed)))
+        factory = _bot_factories(key_path, kb_path)[args.bot]
+
+        with contextlib.redirect_stdout(devnull):
+            factory()  # populate the embedding cache, so both measurements below are warm starts
+            engine, engine_bytes, engine_s = traced(factory)
+
+            # --- Everything in memory ---
+            manager = SessionManager(engine, store_dir=os.path.join(workdir, "store_all"),
+                                     max_active=args.sessions, idle_ttl=float("inf"))
+            turns, sessions_bytes, all_s = traced(lambda: drive(manager, args.sessions, args.exchanges,
+                                                                args.clients, args.seed))
+            all_stats = manager.stats()
+            del manager
+
+            # --- At most max_active in memory; the rest evicted to disk and rehydrated on their next turn ---
+            manager = SessionManager(engine, store_dir=os.path.join(workdir, "store_lru"), max_active=args.max_active)
+            _, evicting_bytes, evict_s = traced(lambda: drive(manager, args.sessions, args.exchanges,
+                                                              args.clients, args.seed))
+            lru_stats = manager.stats()
+            history = manager.get_history("user-0")
+            assert len(history) == 2 * args.exchanges, len(history)
+    finally:
+        devnull.close()
+        openai_clients.reset_clients()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    per_session = sessions_bytes / args.sessions
+    print(f"{args.bot} engine: built in {engine_s:.2f}s, {engine_bytes / 2**20:.1f} MiB "
+          f"(what one bot per user would cost per session)\n")
+    print(f"{args.sessions} sessions x {args.exchanges} exchanges, {args.clients} client threads")
+    print(f"  all in memory:        {turns / all_s:>8.0f} turns/s, {per_session / 1024:.1f} KiB per active session "
+          f"-> {2**30 / per_session:,.0f} sessions/GB  {all_stats}")
+    print(f"  max_active {args.max_active:<6}:   {turns / evict_s:>8.0f} turns/s, "
+          f"{evicting_bytes / 2**20:.1f} MiB held  {lru_stats}")
+    print(f"  vs one {args.bot} bot per user: {engine_bytes / per_session:,.0f}x the memory per session")
+
+
+if __name__ == "__main__":
+    main()
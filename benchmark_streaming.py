@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai_clients
+from chat_server import ChatServer
+from fake_openai import FakeAsyncOpenAI, FakeBackend, FakeOpenAI, Latency
+from latency_stats import summarise
+from load_test import SYNTHETIC_UTTERANCES, _bot_factories
+from session_manager import SessionManager
+
+
+class ServerThread:
+    """A ChatServer on its own event loop in a background thread, like a separate server process."""
+
+    def __init__(self, sessions):
+        self.loop = asyncio.new_event_loop()
+        self.server = ChatServer(sessions, port=0)
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+async def stream_turn(port: int, session_id: str, message: str):
+    """One POST /chat over a raw connection: (time to first delta, time to done) in seconds."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"session_id": session_id, "message": message}).encode("utf-8")
+    writer.write(b"POST /chat HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    await writer.drain()
+    first, event = None, None
+    while line := await reader.readline():
+        if line.startswith(b"event:"):
+            event = line[6:].strip()
+        elif line.startswith(b"data:") and first is None:
+            first = time.perf_counter() - start
+    writer.close()
+    if event != b"done":
+        raise RuntimeError(f"turn of {session_id} ended with {event!r}")
+    return first, time.perf_counter() - start
+
+
+async def streaming_clients(port: int, concurrency: int, turns: int):
+    """`concurrency` conversations of `turns` turns each, all at once; per-turn (ttft_s, total_s)."""
+    async def conversation(c):
+        return [await stream_turn(port, f"stream-{concurrency}-{c}", SYNTHETIC_UTTERANCES[(c + t) % len(SYNTHETIC_UTTERANCES)])
+                for t in range(turns)]
+    results = await asyncio.gather(*(conversation(c) for c in range(concurrency)))
+    return [sample for samples in results for sample in samples]
+
+
+def blocking_clients(manager: SessionManager, concurrency: int, turns: int, threads: int):
+    """The same load on the thread-per-turn path: SessionManager.chat() on a pool of `threads`.
+    Nothing reaches the user before chat() returns, so time to first text is the whole turn."""
+    def conversation(c):
+        samples = []
+        for t in range(turns):
+            start = time.perf_counter()
+            manager.chat(f"block-{concurrency}-{c}", SYNTHETIC_UTTERANCES[(c + t) % len(SYNTHETIC_UTTERANCES)])
+            elapsed = time.perf_counter() - start
+            samples.append((elapsed, elapsed))
+        return samples
+
+    # Conversations wait for a free thread; that wait counts, as it would for a queued request
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        submitted = time.perf_counter()
+        futures = [pool.submit(lambda c=c: (time.perf_counter() - submitted, conversation(c))) for c in range(concurrency)]
+        samples = []
+        for future in futures:
+            queued, conversation_samples = future.result()
+            first_ttft, first_total = conversation_samples[0]
+            samples.append((queued + first_ttft, queued + first_total))
+            samples.extend(conversation_samples[1:])
+    return samples
+
+
+async def heartbeat(stalls: list, interval: float = 0.01):
+    """Record how late the event loop wakes up for a timer, i.e. how long something blocked it."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+def budgeted_history_check(key_path: str, workdir: str, budget: int, conversations: int, turns: int):
+    """
+    Stream turns of GPTBot sessions whose history_token_budget forces the blocking summariser
+    call, while a heartbeat watches the loop. Returns the longest loop stall in ms, which should
+    stay far below the backend latency as nothing blocking may run on the loop, and how many
+    conversations were summarised.
+    """
+    from gpt_bot import GPTBot
+    manager = SessionManager(GPTBot(key_path=key_path, history_token_budget=budget, keep_recent_turns=2),
+                             store_dir=os.path.join(workdir, "budgeted"))
+
+    async def conversation(c):
+        for t in range(turns):
+            async for _ in manager.chat_stream(f"budget-{c}", SYNTHETIC_UTTERANCES[(c + t) % len(SYNTHETIC_UTTERANCES)]):
+                pass
+
+    async def run():
+        stalls = []
+        beat = asyncio.create_task(heartbeat(stalls))
+        await asyncio.gather(*(conversation(c) for c in range(conversations)))
+        beat.cancel()
+        return 1000 * max(stalls)
+
+    max_stall = asyncio.run(run())
+    manager.flush()
+    summarised = sum(1 for c in range(conversations) if manager.store.load(f"budget-{c}")["history_manager"]["summary"])
+    return max_stall, summarised
+
+
+def report(label: str, concurrency: int, samples, elapsed: float):
+    ttft = summarise([1000 * s[0] for s in samples])
+    total = summarise([1000 * s[1] for s in samples])
+    print(f"  {label:<9} {concurrency:>6} {ttft['p50']:>9.0f} {ttft['p95']:>9.0f} {total['p50']:>10.0f} "
+          f"{total['p95']:>10.0f} {len(samples) / elapsed:>9.1f}")
+    return ttft["p95"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming chat server vs blocking turns: time to first token and capacity.")
+    parser.add_argument("--bot", default="gpt", choices=["parrot", "gpt", "rag"])
+    parser.add_argument("--concurrency", default="10,100,1000", help="comma-separated numbers of concurrent conversations")
+    parser.add_argument("--turns", type=int, default=2, help="turns per conversation")
+    parser.add_argument("--threads", type=int, default=64, help="worker threads for the blocking baseline")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake backend: time to first token")
+    parser.add_argument("--token-interval-ms", type=float, default=20.0, help="fake backend: time per further word")
+    parser.add_argument("--reply-words", type=int, default=60)
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="p95 time-to-first-token target for the capacity summary")
+    parser.add_argument("--history-budget", type=int, default=60,
+                        help="history_token_budget for the loop-responsiveness check (forces summariser calls)")
+    parser.add_argument("--max-stall-ms", type=float, default=100.0, help="longest event-loop stall allowed in that check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    backend = FakeBackend(latency=Latency("lognormal", args.latency_ms, args.latency_ms / 3),
+                          token_interval_ms=args.token_interval_ms, reply_words=args.reply_words, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_streaming_")
+    devnull = open(os.devnull, "w")
+    capacity = {"streaming": 0, "blocking": 0}
+    try:
+        key_path = os.path.join(workdir, "openai.key")
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write("sk-fake-benchmark")
+        kb_path = os.path.join(workdir, "knowledge.json")
+        shutil.copy("cambridge_knowledge_list.json", kb_path)
+        openai_clients.set_client(FakeOpenAI(backend), FakeAsyncOpenAI(backend))
+        with contextlib.redirect_stdout(devnull):
+            engine = _bot_factories(key_path, kb_path)[args.bot]()
+
+        print(f"{args.bot} bot, fake backend: {args.latency_ms:.0f}ms to first token + {args.token_interval_ms:.0f}ms "
+              f"per word, {args.reply_words}-word replies, {args.turns} turns per conversation")
+        print(f"  {'mode':<9} {'convs':>6} {'TTFT p50':>9} {'TTFT p95':>9} {'total p50':>10} {'total p95':>10} {'turns/s':>9}")
+        for concurrency in levels:
+            with contextlib.redirect_stdout(devnull):
+                manager = SessionManager(engine, store_dir=os.path.join(workdir, f"stream_{concurrency}"),
+                                         max_active=2 * concurrency)
+                with ServerThread(manager) as server:
+                    start = time.perf_counter()
+                    samples = asyncio.run(streaming_clients(server.server.port, concurrency, args.turns))
+                    elapsed = time.perf_counter() - start
+            if report("streaming", concurrency, samples, elapsed) <= args.slo_ms:
+                capacity["streaming"] = max(capacity["streaming"], concurrency)
+
+            with contextlib.redirect_stdout(devnull):
+                manager = SessionManager(engine, store_dir=os.path.join(workdir, f"block_{concurrency}"),
+                                         max_active=2 * concurrency)
+                start = time.perf_counter()
+                samples = blocking_clients(manager, concurrency, args.turns, args.threads)
+                elapsed = time.perf_counter() - start
+            if report("blocking", concurrency, samples, elapsed) <= args.slo_ms:
+                capacity["blocking"] = max(capacity["blocking"], concurrency)
+
+        with contextlib.redirect_stdout(devnull):
+            max_stall, summarised = budgeted_history_check(key_path, workdir, args.history_budget, conversations=20, turns=4)
+    finally:
+        devnull.close()
+        openai_clients.reset_clients()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nLargest tested concurrency within p95 TTFT <= {args.slo_ms:.0f}ms: "
+          f"streaming {capacity['streaming']}, blocking ({args.threads} threads) {capacity['blocking']}")
+    print(f"Event loop with history_token_budget={args.history_budget} ({summarised}/20 conversations summarised): "
+          f"longest stall {max_stall:.1f}ms, limit {args.max_stall_ms:.0f}ms")
+    assert summarised, "the history budget never triggered the summariser"
+    assert max_stall < args.max_stall_ms, "blocking work ran on the event loop"
+    print(f"Backend requests: {backend.requests} ({backend.errors} injected errors)")
+
+
+if __name__ == "__main__":
+    main()
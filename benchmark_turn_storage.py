@@ -0,0 +1,102 @@
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from jsonl_io import iter_records
+from load_test import SYNTHETIC_UTTERANCES
+from parrot_bot import ParrotBot
+from turn_store import JsonlHistorySink, Turn, ResultMeta
+
+
+def dict_turn(speaker, utterance, meta=None):
+    """A turn as append_turn used to store it."""
+    turn = {"timestamp": datetime.now().strftime("%H:%M:%S"), "speaker": speaker, "utterance": utterance}
+    if meta:
+        turn["meta"] = meta
+    return turn
+
+
+def session(turns, seed):
+    """(user utterance, chat result) pairs for a synthetic session."""
+    rng = random.Random(seed)
+    bot = ParrotBot()
+    for _ in range(turns):
+        utterance = rng.choice(SYNTHETIC_UTTERANCES)
+        yield utterance, dict(bot.chat(utterance), latency_ms=rng.random() * 100)
+
+
+def history_bytes(build, pairs):
+    """Bytes allocated to hold the turns of `pairs` (utterances and chat results are allocated beforehand)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = []
+    for utterance, result in pairs:
+        build(history, utterance, result)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated, history
+
+
+def build_dicts(history, utterance, result):
+    history.append(dict_turn("user", utterance))
+    history.append(dict_turn("assistant", result["text"], meta={k: v for k, v in result.items() if k != "text"}))
+
+
+def build_turns(history, utterance, result):
+    history.append(Turn("user", utterance))
+    history.append(Turn("assistant", result["text"], meta=ResultMeta(result)))
+
+
+def save_each_turn(pairs, workdir, sink_fsync_every=None):
+    """Seconds spent persisting the history after every exchange: full JSON rewrite, or a JSONL sink."""
+    bot = ParrotBot()
+    path = os.path.join(workdir, f"history_{sink_fsync_every}.json")
+    if sink_fsync_every is not None:
+        bot.set_history_sink(JsonlHistorySink(path + "l", fsync_every=sink_fsync_every))
+    seconds = 0.0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for utterance, result in pairs:
+            start = time.perf_counter()
+            bot.append_turn("user", utterance)
+            bot.append_turn("assistant", result["text"], meta=ResultMeta(result))
+            if sink_fsync_every is None:
+                bot.save_history(path)
+            seconds += time.perf_counter() - start
+        if bot.history_sink is not None:
+            bot.save_history()
+            bot.history_sink.close()
+            assert sum(1 for _ in iter_records(bot.history_sink.path)) == 2 * len(pairs)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dialogue history: dict turns + full JSON rewrites vs slotted turns + JSONL sink.")
+    parser.add_argument("--turns", type=int, default=2000, help="exchanges (user + assistant turn) per session")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    pairs = list(session(args.turns, args.seed))
+
+    dict_bytes, dicts = history_bytes(build_dicts, pairs)
+    turn_bytes, turns = history_bytes(build_turns, pairs)
+    assert [t.to_dict()["utterance"] for t in turns] == [d["utterance"] for d in dicts]
+    n = len(turns)
+    print(f"Memory for {n} turns:")
+    print(f"  dict turns:    {dict_bytes / n:>7.0f} bytes/turn")
+    print(f"  slotted Turns: {turn_bytes / n:>7.0f} bytes/turn ({dict_bytes / turn_bytes:.1f}x smaller)")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"\nPersisting after every exchange, {args.turns} exchanges:")
+        rewrite = save_each_turn(pairs, workdir)
+        print(f"  save_history, full JSON rewrite: {rewrite:>8.2f}s ({1e3 * rewrite / args.turns:.2f} ms/exchange)")
+        for fsync_every in (0, 64, 1):
+            seconds = save_each_turn(pairs, workdir, fsync_every)
+            label = {0: "no fsync", 1: "fsync every turn"}.get(fsync_every, f"fsync every {fsync_every} turns")
+            print(f"  JSONL sink, {label:<24} {seconds:>8.2f}s ({1e3 * seconds / args.turns:.3f} ms/exchange)")
+
+
+if __name__ == "__main__":
+    main()
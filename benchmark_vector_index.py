@@ -0,0 +1,64 @@
+import argparse
+import time
+import numpy as np
+from vector_index import ExactIndex, IVFIndex
+
+
+def make_corpus(num_docs, num_queries, dim, num_topics, seed=0):
+    """Synthetic clustered embeddings, roughly shaped like real sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(num_topics, dim)).astype(np.float32)
+    docs = topics[rng.integers(num_topics, size=num_docs)] + 0.6 * rng.normal(size=(num_docs, dim)).astype(np.float32)
+    queries = topics[rng.integers(num_topics, size=num_queries)] + 0.6 * rng.normal(size=(num_queries, dim)).astype(np.float32)
+    return docs, queries
+
+
+def recall_at_k(approx, exact):
+    """Fraction of the exact top-k neighbours that the approximate search also returned."""
+    hits = sum(len(set(a.tolist()) & set(e.tolist())) for a, e in zip(approx, exact))
+    return hits / exact.size
+
+
+def timed_search(index, queries, k, batch_size):
+    start = time.perf_counter()
+    results = [index.search(queries[i:i + batch_size], k)[0] for i in range(0, len(queries), batch_size)]
+    elapsed = time.perf_counter() - start
+    return np.concatenate(results), 1000 * elapsed / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of IVF search versus exact search.")
+    parser.add_argument("--num-docs", type=int, default=200_000)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--num-topics", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1, help="queries per search call (1 = per-turn retrieval)")
+    args = parser.parse_args()
+
+    docs, queries = make_corpus(args.num_docs, args.num_queries, args.dim, args.num_topics)
+    print(f"Corpus: {args.num_docs} docs x {args.dim} dims, {args.num_queries} queries, k={args.k}\n")
+
+    start = time.perf_counter()
+    exact = ExactIndex(docs)
+    print(f"Exact index built in {time.perf_counter() - start:.2f}s "
+          f"({exact.vectors.nbytes / 2**20:.1f} MiB)")
+    exact_ids, exact_ms = timed_search(exact, queries, args.k, args.batch_size)
+    print(f"Exact search: {exact_ms:.3f} ms/query\n")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(docs, n_lists=args.n_lists)
+    print(f"IVF index built in {time.perf_counter() - start:.2f}s with {len(ivf.centroids)} lists\n")
+
+    print(f"{'n_probe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+    n_probe = 1
+    while n_probe <= len(ivf.centroids):
+        ivf.n_probe = n_probe
+        ivf_ids, ivf_ms = timed_search(ivf, queries, args.k, args.batch_size)
+        print(f"{n_probe:>8} {recall_at_k(ivf_ids, exact_ids):>10.3f} {ivf_ms:>10.3f} {exact_ms / ivf_ms:>7.1f}x")
+        n_probe *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import random
+import time
+import numpy as np
+from openai import APIConnectionError, APITimeoutError
+from token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def make_chunks(texts, max_items: int = 1024, max_tokens: int = 250_000):
+    """
+    Split `texts` into consecutive (start, end) ranges that respect both the
+    per-request item limit and the per-request token budget.
+    """
+    chunks = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        text_tokens = count_tokens(text)
+        if i > start and (i - start >= max_items or tokens + text_tokens > max_tokens):
+            chunks.append((start, i))
+            start, tokens = i, 0
+        tokens += text_tokens
+    if start < len(texts):
+        chunks.append((start, len(texts)))
+    return chunks
+
+
+def _is_retryable(error) -> bool:
+    """
+    Connection errors, timeouts, rate limits and server errors are worth retrying; anything
+    else (client errors, or bugs such as a KeyError) is raised straight away.
+    """
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+
+def _embed_chunk(client, model, texts, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(model=model, input=texts)
+            return np.array([item.embedding for item in response.data], dtype=np.float32)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            logger.warning("Embedding chunk failed (%s), retrying in %.1fs ...", e.__class__.__name__, delay)
+            time.sleep(delay)
+
+
+def embed_in_chunks(client, model: str, texts, max_items: int = 1024, max_tokens: int = 250_000,
+                    parallelism: int = 4, max_retries: int = 5, backoff: float = 1.0, on_chunk=None):
+    """
+    Embed a large list of texts with the embeddings endpoint of `client`.
+    The texts are split by item count and token budget, chunks are sent
+    concurrently (at most `parallelism` in flight), and failed chunks are retried
+    with exponential backoff. `on_chunk(chunk_texts, chunk_vectors)` is called
+    from the calling thread as each chunk finishes, e.g. to persist it to a cache.
+    Any object with an OpenAI-compatible `embeddings.create` can be used as client.
+    Returns a float32 matrix in the order of `texts`.
+    """
+    texts = list(texts)
+    chunks = make_chunks(texts, max_items, max_tokens)
+    results = [None] * len(chunks)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        futures = {
+            pool.submit(_embed_chunk, client, model, texts[start:end], max_retries, backoff): i
+            for i, (start, end) in enumerate(chunks)
+        }
+        error = None
+        for future in as_completed(futures):
+            i = futures[future]
+            start, end = chunks[i]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # Keep collecting the other chunks, so they still reach on_chunk
+                error = error or e
+                continue
+            if on_chunk is not None:
+                on_chunk(texts[start:end], results[i])
+        if error is not None:
+            raise error
+
+    if not results:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.concatenate(results)
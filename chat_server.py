@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import shutil
+import tempfile
+from session_manager import SessionManager
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ChatServer:
+    """
+    Streaming chat over HTTP on one asyncio event loop: every conversation is a session of a
+    SessionManager, and a turn in flight is a coroutine, not a thread, so thousands of
+    concurrent conversations cost a few KiB each while they wait on the LLM.
+
+    POST /chat {"session_id": ..., "message": ...} answers with server-sent events: one
+    `data: {"delta": ...}` event per chunk of reply text as the model generates it, then an
+    `event: done` with the full chat() result (or `event: error`). GET /health reports session stats.
+    """
+
+    def __init__(self, sessions: SessionManager, host: str = "127.0.0.1", port: int = 8000,
+                 max_body_bytes: int = 64 * 1024, evict_every: float = 60.0):
+        self.sessions = sessions
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.evict_every = evict_every
+        self.streams = 0  # turns in flight
+        self._server = None
+        self._evictor = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._evictor = asyncio.create_task(self._evict_periodically())
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        self._evictor.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+        await asyncio.to_thread(self.sessions.flush)
+
+    async def _evict_periodically(self):
+        while True:
+            await asyncio.sleep(self.evict_every)
+            await asyncio.to_thread(self.sessions.evict_idle)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            if path == "/health" and method == "GET":
+                await self._send_json(writer, 200, dict(self.sessions.stats(), streams=self.streams))
+            elif path == "/chat" and method == "POST":
+                await self._chat(writer, body)
+            elif path in ("/health", "/chat"):
+                await self._send_json(writer, 405, {"error": f"{method} not allowed on {path}"})
+            else:
+                await self._send_json(writer, 404, {"error": f"Unknown endpoint {path}"})
+        except _HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise _HTTPError(413, "Request headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise _HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length < 0:
+            raise _HTTPError(400, "Invalid Content-Length")
+        if length > self.max_body_bytes:
+            raise _HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0].rstrip("/") or "/", body
+
+    async def _chat(self, writer: asyncio.StreamWriter, body: bytes):
+        try:
+            request = json.loads(body or b"{}")
+            session_id, message = str(request["session_id"]), str(request["message"])
+        except (ValueError, KeyError, TypeError):
+            raise _HTTPError(400, 'Expected a JSON body {"session_id": ..., "message": ...}')
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        result = {}
+        self.streams += 1
+        try:
+            # aclosing: a client that disconnects mid-reply closes the session's stream right away,
+            # releasing the session, rather than whenever the generator is garbage-collected
+            async with contextlib.aclosing(self.sessions.chat_stream(session_id, message, result)) as stream:
+                async for delta in stream:
+                    writer.write(_event({"delta": delta}))
+                    await writer.drain()  # back-pressure, and notice a disconnected client
+            writer.write(_event(result, "done"))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            writer.write(_event({"error": f"{type(e).__name__}: {e}"}, "error"))
+        finally:
+            self.streams -= 1
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+        await writer.drain()
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _event(payload: dict, name: str = None) -> bytes:
+    """One server-sent event; values JSON can't encode (e.g. image bytes) are sent as their repr."""
+    data = json.dumps(payload, ensure_ascii=False, default=repr)
+    return (f"event: {name}\n" if name else "").encode("utf-8") + f"data: {data}\n\n".encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve streaming chat sessions over HTTP (server-sent events).")
+    parser.add_argument("--bot", default="rag", choices=["parrot", "gpt", "rag"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--key-path", default="openai.key")
+    parser.add_argument("--kb-path", default="cambridge_knowledge_list.json")
+    parser.add_argument("--store-dir", default="sessions", help="where evicted sessions are saved")
+    parser.add_argument("--max-active", type=int, default=10000)
+    parser.add_argument("--idle-ttl", type=float, default=1800.0)
+    parser.add_argument("--fake-backend", action="store_true",
+                        help="answer from the simulated OpenAI backend (fake_openai) instead of the API")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake backend: time to first token")
+    parser.add_argument("--token-interval-ms", type=float, default=20.0, help="fake backend: time per further word")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.fake_backend:
+        import openai_clients
+        from fake_openai import FakeAsyncOpenAI, FakeBackend, FakeOpenAI, Latency
+        backend = FakeBackend(latency=Latency(mean_ms=args.latency_ms, spread_ms=args.latency_ms / 3),
+                              token_interval_ms=args.token_interval_ms)
+        openai_clients.set_client(FakeOpenAI(backend), FakeAsyncOpenAI(backend))
+        # Fake embeddings go into a copy of the knowledge base's cache, never the real one
+        workdir = tempfile.mkdtemp(prefix="chat_server_")
+        args.kb_path = shutil.copy(args.kb_path, workdir)
+
+    if args.bot == "parrot":
+        from parrot_bot import ParrotBot
+        engine = ParrotBot()
+    elif args.bot == "gpt":
+        from gpt_bot import GPTBot
+        engine = GPTBot(key_path=args.key_path)
+    else:
+        from rag_bot import RAGBot
+        embedding_model = "fake-embedding" if args.fake_backend else "text-embedding-3-small"
+        engine = RAGBot(key_path=args.key_path, kb_path=args.kb_path, embedding_model=embedding_model)
+
+    sessions = SessionManager(engine, store_dir=args.store_dir, max_active=args.max_active, idle_ttl=args.idle_ttl)
+
+    async def serve():
+        server = await ChatServer(sessions, args.host, args.port).start()
+        print(f"Serving {args.bot} chat on http://{args.host}:{server.port}/chat (Ctrl+C to stop)")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Sessions saved. Goodbye!")
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
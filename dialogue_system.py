@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
+import asyncio
+import copy
 import json
 import os
+import tracing
+from turn_store import Turn, ResultMeta
 
 class DialogueSystem(ABC):
     """
@@ -10,23 +14,77 @@ class DialogueSystem(ABC):
     """
 
     def __init__(self):
+        self.history_manager = None
+        self.history_sink = None
         self.reset()
 
     def reset(self):
         """Reset dialogue state and history."""
         self.conversation_history = []
+        if self.history_manager is not None:
+            self.history_manager.reset()
 
-    def append_turn(self, speaker: str, utterance: str, meta: dict = None):
-        """Add a turn to the dialogue history, with timestamp and optional metadata."""
-        timestamp = datetime.now().strftime("%H:%M:%S")  # e.g. "10:20:02"
-        turn = {
-            "timestamp": timestamp,
-            "speaker": speaker,
-            "utterance": utterance
-        }
-        if meta:
-            turn["meta"] = meta
+    def spawn(self):
+        """
+        A new, empty conversation on the same engine: shares what __init__ set up (client,
+        knowledge base, index, caches) but gets its own history. Subclasses keep their
+        per-conversation state in reset(), which spawn() calls. See session_manager.SessionManager.
+        """
+        session = copy.copy(self)
+        session.history_sink = None
+        if self.history_manager is not None:
+            session.history_manager = copy.copy(self.history_manager)
+        session.reset()
+        return session
+
+    def export_state(self) -> dict:
+        """The per-conversation state as JSON-serialisable data, for load_state()."""
+        state = {"turns": [turn.to_record() if isinstance(turn, Turn) else turn for turn in self.conversation_history]}
+        if self.history_manager is not None:
+            state["history_manager"] = self.history_manager.export_state()
+        return state
+
+    def load_state(self, state: dict):
+        """Restore a conversation saved with export_state()."""
+        self.reset()
+        self.conversation_history = [Turn.from_record(record) for record in state["turns"]]
+        if self.history_manager is not None and "history_manager" in state:
+            self.history_manager.load_state(state["history_manager"], self.conversation_history)
+
+    def set_history_manager(self, history_manager):
+        """
+        Bound the history sent to the model (see history_manager.HistoryManager).
+        With no manager, history_messages() returns the whole conversation.
+        """
+        self.history_manager = history_manager
+
+    def history_messages(self) -> list:
+        """The conversation history as role/content messages for an LLM prompt."""
+        if self.history_manager is not None:
+            with tracing.span("history"):  # may fold old turns into the summary with an LLM call
+                return self.history_manager.messages(self.conversation_history)
+        messages = []
+        for turn in self.conversation_history:
+            role = "assistant" if turn["speaker"] == "assistant" else "user"
+            messages.append({"role": role, "content": turn["utterance"]})
+        return messages
+
+    def set_history_sink(self, sink):
+        """
+        Persist turns as they are appended (see turn_store.JsonlHistorySink), instead of
+        rewriting the whole history on every save_history().
+        """
+        self.history_sink = sink
+
+    def append_turn(self, speaker: str, utterance: str, meta=None):
+        """
+        Add a turn to the dialogue history, with timestamp and optional metadata
+        (a dict, or a callable building it when first read, e.g. turn_store.ResultMeta(result)).
+        """
+        turn = Turn(speaker, utterance, meta)
         self.conversation_history.append(turn)
+        if self.history_sink is not None:
+            self.history_sink.write(turn)
 
     @abstractmethod
     def chat(self, utterance: str) -> dict:
@@ -41,6 +99,19 @@ class DialogueSystem(ABC):
         """
         pass
 
+    async def chat_stream(self, utterance: str, result: dict = None):
+        """
+        chat() as an async generator of reply text deltas, for serving many conversations on
+        one event loop (see chat_server). When the stream ends, `result` (if given) is filled
+        with what chat() would have returned.
+        This default runs chat() in a worker thread and yields the whole reply at once;
+        bots backed by an LLM override it to stream tokens as they are generated.
+        """
+        reply = await asyncio.to_thread(self.chat, utterance)
+        if result is not None:
+            result.update(reply)
+        yield reply["text"]
+
     def start_a_chat(self):
         print("The system is ready. Type `bye` or `exit` to end the conversation.\n")
         while True:
@@ -59,24 +130,31 @@ class DialogueSystem(ABC):
             self.append_turn("user", user_input)
 
             # Append structured result
-            self.append_turn("assistant", result["text"], meta={k: v for k, v in result.items() if k != "text"})
+            self.append_turn("assistant", result["text"], meta=ResultMeta(result))
 
     def get_history(self):
-        return self.conversation_history
+        """The conversation as a list of {"timestamp", "speaker", "utterance"[, "meta"]} dicts."""
+        return [turn.to_dict() if isinstance(turn, Turn) else turn for turn in self.conversation_history]
 
 
     def save_history(self, filepath=None):
         """
         Save the current conversation history to a JSON file.
         If no path is given, automatically generate one with timestamp.
+        With a history sink, the turns are already on disk: the sink is synced and its path returned.
         """
+        if self.history_sink is not None and filepath is None:
+            self.history_sink.sync()
+            print(f"Conversation saved to {self.history_sink.path}")
+            return self.history_sink.path
+
         if filepath is None:
             os.makedirs("logs", exist_ok=True)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filepath = os.path.join("logs", f"conversation_{timestamp}.json")
 
         with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(self.conversation_history, f, indent=4, ensure_ascii=False)
+            json.dump(self.get_history(), f, indent=4, ensure_ascii=False)
 
         print(f"Conversation saved to {filepath}")
         return filepath
@@ -0,0 +1,228 @@
+from collections import OrderedDict
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk store of document embeddings.
+    Every vector is keyed by a hash of (embedding model, text), so edited entries
+    are re-embedded, removed entries are dropped, and vectors produced by another
+    model are never reused.
+
+    Layout of `cache_dir`:
+        meta.json        -- embedding model name and vector dimension
+        shard_00000.npz  -- `keys` and `vectors` arrays, one shard per write
+    New vectors are appended as a new shard, so an update costs the size of the diff.
+    Shards are merged once the number of shards or of stale vectors grows too large.
+    """
+
+    def __init__(self, cache_dir: str, model: str, max_shards: int = 16, max_stale_ratio: float = 0.25):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.max_shards = max_shards
+        self.max_stale_ratio = max_stale_ratio
+        self.vectors = {}
+        self._shards = []
+        self._load()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def _meta_path(self):
+        return os.path.join(self.cache_dir, "meta.json")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path()):
+            return
+        with open(self._meta_path(), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        shards = sorted(name for name in os.listdir(self.cache_dir)
+                        if name.startswith("shard_") and name.endswith(".npz"))
+        if meta.get("model") != self.model:
+            print(f"Embedding cache was built with '{meta.get('model')}', "
+                  f"discarding it for '{self.model}'.")
+            for name in shards:
+                os.remove(os.path.join(self.cache_dir, name))
+            os.remove(self._meta_path())
+            return
+        for name in shards:
+            with np.load(os.path.join(self.cache_dir, name)) as shard:
+                self.vectors.update(zip(shard["keys"].tolist(), shard["vectors"]))
+        self._shards = shards
+
+    def _write_meta(self, dim: int):
+        with open(self._meta_path(), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": dim}, f)
+
+    def _write_shard(self, keys, vectors):
+        """Write a new shard; a temporary name keeps half-written files out of `_load`."""
+        index = int(self._shards[-1][len("shard_"):-len(".npz")]) + 1 if self._shards else 0
+        name = f"shard_{index:05d}.npz"
+        tmp_path = os.path.join(self.cache_dir, "tmp_" + name)
+        np.savez(tmp_path, keys=np.array(keys), vectors=vectors)
+        os.replace(tmp_path, os.path.join(self.cache_dir, name))
+        self._shards.append(name)
+
+    def missing(self, texts):
+        """Return the indices of texts that have no cached vector yet."""
+        return [i for i, text in enumerate(texts) if self.key(text) not in self.vectors]
+
+    def add(self, texts, vectors):
+        """Store vectors for `texts` and persist them as a new shard."""
+        if len(texts) == 0:
+            return
+        vectors = np.asarray(vectors)
+        keys = [self.key(text) for text in texts]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write_meta(vectors.shape[1])
+        self._write_shard(keys, vectors)
+        self.vectors.update(zip(keys, vectors))
+
+    def prune(self, texts):
+        """
+        Drop vectors whose text is no longer in `texts`.
+        The shards on disk are only rewritten once enough stale data has accumulated.
+        """
+        live = {self.key(text) for text in texts}
+        stale = [k for k in self.vectors if k not in live]
+        for k in stale:
+            del self.vectors[k]
+
+        stored = len(self.vectors) + len(stale)
+        if (stale and len(stale) > self.max_stale_ratio * stored) or len(self._shards) > self.max_shards:
+            self._compact()
+
+    def _compact(self):
+        """
+        Rewrite the cache as a single shard holding only live vectors.
+        The new shard is written before the old ones are removed, so a crash
+        in between only leaves duplicates behind.
+        """
+        old_shards = list(self._shards)
+        if self.vectors:
+            keys = list(self.vectors)
+            self._write_shard(keys, np.stack([self.vectors[k] for k in keys]))
+        self._shards = self._shards[len(old_shards):]
+        for name in old_shards:
+            os.remove(os.path.join(self.cache_dir, name))
+
+    def fingerprint(self, texts) -> str:
+        """Hash identifying this exact, ordered set of documents under this model."""
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(self.key(text).encode("ascii"))
+        return digest.hexdigest()
+
+    def matrix(self, texts):
+        """Stack the cached vectors for `texts`, in order."""
+        return np.stack([self.vectors[self.key(text)] for text in texts])
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings, keyed by (embedding model, normalised text).
+    Safe to share between bots and threads. With `path` set, the cache is loaded
+    at start-up and written back on `save()` and at interpreter exit (if it is still alive then).
+    """
+
+    def __init__(self, max_size: int = 10000, path: str = None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.compute_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            if os.path.exists(path):
+                self._load()
+            # Through a weak reference, so the exit hook doesn't keep every cache ever made alive
+            atexit.register(_save_at_exit, weakref.ref(self))
+
+    @staticmethod
+    def normalise_text(text: str) -> str:
+        """Case- and whitespace-insensitive form of a query."""
+        return " ".join(text.casefold().split())
+
+    def _key(self, model: str, text: str) -> str:
+        return f"{model}\n{self.normalise_text(text)}"
+
+    def get(self, model: str, text: str):
+        """Return the cached vector, or None on a miss."""
+        key = self._key(model, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector):
+        key = self._key(model, text)
+        with self._lock:
+            self._entries[key] = np.asarray(vector, dtype=np.float32)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, model: str, text: str, compute):
+        """Return the cached vector, or call `compute(text)` and cache its result."""
+        vector = self.get(model, text)
+        if vector is None:
+            start = time.perf_counter()
+            vector = compute(text)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.compute_seconds += elapsed
+            self.put(model, text, vector)
+        return vector
+
+    def stats(self) -> dict:
+        """Hit/miss counters and the embedding time the hits are estimated to have saved."""
+        with self._lock:
+            size, hits, misses, compute_seconds = len(self._entries), self.hits, self.misses, self.compute_seconds
+        lookups = hits + misses
+        mean_miss_seconds = compute_seconds / misses if misses else 0.0
+        return {
+            "size": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": hits * mean_miss_seconds
+        }
+
+    def _load(self):
+        with np.load(self.path) as saved:
+            keys = saved["keys"].tolist()
+            vectors = saved["vectors"]
+        for key, vector in list(zip(keys, vectors))[-self.max_size:]:
+            self._entries[key] = vector
+
+    def save(self):
+        """Write the cache to `path`, least recently used entries first."""
+        if not self.path or not self._entries:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            vectors = np.stack(list(self._entries.values()))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), vectors=vectors)
+        os.replace(tmp_path, self.path)
+
+
+def _save_at_exit(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache.save()
@@ -1,23 +1,147 @@
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-import json
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from jsonl_io import iter_records
 
-def evaluate_bleu(output_file: str):
-    with open(output_file, "r", encoding="utf-8") as f:
-        dialogues = json.load(f)
+MAX_ORDER = 4
+SMOOTHING_K = 5  # nltk SmoothingFunction().method4 default
 
-    smoothie = SmoothingFunction().method4
-    scores = []
 
-    for d in dialogues:
+def iter_turn_pairs(output_file: str):
+    """Stream (ground truth, system response) pairs from a batch_replay output file (JSON array or JSONL)."""
+    for d in iter_records(output_file):
         for turn in d["turns"]:
             gt = turn["ground_truth"]
-            sys = turn["system_response"]
-            if gt and sys:
-                score = sentence_bleu([gt.split()], sys.split(), smoothing_function=smoothie)
-                scores.append(score)
+            sys_response = turn["system_response"]
+            if gt and sys_response:
+                yield gt, sys_response
 
-    avg_bleu = sum(scores) / len(scores) if scores else 0.0
-    print(f"Average BLEU score: {avg_bleu:.4f}")
+
+def ngram_stats(reference, hypothesis):
+    """
+    Clipped n-gram matches and hypothesis n-gram counts for orders 1-4 (as nltk's modified_precision,
+    for a single reference), plus hypothesis and reference lengths.
+    """
+    matches, totals = [], []
+    for n in range(1, MAX_ORDER + 1):
+        hyp_ngrams = Counter(tuple(hypothesis[i:i + n]) for i in range(len(hypothesis) - n + 1))
+        ref_ngrams = Counter(tuple(reference[i:i + n]) for i in range(len(reference) - n + 1))
+        matches.append(sum(min(count, ref_ngrams[ngram]) for ngram, count in hyp_ngrams.items()))
+        totals.append(max(1, sum(hyp_ngrams.values())))
+    return matches, totals, len(hypothesis), len(reference)
+
+
+def bleu_from_stats(matches, totals, hyp_len, ref_len, smooth=False):
+    """
+    BLEU-4 from n-gram statistics, matching nltk: sentence_bleu with smoothing method4
+    (smooth=True) or corpus_bleu without smoothing (smooth=False).
+    """
+    if matches[0] == 0:
+        return 0.0
+    precisions = []
+    smoothed = 1
+    for match, total in zip(matches, totals):
+        if match:
+            precisions.append(match / total)
+        elif smooth and hyp_len > 1:
+            precisions.append(1 / (2 ** smoothed * SMOOTHING_K / math.log(hyp_len)) / total)
+            smoothed += 1
+        elif smooth:
+            precisions.append(0.0)
+        else:
+            precisions.append(sys.float_info.min)
+    if hyp_len > ref_len:
+        brevity_penalty = 1.0
+    elif hyp_len == 0:
+        brevity_penalty = 0.0
+    else:
+        brevity_penalty = math.exp(1 - ref_len / hyp_len)
+    return brevity_penalty * math.exp(math.fsum(math.log(p) / MAX_ORDER for p in precisions if p > 0))
+
+
+def score_shard(pairs):
+    """
+    Score a list of (ground truth, system response) pairs. Returns the summed sentence BLEU,
+    the turn count, the summed corpus statistics and the CPU seconds spent, to be merged by the caller.
+    """
+    start = time.process_time()
+    sentence_total = 0.0
+    matches, totals = [0] * MAX_ORDER, [0] * MAX_ORDER
+    hyp_lengths = ref_lengths = 0
+    for gt, sys_response in pairs:
+        m, t, hyp_len, ref_len = ngram_stats(gt.split(), sys_response.split())
+        sentence_total += bleu_from_stats(m, t, hyp_len, ref_len, smooth=True)
+        matches = [a + b for a, b in zip(matches, m)]
+        totals = [a + b for a, b in zip(totals, t)]
+        hyp_lengths += hyp_len
+        ref_lengths += ref_len
+    return sentence_total, len(pairs), matches, totals, hyp_lengths, ref_lengths, time.process_time() - start
+
+
+def _shards(pairs, shard_size):
+    shard = []
+    for pair in pairs:
+        shard.append(pair)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def evaluate_bleu(output_file: str, num_workers: int = None, shard_size: int = 2000):
+    """
+    Mean sentence BLEU and corpus BLEU over a batch_replay output file.
+    Accepts both the JSON array and the streaming JSONL format; dialogues are read one at a time,
+    cut into shards of `shard_size` turns and scored in `num_workers` processes (default: all CPUs),
+    with at most two shards per worker in flight.
+    Returns the scores and per-stage timings.
+    """
+    num_workers = num_workers or os.cpu_count()
+    start = time.perf_counter()
+    sentence_total, turns, cpu_seconds = 0.0, 0, 0.0
+    matches, totals = [0] * MAX_ORDER, [0] * MAX_ORDER
+    hyp_lengths = ref_lengths = 0
+
+    def merge(result):
+        nonlocal sentence_total, turns, cpu_seconds, matches, totals, hyp_lengths, ref_lengths
+        sentence_total += result[0]
+        turns += result[1]
+        matches = [a + b for a, b in zip(matches, result[2])]
+        totals = [a + b for a, b in zip(totals, result[3])]
+        hyp_lengths += result[4]
+        ref_lengths += result[5]
+        cpu_seconds += result[6]
+
+    shards = _shards(iter_turn_pairs(output_file), shard_size)
+    if num_workers == 1:
+        for shard in shards:
+            merge(score_shard(shard))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.submit(score_shard, shard))
+                if len(pending) >= 2 * num_workers:
+                    merge(pending.popleft().result())
+            while pending:
+                merge(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    results = {
+        "turns": turns,
+        "mean_sentence_bleu": sentence_total / turns if turns else 0.0,
+        "corpus_bleu": bleu_from_stats(matches, totals, hyp_lengths, ref_lengths) if turns else 0.0,
+        "timings": {"wall_s": elapsed, "scoring_cpu_s": cpu_seconds, "workers": num_workers,
+                    "turns_per_s": turns / elapsed if elapsed else 0.0},
+    }
+    print(f"Average BLEU score: {results['mean_sentence_bleu']:.4f}")
+    print(f"Corpus BLEU score:  {results['corpus_bleu']:.4f}")
+    print(f"Scored {turns} turns in {elapsed:.1f}s with {num_workers} worker(s) ({results['timings']['turns_per_s']:.0f} turns/s)")
+    return results
 
 if __name__ == "__main__":
-    evaluate_bleu("logs/batch_output_20251012_101233.json")
\ No newline at end of file
+    evaluate_bleu("logs/batch_output_20251012_101233.json")
@@ -0,0 +1,45 @@
+import json
+import time
+
+SLOTS = ("flavours", "size", "container")
+
+
+def load_dst_examples(data_path: str = "huggingface_demo/dst_data.json", split: str = "test"):
+    with open(data_path, "r", encoding="utf-8") as f:
+        return json.load(f)[split]
+
+
+def evaluate_dst(model, examples, batch_size: int = 32):
+    """
+    Joint-goal and per-slot accuracy of a GelatoParsingModel on dst_data.json examples
+    ({"source", "target"}). Dialogues are parsed in length-bucketed batches of `batch_size`.
+    A turn counts towards joint-goal accuracy only if every slot matches the gold state exactly.
+    Returns the scores and per-stage timings.
+    """
+    start = time.perf_counter()
+    predictions = model.predict_sources([e["source"] for e in examples], batch_size=batch_size)
+    predict_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # string_to_state, not parse_output: gold states must not count towards model.malformed_outputs
+    golds = [model.string_to_state(e["target"]) for e in examples]
+    slot_correct = {slot: 0 for slot in SLOTS}
+    joint_correct = 0
+    for prediction, gold in zip(predictions, golds):
+        matched = [prediction.get(slot) == gold.get(slot) for slot in SLOTS]
+        for slot, ok in zip(SLOTS, matched):
+            slot_correct[slot] += ok
+        joint_correct += all(matched)
+    score_s = time.perf_counter() - start
+
+    n = len(examples)
+    results = {
+        "turns": n,
+        "joint_goal_accuracy": joint_correct / n if n else 0.0,
+        "slot_accuracy": {slot: slot_correct[slot] / n if n else 0.0 for slot in SLOTS},
+        "timings": {"predict_s": predict_s, "score_s": score_s, "turns_per_s": n / predict_s if predict_s else 0.0},
+    }
+    print(f"Joint goal accuracy: {results['joint_goal_accuracy']:.4f} over {n} turns")
+    print("Slot accuracy:       " + ", ".join(f"{slot} {acc:.4f}" for slot, acc in results["slot_accuracy"].items()))
+    print(f"Parsed {n} turns in {predict_s:.1f}s ({results['timings']['turns_per_s']:.1f} turns/s)")
+    return results
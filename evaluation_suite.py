@@ -0,0 +1,49 @@
+import argparse
+import json
+import time
+from evaluation_bleu import evaluate_bleu
+from evaluation_dst import evaluate_dst, load_dst_examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a batch_replay output (BLEU) and/or the DST model (joint-goal accuracy).")
+    parser.add_argument("--replay", default=None, help="batch_replay output file (.json or .jsonl) to score with BLEU")
+    parser.add_argument("--workers", type=int, default=None, help="BLEU scoring processes (default: all CPUs)")
+    parser.add_argument("--shard-size", type=int, default=2000, help="turns per BLEU scoring task")
+    parser.add_argument("--dst-model", default=None, help="GelatoParsingModel checkpoint to evaluate")
+    parser.add_argument("--dst-data", default="huggingface_demo/dst_data.json")
+    parser.add_argument("--dst-split", default="test")
+    parser.add_argument("--dst-batch-size", type=int, default=32)
+    parser.add_argument("--constrained", action="store_true", help="catalogue-constrained decoding for the DST model")
+    parser.add_argument("--quantize", action="store_true", help="int8 DST model (CPU)")
+    parser.add_argument("--output", default=None, help="also write the results as JSON here")
+    args = parser.parse_args()
+    if not args.replay and not args.dst_model:
+        parser.error("nothing to evaluate: pass --replay and/or --dst-model")
+
+    results = {}
+    if args.replay:
+        print(f"=== BLEU: {args.replay} ===")
+        results["bleu"] = evaluate_bleu(args.replay, num_workers=args.workers, shard_size=args.shard_size)
+
+    if args.dst_model:
+        print(f"\n=== DST: {args.dst_model} on the {args.dst_split} split ===")
+        from huggingface_demo.parsing_models import GelatoParsingModel
+
+        start = time.perf_counter()
+        model = GelatoParsingModel(model_path=args.dst_model, batch_size=args.dst_batch_size,
+                                   quantize=args.quantize, constrained=args.constrained)
+        load_s = time.perf_counter() - start
+        examples = load_dst_examples(args.dst_data, args.dst_split)
+        results["dst"] = evaluate_dst(model, examples, batch_size=args.dst_batch_size)
+        results["dst"]["timings"]["load_model_s"] = load_s
+        print(f"Model loaded in {load_s:.1f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import numpy as np
+from token_counter import count_tokens
+
+_WORDS = ("Cambridge colleges gelato flavour scoop cone river punting library lecture "
+          "supervision formal hall chapel garden bridge student tradition history").split()
+
+
+class FakeAPIError(Exception):
+    """Simulated API failure, carrying an HTTP status code like the OpenAI SDK errors."""
+
+    def __init__(self, status_code: int, message: str = "Simulated API error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+class Latency:
+    """
+    Latency distribution for simulated requests.
+    kind: "fixed" (always mean_ms), "uniform" (mean_ms +/- spread_ms)
+          or "lognormal" (median mean_ms, shape `sigma`, long right tail like real APIs).
+    """
+
+    def __init__(self, kind: str = "lognormal", mean_ms: float = 300.0, spread_ms: float = 100.0,
+                 sigma: float = 0.5):
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency kind '{kind}'.")
+        self.kind = kind
+        self.mean_ms = mean_ms
+        self.spread_ms = spread_ms
+        self.sigma = sigma
+
+    def sample(self, rng) -> float:
+        """One latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.mean_ms
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.mean_ms - self.spread_ms, self.mean_ms + self.spread_ms)
+        else:
+            ms = self.mean_ms * rng.lognormvariate(0.0, self.sigma)
+        return max(0.0, ms) / 1000
+
+
+def text_deltas(text: str):
+    """Split a reply into streaming deltas, one word (with its leading space) each."""
+    return re.findall(r"\s*\S+", text)
+
+
+class FakeBackend:
+    """
+    Simulated `responses` and `embeddings` endpoints.
+    Replies and embeddings are deterministic functions of the request; latency and
+    injected errors are random (seeded). Request counts and prompt token counts are
+    recorded so benchmarks can report them.
+
+    `latency` is the time to the first token; with token_interval_ms > 0 every further
+    word of a reply takes that long to generate, so a streamed reply arrives word by word
+    while a non-streamed one is only returned once complete.
+    """
+
+    def __init__(self, latency: Latency = None, embedding_latency: Latency = None,
+                 error_rate: float = 0.0, embedding_dim: int = 256, reply_words: int = 30, seed: int = 0,
+                 token_interval_ms: float = 0.0):
+        self.latency = latency or Latency()
+        self.embedding_latency = embedding_latency or Latency(mean_ms=self.latency.mean_ms / 4,
+                                                              spread_ms=self.latency.spread_ms / 4)
+        self.error_rate = error_rate
+        self.embedding_dim = embedding_dim
+        self.reply_words = reply_words
+        self.token_interval = token_interval_ms / 1000
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = []
+        self.server_cpu_seconds = 0.0  # CPU time FakeOpenAIServer's threads spent serving requests
+
+    def _draw(self, latency: Latency):
+        """Count a request and draw its delay and whether it fails."""
+        with self._lock:
+            self.requests += 1
+            delay = latency.sample(self._rng)
+            fail = self._rng.random() < self.error_rate
+            status = None
+            if fail:
+                self.errors += 1
+                status = self._rng.choice((429, 500, 503))
+        return delay, fail, status
+
+    def _simulate(self, latency: Latency):
+        delay, fail, status = self._draw(latency)
+        time.sleep(delay)
+        if fail:
+            raise FakeAPIError(status)
+
+    async def _simulate_async(self, latency: Latency):
+        delay, fail, status = self._draw(latency)
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeAPIError(status)
+
+    @staticmethod
+    def _messages(input_):
+        if isinstance(input_, str):
+            return [{"role": "user", "content": input_}]
+        return list(input_)
+
+    def _reply_text(self, model: str, input_):
+        messages = self._messages(input_)
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        tokens = count_tokens(prompt)
+        with self._lock:
+            self.prompt_tokens.append(tokens)
+
+        system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        if "JSON" in system:
+            return json.dumps({"flavours": [], "size": "", "container": ""}), tokens
+        seed = int(hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        text = "Simulated reply: " + " ".join(rng.choice(_WORDS) for _ in range(self.reply_words)) + "."
+        return text, tokens
+
+    def _generation_time(self, text: str) -> float:
+        """Time to generate every word after the first."""
+        return self.token_interval * max(0, len(text_deltas(text)) - 1)
+
+    def reply(self, model: str, input_):
+        """Deterministic reply text for a `responses.create` request, plus its prompt token count."""
+        text, tokens = self._reply_text(model, input_)
+        self._simulate(self.latency)
+        if self.token_interval:
+            time.sleep(self._generation_time(text))
+        return text, tokens
+
+    def reply_stream(self, model: str, input_):
+        """reply() as a generator of text deltas: the first after `latency`, then one per token interval."""
+        text, _ = self._reply_text(model, input_)
+        self._simulate(self.latency)
+        for i, delta in enumerate(text_deltas(text)):
+            if i and self.token_interval:
+                time.sleep(self.token_interval)
+            yield delta
+
+    async def reply_async(self, model: str, input_):
+        text, tokens = self._reply_text(model, input_)
+        await self._simulate_async(self.latency)
+        if self.token_interval:
+            await asyncio.sleep(self._generation_time(text))
+        return text, tokens
+
+    async def reply_stream_async(self, model: str, input_):
+        text, _ = self._reply_text(model, input_)
+        await self._simulate_async(self.latency)
+        for i, delta in enumerate(text_deltas(text)):
+            if i and self.token_interval:
+                await asyncio.sleep(self.token_interval)
+            yield delta
+
+    def embed(self, model: str, inputs):
+        """Deterministic unit-length embeddings, one per input."""
+        if isinstance(inputs, (str, int)) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        self._simulate(self.embedding_latency)
+        vectors = []
+        for item in inputs:
+            text = item if isinstance(item, str) else json.dumps(item)
+            seed = int(hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()[:16], 16)
+            vector = np.random.default_rng(seed).normal(size=self.embedding_dim).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+
+# --- In-process client -------------------------------------------------------------
+
+class _Object:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _response_object(model, text, input_tokens):
+    return _Object(id=f"resp_{uuid.uuid4().hex}", model=model, output_text=text,
+                   usage=_Object(input_tokens=input_tokens, output_tokens=count_tokens(text)))
+
+
+class _FakeResponses:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, model, input, stream=False, **kwargs):
+        if stream:
+            return self._events(model, input)
+        text, input_tokens = self._backend.reply(model, input)
+        return _response_object(model, text, input_tokens)
+
+    def _events(self, model, input_):
+        parts = []
+        for delta in self._backend.reply_stream(model, input_):
+            parts.append(delta)
+            yield _Object(type="response.output_text.delta", delta=delta)
+        yield _Object(type="response.completed", response=_response_object(model, "".join(parts), 0))
+
+
+class _FakeEmbeddings:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, model, input, **kwargs):
+        vectors = self._backend.embed(model, input)
+        return _Object(model=model, data=[_Object(index=i, embedding=v.tolist()) for i, v in enumerate(vectors)])
+
+
+class FakeOpenAI:
+    """Drop-in replacement for `openai.OpenAI` that never touches the network."""
+
+    def __init__(self, backend: FakeBackend = None, **backend_kwargs):
+        self.backend = backend or FakeBackend(**backend_kwargs)
+        self.responses = _FakeResponses(self.backend)
+        self.embeddings = _FakeEmbeddings(self.backend)
+
+
+class _FakeAsyncResponses:
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def create(self, model, input, stream=False, **kwargs):
+        if stream:
+            return self._events(model, input)
+        text, input_tokens = await self._backend.reply_async(model, input)
+        return _response_object(model, text, input_tokens)
+
+    async def _events(self, model, input_):
+        """The Responses API stream: output_text.delta events, then response.completed."""
+        parts = []
+        async for delta in self._backend.reply_stream_async(model, input_):
+            parts.append(delta)
+            yield _Object(type="response.output_text.delta", delta=delta)
+        text = "".join(parts)
+        yield _Object(type="response.completed", response=_response_object(model, text, 0))
+
+
+class _FakeAsyncEmbeddings:
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def create(self, model, input, **kwargs):
+        return await asyncio.to_thread(_FakeEmbeddings(self._backend).create, model, input)
+
+
+class FakeAsyncOpenAI:
+    """Drop-in replacement for `openai.AsyncOpenAI`, including responses.create(stream=True)."""
+
+    def __init__(self, backend: FakeBackend = None, **backend_kwargs):
+        self.backend = backend or FakeBackend(**backend_kwargs)
+        self.responses = _FakeAsyncResponses(self.backend)
+        self.embeddings = _FakeAsyncEmbeddings(self.backend)
+
+
+# --- Localhost HTTP server --------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    backend = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_one_request(self):
+        # Thread CPU time: a keep-alive connection waiting for its next request costs nothing
+        start = time.thread_time()
+        try:
+            super().handle_one_request()
+        finally:
+            elapsed = time.thread_time() - start
+            with self.backend._lock:
+                self.backend.server_cpu_seconds += elapsed
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.rstrip("/")
+        try:
+            if path.endswith("/responses") and request.get("stream"):
+                self._stream_responses(request)
+                return
+            if path.endswith("/responses"):
+                payload = self._responses(request)
+            elif path.endswith("/embeddings"):
+                payload = self._embeddings(request)
+            elif path.endswith("/chat/completions"):
+                payload = self._chat_completions(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "not_found"}})
+                return
+        except FakeAPIError as e:
+            self._send_json(e.status_code, {"error": {"message": str(e), "type": "server_error"}})
+            return
+        self._send_json(200, payload)
+
+    def _responses(self, request):
+        text, input_tokens = self.backend.reply(request.get("model"), request.get("input", ""))
+        return self._response_payload(request.get("model"), text, input_tokens)
+
+    @staticmethod
+    def _response_payload(model, text, input_tokens):
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": "completed",
+            "output": [{
+                "id": f"msg_{uuid.uuid4().hex}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}]
+            }],
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {"input_tokens": input_tokens, "output_tokens": count_tokens(text),
+                      "total_tokens": input_tokens + count_tokens(text)}
+        }
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_responses(self, request):
+        """responses.create(stream=True): server-sent events over a chunked keep-alive response."""
+        deltas = self.backend.reply_stream(request.get("model"), request.get("input", ""))
+        first = next(deltas)  # waits for the first token; simulated errors are raised before any header is sent
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        item_id = f"msg_{uuid.uuid4().hex}"
+        parts = []
+        sequence_number = 0
+        for delta in itertools.chain([first], deltas):
+            parts.append(delta)
+            self._write_event({"type": "response.output_text.delta", "item_id": item_id, "output_index": 0,
+                               "content_index": 0, "delta": delta, "logprobs": [],
+                               "sequence_number": sequence_number})
+            sequence_number += 1
+        response = self._response_payload(request.get("model"), "".join(parts), 0)
+        self._write_event({"type": "response.completed", "response": response, "sequence_number": sequence_number})
+        self._write_chunk(b"")
+
+    def _write_event(self, event: dict):
+        self._write_chunk(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+
+    def _embeddings(self, request):
+        vectors = self.backend.embed(request.get("model"), request.get("input", []))
+        as_base64 = request.get("encoding_format") == "base64"
+        data = [{
+            "object": "embedding",
+            "index": i,
+            "embedding": base64.b64encode(v.astype("<f4").tobytes()).decode("ascii") if as_base64 else v.tolist()
+        } for i, v in enumerate(vectors)]
+        return {"object": "list", "data": data, "model": request.get("model"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    def _chat_completions(self, request):
+        text, input_tokens = self.backend.reply(request.get("model"), request.get("messages", []))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": input_tokens, "completion_tokens": count_tokens(text),
+                      "total_tokens": input_tokens + count_tokens(text)}
+        }
+
+
+class FakeOpenAIServer:
+    """
+    Serve a FakeBackend on localhost with the OpenAI REST layout
+    (/v1/responses, /v1/embeddings, /v1/chat/completions).
+    Point any OpenAI SDK client at it with base_url=server.base_url.
+    """
+
+    def __init__(self, backend: FakeBackend = None, host: str = "127.0.0.1", port: int = 0):
+        self.backend = backend or FakeBackend()
+        handler = type("FakeOpenAIHandler", (_Handler,), {"backend": self.backend})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = FakeOpenAIServer(FakeBackend(), port=8765).start()
+    print(f"Fake OpenAI backend listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
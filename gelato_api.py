@@ -1,5 +1,11 @@
-from PIL import Image, ImageDraw
+from collections import Counter, OrderedDict, defaultdict
+from PIL import Image, ImageColor, ImageDraw
 import difflib
+import functools
+import io
+import itertools
+import threading
+import tracing
 
 flavor_colors = {
     'Baked Vanilla': '#F3E5AB',
@@ -18,67 +24,295 @@ flavor_colors = {
     'coconut and ube': '#7D26CD'
 }
 
-def draw_ice_cream(flavours, size, container):
+SIZES = {'Single Scoop': 1, 'Double Scoop': 2, 'Triple Scoop': 3}
+CONTAINER_COLOURS = {'Normal Cone': '#D2B48C', 'Paper Cup': '#F5F5F5', 'Chocolate Dipped Waffle Cone': '#8B4513'}
+CONTAINERS = list(CONTAINER_COLOURS)
+CANVAS_SIZE = (400, 500)
+BACKGROUND = 'lightblue'
 
-    width, height = 400, 500
-    img = Image.new('RGB', (width, height), 'lightblue')
-    draw = ImageDraw.Draw(img)
 
-    sizes = {'Single Scoop': 1, 'Double Scoop': 2, 'Triple Scoop': 3}
-    num_scoops = sizes[size]
+def _scoop_top(num_scoops, container):
+    container_adjust_y = 50 if container == 'Paper Cup' else 20
+    return 300 + container_adjust_y - (100 * num_scoops)
+
 
+def _draw_container(draw, container, dx=0, dy=0, fill=None):
+    """Draw the container, offset by (-dx, -dy); `fill` overrides its colour (e.g. for masks)."""
+    if container not in CONTAINER_COLOURS:
+        return
+    fill = CONTAINER_COLOURS[container] if fill is None else fill
     if container == 'Paper Cup':
-        container_adjust_y = 50
+        draw.rectangle([150 - dx, 300 - dy, 250 - dx, 400 - dy], fill=fill)  # Cup
     else:
-        container_adjust_y = 20
+        draw.polygon([(160 - dx, 300 - dy), (240 - dx, 300 - dy), (200 - dx, 400 - dy)], fill=fill)  # Cone
 
 
-    scoop_y = 300 + container_adjust_y- (100 * num_scoops)
+def draw_ice_cream_image(flavours, size, container):
+    """Draw the gelato from scratch and return the PIL image."""
+    img = Image.new('RGB', CANVAS_SIZE, BACKGROUND)
+    draw = ImageDraw.Draw(img)
+
+    num_scoops = SIZES[size]
+    scoop_y = _scoop_top(num_scoops, container)
     for i in range(num_scoops):
         flavor_color = flavor_colors.get(flavours[i], 'lightblue')  # Default to white if flavor not found
         draw.ellipse([150, scoop_y, 250, scoop_y + 100], fill=flavor_color)
         scoop_y += 100  # Move up for next scoop
 
-    if container == 'Normal Cone':
-        draw.polygon([(160, 300), (240, 300), (200, 400)], fill='#D2B48C')  # Cone
-    elif container == 'Paper Cup':
-        draw.rectangle([150, 300, 250, 400], fill='#F5F5F5')  # Cup
-    elif container == 'Chocolate Dipped Waffle Cone':
-        draw.polygon([(160, 300), (240, 300), (200, 400)], fill='#8B4513')  # Chocolate Cone
+    _draw_container(draw, container)
+    return img
+
+
+def draw_ice_cream(flavours, size, container, img_path='./ice_cream.png'):
+    img = draw_ice_cream_image(flavours, size, container)
 
     # Save image
-    img_path = './ice_cream.png'
     img.save(img_path)
     return img_path
 
-def find_most_similar(available_values, input_values):
-    matches = []
-    for input_value in input_values:
-        best_match = difflib.get_close_matches(input_value, available_values, n=1, cutoff=0.0)
-        matched_value = best_match[0] if best_match else None
-        matches.append(matched_value)
 
-    return matches
+class GelatoRenderer:
+    """
+    In-memory gelato renderer returning encoded image bytes.
+    Images are composited from pre-rendered sprites (background, one scoop per colour,
+    one sprite per container) and identical orders are served from a bounded LRU.
+    Everything is drawn on a palette image, which encodes several times faster than RGB;
+    decoded, the output is pixel-identical to draw_ice_cream_image. Safe to share between threads.
+    """
+
+    # Sprite positions on the 400x500 canvas
+    SCOOP_LEFT, SCOOP_SIZE = 150, (101, 101)
+    CONTAINER_BOX = (150, 300, 251, 401)
+
+    def __init__(self, max_entries: int = 1024, image_format: str = 'PNG'):
+        self.max_entries = max_entries
+        self.image_format = image_format
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        colours = [BACKGROUND] + list(flavor_colors.values()) + list(CONTAINER_COLOURS.values())
+        self._palette_index = {}
+        palette = []
+        for colour in colours:
+            if colour not in self._palette_index:
+                self._palette_index[colour] = len(self._palette_index)
+                palette.extend(ImageColor.getrgb(colour))
+        self._palette = palette
+
+        self._background = self._new_image(CANVAS_SIZE, BACKGROUND)
+        self._scoop_mask = Image.new('L', self.SCOOP_SIZE, 0)
+        ImageDraw.Draw(self._scoop_mask).ellipse([0, 0, 100, 100], fill=255)
+        self._scoops = {colour: self._new_image(self.SCOOP_SIZE, colour) for colour in colours}
+
+        # Containers are drawn once onto their own box; the mask records which pixels they cover
+        self._containers = {}
+        left, top, right, bottom = self.CONTAINER_BOX
+        for container, colour in CONTAINER_COLOURS.items():
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            _draw_container(ImageDraw.Draw(mask), container, dx=left, dy=top, fill=255)
+            self._containers[container] = (self._new_image(mask.size, colour), mask)
+
+    def _new_image(self, size, colour):
+        img = Image.new('P', size, self._palette_index[colour])
+        img.putpalette(self._palette)
+        return img
+
+    def render_image(self, flavours, size, container):
+        """Composite the gelato from sprites and return the palette image (uncached)."""
+        img = self._background.copy()
+        num_scoops = SIZES[size]
+        scoop_y = _scoop_top(num_scoops, container)
+        for i in range(num_scoops):
+            colour = flavor_colors.get(flavours[i], 'lightblue')
+            img.paste(self._scoops[colour], (self.SCOOP_LEFT, scoop_y), self._scoop_mask)
+            scoop_y += 100
+        if container in self._containers:
+            sprite, mask = self._containers[container]
+            img.paste(sprite, self.CONTAINER_BOX[:2], mask)
+        return img
+
+    @tracing.traced("draw")
+    def render(self, flavours, size, container) -> bytes:
+        """Encoded image bytes for the order, from the LRU when the same order was rendered before."""
+        key = (tuple(flavours[:SIZES[size]]), size, container)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        img = self.render_image(flavours, size, container)
+        if self.image_format != 'PNG':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format=self.image_format)
+        data = buffer.getvalue()
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data
+
+    def catalogue(self, max_scoops: int = 3):
+        """Every (flavours, size, container) combination on the menu, smallest orders first."""
+        for size, num_scoops in SIZES.items():
+            if num_scoops > max_scoops:
+                continue
+            for flavours in itertools.product(flavor_colors, repeat=num_scoops):
+                for container in CONTAINERS:
+                    yield list(flavours), size, container
+
+    def prewarm(self, max_scoops: int = 3, limit: int = None):
+        """
+        Render the catalogue into the cache: all of it (default), or its first `limit` orders,
+        smallest orders first. max_entries grows to fit, so no pre-warmed image is evicted by another.
+        """
+        orders = list(itertools.islice(self.catalogue(max_scoops), limit))
+        with self._lock:
+            self.max_entries = max(self.max_entries, len(orders))
+        for order in orders:
+            self.render(*order)
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
 
-def get_gelato(state):
+_renderer = None
+_renderer_lock = threading.Lock()
 
+
+def get_renderer() -> GelatoRenderer:
+    """The process-wide renderer shared by get_gelato and render_gelato."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = GelatoRenderer()
+        return _renderer
+
+
+class CatalogueMatcher:
+    """
+    Fuzzy matcher for one catalogue, built once and reused across orders.
+
+    Gives the same top-1 result as difflib.get_close_matches(value, catalogue, n=1, cutoff=0.0):
+    the highest SequenceMatcher ratio, ties going to the larger string. Character trigrams
+    in an inverted index shortlist the likely candidates, which are scored first; every other
+    entry is skipped as soon as the cheap upper bounds on its ratio (length, then character
+    counts) show it cannot beat the best score so far. Results are memoised per input value.
+    """
+
+    def __init__(self, catalogue, n: int = 3, shortlist_size: int = 8, memo_size: int = 4096):
+        self.catalogue = list(dict.fromkeys(catalogue))
+        self.n = n
+        self.shortlist_size = shortlist_size
+        self._lengths = [len(entry) for entry in self.catalogue]
+        self._char_counts = [Counter(entry) for entry in self.catalogue]
+        self._index = defaultdict(list)
+        for i, entry in enumerate(self.catalogue):
+            for gram in self._ngrams(entry):
+                self._index[gram].append(i)
+        self.match = functools.lru_cache(maxsize=memo_size)(self._match)
+
+    def _ngrams(self, text: str):
+        padded = f" {text.casefold()} "
+        return {padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1))}
+
+    def _shortlist(self, value: str):
+        overlap = Counter()
+        for gram in self._ngrams(value):
+            overlap.update(self._index.get(gram, ()))
+        return [i for i, _ in overlap.most_common(self.shortlist_size)]
+
+    def _match(self, value: str):
+        """Best catalogue entry for `value`, or None for an empty catalogue."""
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(value)
+        value_counts = Counter(value)
+        best_score, best_entry = -1.0, None
+
+        shortlist = self._shortlist(value)
+        seen = set(shortlist)
+        order = shortlist + [i for i in range(len(self.catalogue)) if i not in seen]
+        for i in order:
+            entry = self.catalogue[i]
+            if best_entry is not None:
+                # Upper bounds on the ratio: real_quick_ratio, then quick_ratio
+                total = self._lengths[i] + len(value)
+                bound = 2.0 * min(self._lengths[i], len(value)) / total if total else 1.0
+                if (bound, entry) <= (best_score, best_entry):
+                    continue
+                common = sum(min(count, value_counts[char]) for char, count in self._char_counts[i].items())
+                bound = 2.0 * common / total if total else 1.0
+                if (bound, entry) <= (best_score, best_entry):
+                    continue
+            matcher.set_seq1(entry)
+            score = matcher.ratio()
+            if (score, entry) > (best_score, best_entry or ""):
+                best_score, best_entry = score, entry
+        return best_entry
+
+    def match_many(self, values):
+        """Best catalogue entry for each of `values`; repeated values are only matched once."""
+        return [self.match(value) for value in values]
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(available_values) -> CatalogueMatcher:
+    """The cached matcher for a catalogue; a changed catalogue gets a new matcher."""
+    key = tuple(available_values)
+    with _matchers_lock:
+        if key not in _matchers:
+            _matchers[key] = CatalogueMatcher(key)
+        return _matchers[key]
+
+def find_most_similar(available_values, input_values):
+    return get_matcher(available_values).match_many(input_values)
+
+@tracing.traced("match")
+def normalise_order(state):
+    """Map a parsed order onto the menu: (flavours, size, container) ready for drawing."""
     flavours = state["flavours"]
     size = state["size"]
     container = state["container"]
 
     flavours = find_most_similar(flavor_colors.keys(), flavours)
 
-    size = find_most_similar(["Single Scoop", "Double Scoop", "Triple Scoop"], [size])[0]
-    container = find_most_similar(["Normal Cone", "Paper Cup", "Chocolate Dipped Waffle Cone" ], [container])[0]
-    sizes = {'Single Scoop': 1, 'Double Scoop': 2, 'Triple Scoop': 3}
-    num_scoops = sizes[size]
+    size = find_most_similar(list(SIZES), [size])[0]
+    container = find_most_similar(CONTAINERS, [container])[0]
+    num_scoops = SIZES[size]
 
     if len(flavours) < num_scoops:
         num_scoops = len(flavours)
-        size = ["Single Scoop", "Double Scoop", "Triple Scoop"][num_scoops-1]
+        size = list(SIZES)[num_scoops-1]
     else:
         flavours = flavours[-num_scoops:]
-    return draw_ice_cream(flavours, size, container)
+    return flavours, size, container
+
+def render_gelato(state) -> bytes:
+    """PNG bytes of the gelato for a parsed order; nothing is written to disk."""
+    return get_renderer().render(*normalise_order(state))
+
+def get_gelato(state, img_path='./ice_cream.png'):
+    """Render the gelato for a parsed order and save it to `img_path`."""
+    data = render_gelato(state)
+    with tracing.span("save"), open(img_path, 'wb') as f:
+        f.write(data)
+    return img_path
 
 if __name__ == '__main__':
 
@@ -1,7 +1,34 @@
-from openai import OpenAI
-from gelato_api import get_gelato
-from gelato_semantic_parser import parse_gelato_order
-import os, json, sys
+from concurrent.futures import ThreadPoolExecutor
+from openai_clients import get_client, get_async_client, stream_text
+from gelato_api import get_gelato, get_renderer, render_gelato
+from gelato_fast_parser import FastOrderParser, parse_with_fallback
+from gelato_semantic_parser import parse_gelato_order, update_gelato_order
+import asyncio
+import json
+import logging
+import threading
+import time
+import tracing
+
+logger = logging.getLogger(__name__)
+
+EMPTY_ORDER = {"flavours": [], "size": "", "container": ""}
+
+_speculative_pool = None
+_speculative_pool_lock = threading.Lock()
+
+
+def _get_speculative_pool() -> ThreadPoolExecutor:
+    """
+    The process-wide pool that writes speculative replies, shared by every GelatoBot so that
+    sessions evicted by a SessionManager leave no threads behind. A turn only waits on its own
+    reply, so when more turns are in flight than there are workers, replies just queue.
+    """
+    global _speculative_pool
+    with _speculative_pool_lock:
+        if _speculative_pool is None:
+            _speculative_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gelato-speculative")
+        return _speculative_pool
 
 
 class GelatoBot:
@@ -9,38 +36,53 @@ class GelatoBot:
     A conversational agent that understands user utterances about gelato,
     parses them into structured orders, and uses an LLM to generate natural responses.
     When the order is complete, it calls the Gelato API to generate the ice cream image.
-    """
 
-    def __init__(self, model="gpt-5-nano-2025-08-07", key_path="openai.key"):
-        self._load_openai_key(key_path)
-        self.client = OpenAI()
-        self.model = model
-        self.conversation_history = []
+    pipeline="sequential" parses the order, then writes the reply.
+    pipeline="speculative" writes the reply for the previous turn's order while the
+    parse runs; if the parse changes the order, that reply is discarded and regenerated.
+    Turns where the order is unchanged then cost max(parse, reply) instead of parse + reply.
 
-    def _load_openai_key(self, key_path: str):
-        if not os.path.exists(key_path):
-            sys.exit(f"Error: The API key file '{key_path}' was not found.")
-        with open(key_path, "r", encoding="utf-8") as f:
-            api_key = f.read().strip()
-        os.environ["OPENAI_API_KEY"] = api_key
-        print("OpenAI API key loaded successfully.\n")
+    state_tracking="full" re-parses the whole transcript every turn.
+    state_tracking="incremental" sends the previous order plus only the newest turns.
+    max_context_turns bounds how many recent messages go into the reply prompt (None: all),
+    so that per-turn prompt size stays flat over long conversations.
 
-    def chat(self, user_input: str):
-        self.conversation_history.append({"role": "user", "content": user_input})
+    image_path is where the gelato image of a completed order is saved; with image_path=None
+    nothing is written to disk and the PNG bytes are returned as result["image_bytes"] instead.
+    prewarm_images=True renders every order in the catalogue into the image cache at start-up
+    (about 8.9k images; the cache grows to hold them all).
 
-        # Combine full conversation into one text block
-        conversation = "\n".join(
-            [f"{m['role'].capitalize()}: {m['content']}" for m in self.conversation_history]
-        )
+    fast_path=True tries the local rule parser (gelato_fast_parser) first and only calls
+    the LLM parser when its confidence is below fast_path_threshold.
+    """
 
-        # --- Step 1: Semantic parsing ---
-        order = parse_gelato_order(conversation)
-        print("\nParsed Order:\n", json.dumps(order, indent=4))
+    def __init__(self, model="gpt-5-nano-2025-08-07", key_path="openai.key", pipeline="sequential",
+                 state_tracking="full", max_context_turns=None, image_path="./ice_cream.png",
+                 prewarm_images=False, fast_path=False, fast_path_threshold=0.8):
+        if pipeline not in ("sequential", "speculative"):
+            raise ValueError(f"Unknown pipeline '{pipeline}', expected 'sequential' or 'speculative'.")
+        if state_tracking not in ("full", "incremental"):
+            raise ValueError(f"Unknown state tracking '{state_tracking}', expected 'full' or 'incremental'.")
+        self.key_path = key_path
+        self.client = get_client(key_path)
+        self.model = model
+        self.pipeline = pipeline
+        self.state_tracking = state_tracking
+        self.max_context_turns = max_context_turns
+        self.image_path = image_path
+        if prewarm_images:
+            get_renderer().prewarm()
+        self.fast_parser = FastOrderParser() if fast_path else None
+        self.fast_path_threshold = fast_path_threshold
+        self.conversation_history = []
+        self.current_order = dict(EMPTY_ORDER)
+        self._fast_path_hit = False
 
-        # --- Step 2: Check if order complete ---
-        order_complete = bool(order["flavours"] and order["size"] and order["container"])
+    @staticmethod
+    def _format_turns(messages) -> str:
+        return "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
 
-        # --- Step 3: Use LLM to generate response ---
+    def _reply_messages(self, order: dict, conversation: str) -> list:
         system_prompt = (
             "You are GelatoBot, a friendly and polite assistant working at Jack's Gelato. "
             "You help customers place ice cream orders and make small talk if needed. "
@@ -48,28 +90,162 @@ class GelatoBot:
             "If something is missing (flavours, size, or container), ask naturally for clarification."
         )
 
+        context_label = "Conversation so far" if self.max_context_turns is None else "Most recent conversation turns"
         user_prompt = (
             f"Here is the current parsed order:\n{json.dumps(order, indent=4)}\n\n"
-            f"Conversation so far:\n{conversation}\n\n"
+            f"{context_label}:\n{conversation}\n\n"
             f"Please write the next assistant message."
         )
 
-        response = self.client.responses.create(
-            model=self.model,
-            input=[{"role": "system", "content": system_prompt},
-                   {"role": "user", "content": user_prompt}]
-        )
-        reply_text = response.output_text.strip()
+        return [{"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}]
 
-        print("\nAssistant:", reply_text)
+    @tracing.traced("reply")
+    def _generate_reply(self, order: dict, conversation: str) -> str:
+        with tracing.span("llm"):
+            response = self.client.responses.create(
+                model=self.model,
+                input=self._reply_messages(order, conversation)
+            )
+        return response.output_text.strip()
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        return fn(), time.perf_counter() - start
+
+    def _parse_with_llm(self, conversation: str) -> dict:
+        if self.state_tracking == "incremental":
+            # Previous order + the last assistant message and the new user message
+            new_turns = self._format_turns(self.conversation_history[-2:])
+            return update_gelato_order(self.current_order, new_turns, key_path=self.key_path)
+        if self.max_context_turns is not None:
+            conversation = self._format_turns(self.conversation_history)
+        return parse_gelato_order(conversation, key_path=self.key_path)
+
+    @tracing.traced("parse")
+    def _parse(self, conversation: str):
+        """Run state tracking; `conversation` is the reply context, reused when it is the full transcript."""
+        if self.fast_parser is None:
+            return self._timed(lambda: self._parse_with_llm(conversation))
+        user_input = self.conversation_history[-1]["content"]
+        (order, self._fast_path_hit), seconds = self._timed(lambda: parse_with_fallback(
+            self.fast_parser, self.current_order, user_input,
+            lambda: self._parse_with_llm(conversation), self.fast_path_threshold))
+        return order, seconds
+
+    def _begin_turn(self, user_input: str) -> str:
+        """Add the user turn; returns the conversation (or its most recent turns) as one text block for the reply."""
+        self.conversation_history.append({"role": "user", "content": user_input})
+        context = self.conversation_history
+        if self.max_context_turns is not None:
+            context = context[-self.max_context_turns:]
+        return self._format_turns(context)
+
+    @tracing.turn
+    def chat(self, user_input: str):
+        turn_start = time.perf_counter()
+        conversation = self._begin_turn(user_input)
+
+        speculation = None
+        if self.pipeline == "speculative":
+            # --- Steps 1+2 in parallel: reply for the last known order while parsing ---
+            speculative_order = self.current_order
+            speculative_reply = _get_speculative_pool().submit(
+                tracing.in_context(self._timed), lambda: self._generate_reply(speculative_order, conversation))
+            order, parse_seconds = self._parse(conversation)
+            reply_text, reply_seconds = speculative_reply.result()
+            speculation = "hit" if order == speculative_order else "miss"
+        else:
+            # --- Step 1: Semantic parsing ---
+            order, parse_seconds = self._parse(conversation)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed Order:\n%s", json.dumps(order, indent=4))
+
+        # --- Step 2: Use LLM to generate response (again, if the speculation was wrong) ---
+        wasted_seconds = 0.0
+        if speculation != "hit":
+            wasted_seconds = reply_seconds if speculation == "miss" else 0.0
+            reply_text, reply_seconds = self._timed(lambda: self._generate_reply(order, conversation))
+
+        timings = {"parse_s": parse_seconds, "reply_s": reply_seconds}
+        if self.fast_parser is not None:
+            timings["parser"] = "fast" if self._fast_path_hit else "llm"
+        if speculation is not None:
+            timings["speculation"] = speculation
+            timings["discarded_reply_s"] = wasted_seconds
+        return self._finish_turn(order, reply_text, timings, turn_start)
+
+    def _finish_turn(self, order: dict, reply_text: str, timings: dict, turn_start: float) -> dict:
+        """Render the gelato if the order is complete, record the turn and build the chat() result."""
+        # --- Step 3: Check if order complete ---
+        order_complete = bool(order["flavours"] and order["size"] and order["container"])
 
         # --- Step 4: Generate gelato image if ready ---
-        if order_complete:
-            image_path = get_gelato(order)
-            print(f"Gelato image saved to: {image_path}\n")
+        image_path, image_bytes = None, None
+        with tracing.span("render"):
+            if order_complete and self.image_path is not None:
+                image_path = get_gelato(order, self.image_path)
+                logger.info("Gelato image saved to: %s", image_path)
+            elif order_complete:
+                image_bytes = render_gelato(order)
 
+        self.current_order = order
         self.conversation_history.append({"role": "assistant", "content": reply_text})
 
+        timings["total_s"] = time.perf_counter() - turn_start
+        result = {
+            "text": reply_text,
+            "order": order,
+            "image_path": image_path,
+            "timings": timings
+        }
+        if image_bytes is not None:
+            result["image_bytes"] = image_bytes
+        return result
+
+    async def chat_stream(self, user_input: str, result: dict = None):
+        """
+        chat() as an async generator of reply text deltas; `result` (if given) is filled with the
+        chat() result when the stream ends. The reply streams from the async client while parsing
+        and image rendering run in worker threads. The turn is only kept in the history once the
+        reply is complete; a stream closed early leaves the history unchanged. The speculative pipeline is not streamed:
+        its reply may be discarded after the parse, so it runs chat() in a thread instead.
+        """
+        if self.pipeline == "speculative":
+            turn = await asyncio.to_thread(self.chat, user_input)
+            if result is not None:
+                result.update(turn)
+            yield turn["text"]
+            return
+
+        turn_start = time.perf_counter()
+        conversation = self._begin_turn(user_input)
+        user_turn = self.conversation_history[-1]
+        finished = False
+        try:
+            order, parse_seconds = await asyncio.to_thread(self._parse, conversation)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Parsed Order:\n%s", json.dumps(order, indent=4))
+
+            reply_start = time.perf_counter()
+            parts = []
+            client = get_async_client(self.key_path)
+            async for delta in stream_text(client, self.model, self._reply_messages(order, conversation), parts):
+                yield delta
+            reply_text = "".join(parts).strip()
+
+            timings = {"parse_s": parse_seconds, "reply_s": time.perf_counter() - reply_start}
+            if self.fast_parser is not None:
+                timings["parser"] = "fast" if self._fast_path_hit else "llm"
+            turn = await asyncio.to_thread(self._finish_turn, order, reply_text, timings, turn_start)
+            finished = True
+        finally:
+            # A stream closed (or failed) before the reply completed leaves the history as it was
+            if not finished and self.conversation_history and self.conversation_history[-1] is user_turn:
+                self.conversation_history.pop()
+        if result is not None:
+            result.update(turn)
+
     def start(self):
         print("Welcome to GelatoBot! Type 'bye' or 'exit' to exit.\n")
         while True:
@@ -77,9 +253,13 @@ class GelatoBot:
             if user_input.lower() in {"bye", "exit"}:
                 print("Goodbye!")
                 break
-            self.chat(user_input)
+            result = self.chat(user_input)
+            print("\nAssistant:", result["text"])
+            if result["image_path"]:
+                print(f"Gelato image saved to: {result['image_path']}\n")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
     bot = GelatoBot()
     bot.start()
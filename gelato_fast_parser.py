@@ -0,0 +1,211 @@
+import re
+from gelato_api import CONTAINERS, SIZES, flavor_colors, get_matcher
+
+EMPTY_ORDER = {"flavours": [], "size": "", "container": ""}
+
+# Short forms customers use for menu items, on top of the full names
+FLAVOUR_ALIASES = {
+    'Baked Vanilla': ['vanilla'],
+    'Manuka Honey & Fig': ['manuka honey', 'honey and fig', 'manuka'],
+    'Roasted Banana': ['banana'],
+    'King’s College Lavender': ['kings college lavender', 'lavender'],
+    'Passion Fruit Sorbet (vegan)': ['passion fruit', 'passionfruit'],
+    'House Yoghurt': ['yoghurt', 'yogurt'],
+    'Dark Chocolate & Sea Salt (vegan)': ['dark chocolate', 'chocolate and sea salt', 'chocolate sea salt'],
+    'Treacle Cake': ['treacle'],
+    'Strawberries & Cream': ['strawberries and cream', 'strawberry and cream', 'strawberries'],
+    'Coconut, Raspberry Ripple (vegan)': ['coconut raspberry ripple', 'raspberry ripple'],
+    'Organic Whisky; Nc’nean': ['organic whisky', 'whisky', 'whiskey'],
+    'coconut and ube': ['ube'],
+}
+CONTAINER_ALIASES = {
+    'Normal Cone': ['normal cone', 'regular cone', 'plain cone', 'cone'],
+    'Paper Cup': ['paper cup', 'cup', 'tub'],
+    'Chocolate Dipped Waffle Cone': ['chocolate dipped waffle cone', 'chocolate waffle cone', 'chocolate dipped', 'waffle cone', 'waffle'],
+}
+QUANTITIES = {'a': 1, 'an': 1, 'one': 1, 'single': 1, '1': 1, 'two': 2, 'double': 2, '2': 2,
+              'three': 3, 'triple': 3, '3': 3}
+SIZE_NAMES = {count: name for name, count in SIZES.items()}
+
+SIZE_PATTERN = re.compile(r"\b(a|an|one|two|three|1|2|3|single|double|triple)\b(\s+(?:more\s+|extra\s+)?scoops?\b)?")
+QUANTITY_TAIL = re.compile(r"\s*(?:of\s+)?(?:the\s+)?(?:secret flavour,?\s+)?")
+REMOVAL_CUE = re.compile(r"\b(?:no|not|without|remove|minus|skip|instead of|in place of|rather than|except|hold the|"
+                         r"replace|swap|switch|change)\s+(?:the\s+)?(?:scoop of\s+)?(?:the\s+)?$")
+ADD_CUE = re.compile(r"\b(add|adding|also|as well|another|extra|plus|more|top it)\b")
+ORDER_CUE = re.compile(r"\b(i'd|i would|i'll|i will|i want|can i|could i|may i|let's|let me|give me|add|make|"
+                       r"change|put|swap|replace|switch|remove|instead)\b")
+QUESTION_CUE = re.compile(r"\b(do you have|tell me|what|whats|which|how|is there|are there|is it|is the|are the|about)\b")
+REFERENCE_CUE = re.compile(r"\b(secret|special|recommend\w*|suggest\w*|same|that one|this one|the other|"
+                           r"that flavour|those|it)\b")
+CONTAINER_REFERENCE = re.compile(r"\b(?:that|this|my|the same)\s+$")
+CLOSING_CUE = re.compile(r"\b(that'?s all|that will be all|that would be all|stick (?:to|with)|no,? thank|"
+                         r"nothing else|thank you|thanks)\b")
+
+
+def normalise_text(text: str) -> str:
+    text = text.casefold().replace("’", "'").replace("‘", "'").replace("-", " ")
+    text = text.replace("(vegan)", "").replace("'s ", "s ")
+    return " ".join(text.split())
+
+
+class FastOrderParser:
+    """
+    Rule-and-lexicon dialogue state tracker for gelato orders.
+
+    parse(previous_order, utterance) spots catalogue entities (flavours, sizes, containers)
+    in the newest customer utterance, applies quantity words ("two scoops of ..."),
+    additions ("add ...") and negations/replacements ("... instead of Treacle Cake",
+    "actually make that a cup") to the previous order, and returns (order, confidence).
+    The confidence is low when the utterance refers to something the lexicon cannot
+    resolve ("the secret flavour", "that one"), when the resulting order is inconsistent
+    (more or fewer flavours than scoops), or when an order request names nothing on the menu.
+    Callers should then fall back to the LLM or the T5 parsing model.
+    """
+
+    def __init__(self, flavours=None, containers=None):
+        flavours = list(flavor_colors) if flavours is None else list(flavours)
+        containers = CONTAINERS if containers is None else list(containers)
+        self.flavours = flavours
+        self.flavour_matcher = get_matcher(flavours)
+
+        entities = {}
+        for flavour in flavours:
+            base = normalise_text(flavour)
+            for alias in [base, base.replace(" & ", " and "), base.replace(",", ""), base.replace(";", "")] \
+                    + FLAVOUR_ALIASES.get(flavour, []):
+                entities.setdefault(normalise_text(alias), ("flavour", flavour))
+        for container in containers:
+            for alias in [normalise_text(container)] + CONTAINER_ALIASES.get(container, []):
+                entities.setdefault(alias, ("container", container))
+        self._entities = entities
+        # Longest aliases first, so "waffle cone" wins over "cone" and "coconut and ube" over "ube"
+        alternation = "|".join(re.escape(a) for a in sorted(entities, key=len, reverse=True))
+        self._entity_pattern = re.compile(rf"(?<![a-z])(?:{alternation})(?![a-z])")
+
+    def _spot(self, text):
+        """Entity mentions as (start, end, kind, value), left to right."""
+        return [(m.start(), m.end()) + self._entities[m.group(0)] for m in self._entity_pattern.finditer(text)]
+
+    def canonical(self, flavour: str) -> str:
+        return self.flavour_matcher.match(flavour)
+
+    def _question_spans(self, text):
+        """Sentences that only ask about the menu ("Do you have a vegan cone?"); their entities are not order content."""
+        spans = []
+        for m in re.finditer(r"[^.!?]+[.!?]?", text):
+            sentence = m.group(0)
+            if sentence.endswith("?") and QUESTION_CUE.search(sentence) and not ORDER_CUE.search(sentence):
+                spans.append((m.start(), m.end()))
+        return spans
+
+    def parse(self, previous_order, utterance: str):
+        """Return (updated order, confidence in [0, 1]) for the newest customer utterance."""
+        previous_order = previous_order or EMPTY_ORDER
+        text = normalise_text(utterance)
+        questions = self._question_spans(text)
+        mentions, asked_about = [], []
+        for mention in self._spot(text):
+            in_question = any(start <= mention[0] < end for start, end in questions)
+            (asked_about if in_question else mentions).append(mention)
+        flavour_mentions = [m for m in mentions if m[2] == "flavour"]
+        container_mentions = [m for m in mentions if m[2] == "container"]
+        taken = [(start, end) for start, end, _, _ in mentions + asked_about]
+
+        # --- Sizes and quantity words ("a triple scoop with ..." vs "two scoops of ...") ---
+        explicit_size, quantities, unresolved_scoops = None, {}, 0
+        for m in SIZE_PATTERN.finditer(text):
+            if any(start <= m.start() < end for start, end in taken + questions):
+                continue
+            count = QUANTITIES[m.group(1)]
+            if m.group(1) in ("double", "triple"):
+                explicit_size = count  # "a double scoop of Caramel and Treacle Cake" is the whole order
+                continue
+            following = [f for f in flavour_mentions if f[0] >= m.end()]
+            if m.group(2) and following and QUANTITY_TAIL.fullmatch(text[m.end():following[0][0]]):
+                quantities[following[0][3]] = quantities.get(following[0][3], 0) + count
+            elif m.group(2) and text[m.end():].lstrip().startswith("of "):
+                unresolved_scoops += count  # "one scoop of the secret flavour"
+            elif m.group(1) not in ("a", "an") and (m.group(2) or m.group(1) == "single"):
+                explicit_size = count
+
+        # --- Flavours: removals, additions, or a restated order ---
+        removed, mentioned = [], []
+        for start, _, _, flavour in flavour_mentions:
+            if REMOVAL_CUE.search(text[max(0, start - 30):start]):
+                removed.append(flavour)
+            elif flavour not in mentioned:
+                mentioned.append(flavour)
+        mentioned = [f for f in mentioned if f not in removed]
+
+        previous_flavours = list(previous_order.get("flavours", []))
+        previous_canonical = [self.canonical(f) for f in previous_flavours]
+        previous_scoops = SIZES.get(previous_order.get("size"), len(previous_flavours))
+        adding = bool(ADD_CUE.search(text))
+        modifying = bool(previous_flavours) and (bool(removed) or adding)
+
+        added = []
+        if modifying:
+            added = [f for f in mentioned if f not in previous_canonical]
+            flavours = [f for f, c in zip(previous_flavours, previous_canonical) if c not in removed]
+            if len(removed) == 1 and len(added) == 1 and removed[0] in previous_canonical:
+                # "replace X with Y": Y takes X's place
+                flavours.insert(previous_canonical.index(removed[0]), added[0])
+            else:
+                flavours += added
+            kept = [c for c in previous_canonical if c not in removed]
+            scoops = previous_scoops - (len(previous_flavours) - len(kept)) + unresolved_scoops \
+                + sum(quantities.get(f, 1) for f in added) + sum(quantities.get(f, 1) - 1 for f in kept)
+        elif mentioned:
+            flavours = mentioned
+            scoops = sum(quantities.get(f, 1) for f in mentioned) + unresolved_scoops
+        else:
+            flavours, scoops = previous_flavours, previous_scoops
+
+        if explicit_size is not None:
+            scoops = explicit_size
+        size = SIZE_NAMES.get(scoops, previous_order.get("size", "")) if flavours or explicit_size else ""
+
+        # --- Container: the last one mentioned, unless it is negated or refers to the current one ---
+        container = previous_order.get("container", "")
+        containers = []
+        for start, _, _, value in container_mentions:
+            before = text[max(0, start - 30):start]
+            if CONTAINER_REFERENCE.search(before):
+                continue  # "add a chocolate dipped to that cone"
+            if not REMOVAL_CUE.search(before) or "instead" in before[-12:]:
+                container = value
+                containers.append(value)
+
+        order = {"flavours": flavours, "size": size, "container": container}
+
+        # --- Confidence: anything the rules could not resolve sends the turn to the fallback ---
+        confidence = 1.0
+        if scoops > 3 or (flavours and size and len(flavours) > SIZES[size]):
+            confidence *= 0.3  # more flavours than scoops
+        if flavours and size and len(flavours) < SIZES[size] and order != previous_order \
+                and sum(quantities.values()) + unresolved_scoops < SIZES[size]:
+            confidence *= 0.4  # scoops without a flavour: probably "that one" or "the secret flavour"
+        if unresolved_scoops or (REFERENCE_CUE.search(text) and ((adding and not added) or (removed and not added))):
+            confidence *= 0.3  # "add a scoop of that", "replace the Gianduja with today's special"
+        if ORDER_CUE.search(text) and order == previous_order and not mentions and explicit_size is None \
+                and not CLOSING_CUE.search(text):
+            confidence *= 0.3  # "I'd like to try that": a request naming nothing on the menu
+        if len(set(containers)) > 1 and " or " in text:
+            confidence *= 0.3  # "a waffle cone or a cup?"
+        if modifying and added and containers and container != previous_order.get("container"):
+            confidence *= 0.5  # "add a single scoop of X in a paper cup": one order or two?
+        if asked_about and ORDER_CUE.search(text) and not mentions:
+            confidence *= 0.5
+        return order, confidence
+
+
+def parse_with_fallback(parser: FastOrderParser, previous_order, utterance: str, fallback, threshold: float = 0.8):
+    """
+    Fast path first: use the rule parser when it is confident, otherwise call fallback()
+    (e.g. the LLM parser, or GelatoParsingModel.predict on the dialogue history).
+    Returns (order, used_fast_path).
+    """
+    order, confidence = parser.parse(previous_order, utterance)
+    if confidence >= threshold:
+        return order, True
+    return fallback(), False
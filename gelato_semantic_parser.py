@@ -1,7 +1,11 @@
-from openai import OpenAI
-import os, json
+from openai_clients import get_client
+import json
+import logging
+import tracing
 from gelato_api import get_gelato
 
+logger = logging.getLogger(__name__)
+
 
 def parse_gelato_order(conversation, model="gpt-5-nano-2025-08-07", key_path="openai.key"):
     """
@@ -9,13 +13,8 @@ def parse_gelato_order(conversation, model="gpt-5-nano-2025-08-07", key_path="op
     Any missing fields are returned as empty strings.
     """
 
-    # --- Load API key ---
-    if not os.path.exists(key_path):
-        raise FileNotFoundError(f"API key file not found at {key_path}")
-    with open(key_path, "r") as f:
-        os.environ["OPENAI_API_KEY"] = f.read().strip()
-
-    client = OpenAI()
+    # --- Shared client: the key is read once and connections are reused across turns ---
+    client = get_client(key_path)
 
     system_prompt = (
         "You are a semantic parser for an ice cream shop called Jack's Gelato. "
@@ -29,17 +28,58 @@ def parse_gelato_order(conversation, model="gpt-5-nano-2025-08-07", key_path="op
     messages = [{"role": "system", "content": system_prompt},
                 {"role": "user", "content": conversation}]
 
-    response = client.responses.create(model=model, input=messages)
+    with tracing.span("llm"):
+        response = client.responses.create(model=model, input=messages)
     parsed_json = response.output_text.strip()
 
     try:
         order = json.loads(parsed_json)
     except json.JSONDecodeError:
-        print("Model output not valid JSON, returning empty fields.")
+        logger.warning("Model output not valid JSON, returning empty fields.")
         order = {"flavours": [], "size": "", "container": ""}
 
     return order
 
+
+def update_gelato_order(previous_order, new_turns, model="gpt-5-nano-2025-08-07", key_path="openai.key"):
+    """
+    Incremental state tracking: given the order so far and only the newest turns,
+    ask the LLM for the updated order. The prompt size no longer grows with the
+    length of the conversation. If the output is not valid JSON, the previous order is kept.
+    """
+    client = get_client(key_path)
+
+    system_prompt = (
+        "You are a dialogue state tracker for an ice cream shop called Jack's Gelato. "
+        "You are given the customer's current order as a JSON object with the fields "
+        "flavours (list of strings), size (string), and container (string), "
+        "followed by the newest turns of the conversation. "
+        "Return the updated order as a JSON object with the same fields. "
+        "Keep everything the customer did not change, and apply additions, removals and replacements. "
+        "If any information is missing, use an empty string (''). "
+        "Return only valid JSON and nothing else."
+    )
+
+    user_prompt = (
+        f"Current order:\n{json.dumps(previous_order)}\n\n"
+        f"Newest turns:\n{new_turns}"
+    )
+
+    messages = [{"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}]
+
+    with tracing.span("llm"):
+        response = client.responses.create(model=model, input=messages)
+    parsed_json = response.output_text.strip()
+
+    try:
+        order = json.loads(parsed_json)
+    except json.JSONDecodeError:
+        logger.warning("Model output not valid JSON, keeping the previous order.")
+        order = previous_order
+
+    return order
+
 if __name__ == "__main__":
     conversation = """
     User: Hi! What flavours do you have today?
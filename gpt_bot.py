@@ -1,7 +1,8 @@
 from dialogue_system import DialogueSystem
-from openai import OpenAI
-import os
-import sys
+from history_manager import HistoryManager, make_llm_summariser
+from openai_clients import get_client, get_async_client, stream_text
+import asyncio
+import tracing
 
 
 class GPTBot(DialogueSystem):
@@ -9,49 +10,51 @@ class GPTBot(DialogueSystem):
     A dialogue agent powered by OpenAI's GPT-5 Nano model.
     Extends the DialogueSystem base class to generate responses
     using the OpenAI API.
+
+    history_token_budget bounds the history tokens sent per turn (None: unbounded);
+    older turns are then folded into a rolling summary.
     """
 
-    def __init__(self, model: str = "gpt-5-nano-2025-08-07", key_path: str = "openai.key"):
+    def __init__(self, model: str = "gpt-5-nano-2025-08-07", key_path: str = "openai.key",
+                 history_token_budget: int = None, keep_recent_turns: int = 6):
     # def __init__(self, model: str = "gpt-4o", key_path: str = "openai.key"):
 
         super().__init__()
         self.model = model
-        self._load_openai_key(key_path)
-        self.client = OpenAI()
-
-    def _load_openai_key(self, key_path: str):
-        if not os.path.exists(key_path):
-            sys.exit(f"Error: The API key file '{key_path}' was not found.")
-        with open(key_path, "r", encoding="utf-8") as f:
-            api_key = f.read().strip()
-        os.environ["OPENAI_API_KEY"] = api_key
-        print("OpenAI API key loaded successfully.\n")
+        self.key_path = key_path
+        self.client = get_client(key_path)
+        if history_token_budget is not None:
+            self.set_history_manager(HistoryManager(history_token_budget, keep_recent_turns,
+                                                    summariser=make_llm_summariser(self.client, model)))
 
-    def chat(self, utterance: str) -> dict:
-        """
-        Send the dialogue history and the latest user utterance to the LLM,
-        and return the generated response.
-        """
-        # Combine dialogue context
+    def _messages(self, utterance: str) -> list:
+        """Combine the system prompt, dialogue context and the latest user utterance."""
         # messages = []
 
         messages = [{"role": "system",
                      "content": "You are a friendly and knowledgeable Cambridge student who enjoys helping others learn about college life."}]
 
-        for turn in self.conversation_history:
-            role = "assistant" if turn["speaker"] == "assistant" else "user"
-            messages.append({"role": role, "content": turn["utterance"]})
-
+        messages.extend(self.history_messages())
         messages.append({"role": "user", "content": utterance})
+        return messages
+
+    @tracing.turn
+    def chat(self, utterance: str) -> dict:
+        """
+        Send the dialogue history and the latest user utterance to the LLM,
+        and return the generated response.
+        """
+        messages = self._messages(utterance)
 
         # Call the GPT model
-        response = self.client.responses.create(
-            model=self.model,
-            input=messages
-            # temperature=0.3,
-            # max_output_tokens=150,
-            # top_p=0.9
-        )
+        with tracing.span("llm"):
+            response = self.client.responses.create(
+                model=self.model,
+                input=messages
+                # temperature=0.3,
+                # max_output_tokens=150,
+                # top_p=0.9
+            )
 
         reply_text = response.output_text.strip()
 
@@ -59,6 +62,17 @@ class GPTBot(DialogueSystem):
             "text": reply_text
         }
 
+    async def chat_stream(self, utterance: str, result: dict = None):
+        """chat(), streaming the reply token by token from the async client."""
+        # Building the messages may fold old turns into the summary with a blocking LLM call
+        messages = await asyncio.to_thread(self._messages, utterance)
+        parts = []
+        client = get_async_client(self.key_path)
+        async for delta in stream_text(client, self.model, messages, parts):
+            yield delta
+        if result is not None:
+            result["text"] = "".join(parts).strip()
+
 
 if __name__ == "__main__":
     bot = GPTBot()
@@ -0,0 +1,109 @@
+from token_counter import count_tokens
+
+
+def make_llm_summariser(client, model: str, max_summary_tokens: int = 300):
+    """Summariser that asks the LLM to fold new turns into the running summary."""
+    def summarise(previous_summary: str, messages) -> str:
+        transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in messages)
+        prompt = (
+            f"Running summary of the conversation so far:\n{previous_summary or '(empty)'}\n\n"
+            f"Turns to add to the summary:\n{transcript}\n\n"
+            f"Rewrite the running summary so it also covers these turns. Keep names, facts, "
+            f"preferences and open questions. Use at most {max_summary_tokens} tokens."
+        )
+        response = client.responses.create(
+            model=model,
+            input=[{"role": "system", "content": "You summarise conversations concisely and faithfully."},
+                   {"role": "user", "content": prompt}]
+        )
+        return response.output_text.strip()
+
+    return summarise
+
+
+class HistoryManager:
+    """
+    Token-budgeted view of a dialogue history for building prompts.
+
+    Recent turns are kept verbatim; once the history exceeds `token_budget` tokens,
+    the oldest turns are folded into a rolling summary, `fold_batch` turns at a time,
+    so the summary is refreshed every few turns rather than on every turn.
+    The summariser only sees the previous summary and the turns being folded.
+    Without a summariser, folded turns are simply dropped.
+
+    Messages and their token counts are cached between turns, so each call only
+    processes the history entries added since the previous call.
+    """
+
+    def __init__(self, token_budget: int = 2000, keep_recent_turns: int = 6, fold_batch: int = 6,
+                 summariser=None):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.fold_batch = fold_batch
+        self.summariser = summariser
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self._summary_tokens = 0
+        self._summary_message = None
+        self._history = None
+        self._synced = 0
+        self._verbatim = []
+        self._verbatim_tokens = []
+        self._total_tokens = 0
+
+    def _sync(self, history):
+        """Pick up turns appended to `history` since the last call."""
+        if history is not self._history or len(history) < self._synced:
+            self.reset()
+            self._history = history
+        for turn in history[self._synced:]:
+            role = "assistant" if turn["speaker"] == "assistant" else "user"
+            message = {"role": role, "content": turn["utterance"]}
+            tokens = count_tokens(turn["utterance"])
+            self._verbatim.append(message)
+            self._verbatim_tokens.append(tokens)
+            self._total_tokens += tokens
+        self._synced = len(history)
+
+    def _fold(self, count: int):
+        folded = self._verbatim[:count]
+        del self._verbatim[:count]
+        self._total_tokens -= sum(self._verbatim_tokens[:count])
+        del self._verbatim_tokens[:count]
+        if self.summariser is not None:
+            self._set_summary(self.summariser(self.summary, folded))
+
+    def _set_summary(self, summary: str):
+        self.summary = summary
+        self._summary_tokens = count_tokens(summary)
+        self._summary_message = {"role": "system",
+                                 "content": f"Summary of the earlier conversation:\n{summary}"}
+
+    def messages(self, history):
+        """Prompt messages for `history`: an optional summary message followed by the recent turns."""
+        self._sync(history)
+        while len(self._verbatim) > 1 and self._summary_tokens + self._total_tokens > self.token_budget:
+            # Fold a whole batch beyond the recent window, or one turn at a time inside it
+            count = min(self.fold_batch, len(self._verbatim) - self.keep_recent_turns)
+            self._fold(max(1, count))
+
+        prefix = [self._summary_message] if self._summary_message else []
+        return prefix + self._verbatim
+
+    def prompt_tokens(self) -> int:
+        """Tokens of history included in the last built prompt."""
+        return self._summary_tokens + self._total_tokens
+
+    def export_state(self) -> dict:
+        """The rolling summary and how many turns it covers, for load_state() on a rehydrated conversation."""
+        return {"summary": self.summary, "folded_turns": self._synced - len(self._verbatim)}
+
+    def load_state(self, state: dict, history):
+        """Resume from export_state(): turns of `history` after the folded ones are kept verbatim again."""
+        self.reset()
+        self._history = history
+        self._synced = state["folded_turns"]
+        if state["summary"]:
+            self._set_summary(state["summary"])
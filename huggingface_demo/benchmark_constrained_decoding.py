@@ -0,0 +1,56 @@
+import argparse
+import json
+import time
+import numpy as np
+from parsing_models import GelatoParsingModel
+
+
+def run(model, examples, batch_size):
+    """States, per-call latencies, and decode steps/tokens per turn, with `batch_size` dialogues per call."""
+    model.decode_steps = model.generated_tokens = model.malformed_outputs = 0
+    states, latencies = [], []
+    for start in range(0, len(examples), batch_size):
+        sources = [e["source"] for e in examples[start:start + batch_size]]
+        t = time.perf_counter()
+        states.extend(model.predict_sources(sources, batch_size=batch_size))
+        latencies.append(time.perf_counter() - t)
+    calls = len(latencies)
+    return states, 1000 * np.asarray(latencies), model.decode_steps / calls, model.generated_tokens / len(examples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GelatoParsingModel: unconstrained vs catalogue-constrained decoding.")
+    parser.add_argument("--model-path", default="./output/dst_model/checkpoint-best")
+    parser.add_argument("--data", default="dst_data.json")
+    parser.add_argument("--splits", nargs="+", default=["test", "val"])
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N dialogues")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    examples = [example for split in args.splits for example in data[split]][:args.limit]
+
+    models = {"unconstrained": GelatoParsingModel(args.model_path, max_new_tokens=args.max_new_tokens),
+              "constrained": GelatoParsingModel(args.model_path, max_new_tokens=args.max_new_tokens, constrained=True)}
+    gold = [models["unconstrained"].parse_output(e["target"]) for e in examples]
+    print(f"{len(examples)} dialogues from {'/'.join(args.splits)}, max_new_tokens {args.max_new_tokens}\n")
+    print(f"{'decoding':<15} {'batch':>5} {'p50 ms':>9} {'p95 ms':>9} {'steps/call':>11} {'tokens/turn':>12} "
+          f"{'malformed':>10} {'joint acc':>10}")
+
+    for batch_size in args.batch_sizes:
+        results = {}
+        for name, model in models.items():
+            model.predict_sources([examples[0]["source"]])  # warm-up; fills the constraint's token-set cache
+            states, latencies, steps, tokens = run(model, examples, batch_size)
+            results[name] = states
+            accuracy = sum(s == g for s, g in zip(states, gold)) / len(examples)
+            print(f"{name:<15} {batch_size:>5} {np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 95):>9.1f} "
+                  f"{steps:>11.1f} {tokens:>12.1f} {model.malformed_outputs:>10} {accuracy:>10.1%}")
+        agreement = sum(a == b for a, b in zip(results["unconstrained"], results["constrained"])) / len(examples)
+        print(f"{'':<15} {'':>5} same state from both: {agreement:.1%}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import time
+import numpy as np
+from parsing_models import GelatoParsingModel, MicroBatcher
+
+
+def load_sources(data_path, splits, n_requests):
+    """The test/val dialogue contexts, cycled to `n_requests` requests."""
+    with open(data_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    examples = [example for split in splits for example in data[split]]
+    return [examples[i % len(examples)]["source"] for i in range(n_requests)], examples
+
+
+def report(name, elapsed, n, latencies=None):
+    line = f"{name:<40} {n / elapsed:>9.2f} req/s"
+    if latencies is not None:
+        latencies_ms = 1000 * np.asarray(latencies)
+        line += f"   p50 {np.percentile(latencies_ms, 50):>8.1f}ms   p95 {np.percentile(latencies_ms, 95):>8.1f}ms"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GelatoParsingModel throughput/latency: one at a time vs batched vs micro-batched.")
+    parser.add_argument("--model-path", default="./output/dst_model/checkpoint-best")
+    parser.add_argument("--data", default="dst_data.json")
+    parser.add_argument("--splits", nargs="+", default=["test", "val"])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent callers for the micro-batcher")
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    model = GelatoParsingModel(model_path=args.model_path)
+    sources, examples = load_sources(args.data, args.splits, args.requests)
+    model.predict_sources(sources[:2])  # warm-up
+
+    print(f"{len(sources)} requests from {len(examples)} {'/'.join(args.splits)} dialogues\n")
+
+    # --- Baseline: one generate() call per request ---
+    latencies, baseline = [], []
+    start = time.perf_counter()
+    for source in sources:
+        t = time.perf_counter()
+        baseline.extend(model.predict_sources([source]))
+        latencies.append(time.perf_counter() - t)
+    report("one at a time", time.perf_counter() - start, len(sources), latencies)
+
+    # --- Offline batches, length-bucketed ---
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        states = model.predict_sources(sources, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        agreement = sum(a == b for a, b in zip(states, baseline)) / len(sources)
+        report(f"predict_sources, batch {batch_size} ({agreement:.0%} same)", elapsed, len(sources))
+
+    # --- Online: concurrent callers, micro-batched ---
+    batcher = MicroBatcher(model.predict_sources, max_batch_size=max(args.batch_sizes), max_wait_ms=args.max_wait_ms)
+
+    def timed_call(source):
+        t = time.perf_counter()
+        batcher.predict(source)
+        return time.perf_counter() - t
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        latencies = list(pool.map(timed_call, sources))
+    elapsed = time.perf_counter() - start
+    batcher.close()
+    report(f"micro-batched, {args.clients} clients", elapsed, len(sources), latencies)
+    print(f"  mean micro-batch size {np.mean(batcher.batch_sizes):.1f} over {len(batcher.batch_sizes)} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from transformers import AutoTokenizer
+from train_parsing_model import load_tokenized_dataset, run_experiment
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DST training pipeline: dataset caching, and padded vs length-grouped "
+                                                 "batches (samples/sec, time to the same val loss).")
+    parser.add_argument("--model-name", default="google-t5/t5-small")
+    parser.add_argument("--data", default="dst_data.json")
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--eval-steps", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--num-proc", type=int, default=None)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name)
+    cache_dir = tempfile.mkdtemp(prefix="dst_dataset_cache_")
+    try:
+        timings = {}
+        for name, num_proc, cache in [("tokenise, 1 process", 1, os.path.join(cache_dir, "single")),
+                                      (f"tokenise, {args.num_proc or os.cpu_count()} processes", args.num_proc, cache_dir),
+                                      ("load from cache", args.num_proc, cache_dir)]:
+            start = time.perf_counter()
+            dataset = load_tokenized_dataset(tokenizer, args.data, cache, num_proc)
+            timings[name] = time.perf_counter() - start
+
+        lengths = dataset["train"]["length"]
+        print(f"\nTrain sources: {len(lengths)}, {min(lengths)}-{max(lengths)} tokens, mean {sum(lengths) / len(lengths):.0f}")
+        for name, seconds in timings.items():
+            print(f"{name:<28} {seconds:>7.2f}s")
+
+        runs = {}
+        for group_by_length in (False, True):
+            with tempfile.TemporaryDirectory() as output_dir:
+                runs[group_by_length] = run_experiment(
+                    model_name=args.model_name, data_path=args.data, output_dir=output_dir, max_steps=args.max_steps,
+                    batch_size=args.batch_size, learning_rate=args.learning_rate, group_by_length=group_by_length,
+                    num_proc=args.num_proc, cache_dir=cache_dir, eval_steps=args.eval_steps, save_model=False)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # The loss both runs reached: the worse of the two best eval losses
+    target = max(min(loss for _, _, loss in timer.history) for _, timer in runs.values())
+    print(f"\n{'batches':<22} {'samples/s':>10} {'train s':>9} {'best val loss':>14} {f's to val loss {target:.3f}':>22}")
+    for group_by_length, (metrics, timer) in runs.items():
+        name = "length-grouped" if group_by_length else "random (padded)"
+        best = min(loss for _, _, loss in timer.history)
+        print(f"{name:<22} {metrics['train_samples_per_second']:>10.1f} {metrics['train_runtime']:>9.1f} "
+              f"{best:>14.4f} {timer.time_to_loss(target):>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import io
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+import torch
+from parsing_models import GelatoParsingModel, quantized_cache_path
+
+
+def weights_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def peak_rss_mb(model_path, quantize):
+    """
+    Peak resident memory of a fresh process that loads the model and parses one dialogue.
+    Called before this process loads any model: on Linux a child starts from its parent's peak.
+    """
+    code = (f"import resource; from parsing_models import GelatoParsingModel; "
+            f"m = GelatoParsingModel({model_path!r}, quantize={quantize}); "
+            f"m.predict([{{'speaker': 'customer', 'utterance': 'A double scoop please'}}]); "
+            f"print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return int(output.split()[-1]) / 1024  # ru_maxrss is in KiB on Linux
+
+
+def evaluate(model, examples, repeats):
+    """Joint state accuracy and per-request latency (one dialogue per call)."""
+    states = model.predict_sources([e["source"] for e in examples])
+    gold = [model.parse_output(e["target"]) for e in examples]
+    accuracy = sum(s == g for s, g in zip(states, gold)) / len(examples)
+    latencies = []
+    for _ in range(repeats):
+        for example in examples:
+            start = time.perf_counter()
+            model.predict_sources([example["source"]])
+            latencies.append(time.perf_counter() - start)
+    return states, accuracy, 1000 * np.asarray(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs dynamic int8 GelatoParsingModel: accuracy, latency and memory.")
+    parser.add_argument("--model-path", default="./output/dst_model/checkpoint-best")
+    parser.add_argument("--data", default="dst_data.json")
+    parser.add_argument("--splits", nargs="+", default=["test"])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    examples = [example for split in args.splits for example in data[split]]
+    fp32_rss, int8_rss = peak_rss_mb(args.model_path, False), peak_rss_mb(args.model_path, True)
+
+    start = time.perf_counter()
+    fp32 = GelatoParsingModel(args.model_path)
+    fp32_load = time.perf_counter() - start
+    start = time.perf_counter()
+    int8 = GelatoParsingModel(args.model_path, quantize=True)
+    int8_load = time.perf_counter() - start
+    start = time.perf_counter()
+    GelatoParsingModel(args.model_path, quantize=True)
+    int8_cached_load = time.perf_counter() - start
+
+    fp32_states, fp32_accuracy, fp32_ms = evaluate(fp32, examples, args.repeats)
+    int8_states, int8_accuracy, int8_ms = evaluate(int8, examples, args.repeats)
+    agreement = sum(a == b for a, b in zip(fp32_states, int8_states)) / len(examples)
+
+    print(f"{len(examples)} {'/'.join(args.splits)} dialogues, int8 cache: {quantized_cache_path(args.model_path)}\n")
+    print(f"{'':<24} {'fp32':>10} {'int8':>10}")
+    print(f"{'joint accuracy':<24} {fp32_accuracy:>10.1%} {int8_accuracy:>10.1%}   (same state: {agreement:.0%})")
+    print(f"{'latency p50 (ms)':<24} {np.percentile(fp32_ms, 50):>10.1f} {np.percentile(int8_ms, 50):>10.1f}")
+    print(f"{'latency p95 (ms)':<24} {np.percentile(fp32_ms, 95):>10.1f} {np.percentile(int8_ms, 95):>10.1f}")
+    print(f"{'weights (MB)':<24} {weights_mb(fp32.model):>10.1f} {weights_mb(int8.model):>10.1f}")
+    print(f"{'peak RSS, fresh (MB)':<24} {fp32_rss:>10.0f} {int8_rss:>10.0f}")
+    print(f"{'load time (s)':<24} {fp32_load:>10.2f} {int8_cached_load:>10.2f}   (first int8 load, building the cache: {int8_load:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
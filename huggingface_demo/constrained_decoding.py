@@ -0,0 +1,191 @@
+import os
+import sys
+
+
+class _Node:
+    __slots__ = ("edges", "epsilon", "accept")
+
+    def __init__(self, accept=False):
+        self.edges = {}
+        self.epsilon = []
+        self.accept = accept
+
+
+def default_catalogue():
+    """Slot values from gelato_api; flavours also without their " (vegan)" suffix, as in the training data."""
+    try:
+        import gelato_api
+    except ImportError:
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import gelato_api
+    flavours = []
+    for flavour in gelato_api.flavor_colors:
+        flavours += [flavour, flavour.replace(" (vegan)", "")]
+    return list(dict.fromkeys(flavours)), list(gelato_api.SIZES), list(gelato_api.CONTAINERS)
+
+
+def representable_values(tokenizer, values):
+    """
+    Slot values the tokenizer can spell without <unk> (so the model can generate them); a value with
+    a curly apostrophe falls back to a straight one, as in "King's College Lavender" for T5's vocabulary.
+    """
+    kept = []
+    for value in values:
+        for candidate in (value, value.replace("’", "'")):
+            if tokenizer.unk_token_id not in tokenizer(candidate, add_special_tokens=False)["input_ids"]:
+                kept.append(candidate)
+                break
+        else:
+            print(f"Slot value {value!r} cannot be generated by this tokenizer; leaving it out of the grammar.")
+    return list(dict.fromkeys(kept))
+
+
+class StateGrammar:
+    """
+    Character-level automaton (an NFA) for the model's output format
+    "flavours: <f>, <f># size: <s># container: <c>", where every slot value comes
+    from a fixed list and may be empty. States are frozensets of nodes.
+    """
+
+    def __init__(self, flavours, sizes, containers, max_flavours=3):
+        start, after_flavours = _Node(), _Node()
+        self._literal(start, " ", after_flavours)  # SentencePiece output starts with a word boundary
+        start.epsilon.append(after_flavours)
+        flavour_list = _Node()
+        self._literal(after_flavours, "flavours: ", flavour_list)
+
+        # At most `max_flavours` flavours (a Triple Scoop), so the grammar, and decoding, always ends
+        size_slot = _Node()
+        self._literal(flavour_list, "# size: ", size_slot)
+        node = flavour_list
+        for i in range(max_flavours):
+            flavour_end = _Node()
+            node.epsilon.append(self._values(flavours, flavour_end))
+            self._literal(flavour_end, "# size: ", size_slot)
+            if i < max_flavours - 1:
+                node = _Node()
+                self._literal(flavour_end, ", ", node)
+
+        size_end, container_slot = _Node(), _Node(accept=True)
+        size_slot.epsilon += [size_end, self._values(sizes, size_end)]
+        self._literal(size_end, "# container:", container_slot)
+
+        # An empty container may come with or without the trailing space of "container: "
+        container_value = _Node(accept=True)
+        self._literal(container_slot, " ", container_value)
+        container_value.epsilon.append(self._values(containers, _Node(accept=True)))
+
+        self.start = self.closure({start})
+
+    @staticmethod
+    def _literal(node, text, end):
+        for char in text[:-1]:
+            nxt = _Node()
+            node.edges.setdefault(char, []).append(nxt)
+            node = nxt
+        node.edges.setdefault(text[-1], []).append(end)
+
+    @staticmethod
+    def _values(values, end):
+        """A trie of `values` whose complete values continue at `end`; returns its root."""
+        trie = _Node()
+        for value in values:
+            node = trie
+            for char in value:
+                children = node.edges.setdefault(char, [])
+                if not children:
+                    children.append(_Node())
+                node = children[0]
+            if end not in node.epsilon:
+                node.epsilon.append(end)
+        return trie
+
+    @staticmethod
+    def closure(nodes):
+        stack, seen = list(nodes), set(nodes)
+        while stack:
+            for nxt in stack.pop().epsilon:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+    def step(self, state, text):
+        """The state after reading `text`, or an empty set if `text` leaves the grammar."""
+        for char in text:
+            nxt = set()
+            for node in state:
+                nxt.update(node.edges.get(char, ()))
+            if not nxt:
+                return frozenset()
+            state = self.closure(nxt)
+        return state
+
+    @staticmethod
+    def is_complete(state):
+        return any(node.accept for node in state)
+
+
+class GrammarConstraint:
+    """
+    prefix_allowed_tokens_fn for model.generate() that keeps the output inside a StateGrammar.
+    Allowed tokens are found by walking a trie of the vocabulary's surface strings together
+    with the grammar, and memoised per grammar state. Once the grammar is complete, EOS is
+    allowed; once nothing else can follow, EOS is the only choice, so decoding stops there.
+    """
+
+    def __init__(self, tokenizer, grammar):
+        self.grammar = grammar
+        self.eos_token_id = tokenizer.eos_token_id
+        self.pad_token_id = tokenizer.pad_token_id
+        special = set(tokenizer.all_special_ids)
+        self._surfaces = {}
+        self._vocab_trie = {}
+        for token, token_id in tokenizer.get_vocab().items():
+            if token_id in special or token.startswith("<"):
+                continue  # special, unk and byte-fallback tokens never appear in a valid state string
+            surface = token.replace("▁", " ")
+            self._surfaces[token_id] = surface
+            node = self._vocab_trie
+            for char in surface:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(token_id)
+        self._allowed = {}
+        self._states = {}
+
+    def allowed_tokens(self, state):
+        if state not in self._allowed:
+            allowed = []
+            stack = [(self._vocab_trie, state)]
+            while stack:
+                trie, grammar_state = stack.pop()
+                for char, child in trie.items():
+                    if char is None:
+                        allowed.extend(child)
+                        continue
+                    nxt = self.grammar.step(grammar_state, char)
+                    if nxt:
+                        stack.append((child, nxt))
+            if self.grammar.is_complete(state):
+                allowed.append(self.eos_token_id)
+            self._allowed[state] = allowed
+        return self._allowed[state]
+
+    def reset(self):
+        """Forget per-sequence states (call between generate() calls); the per-state token sets are kept."""
+        self._states = {}
+
+    def __call__(self, batch_id, input_ids):
+        prefix = tuple(input_ids.tolist())
+        generated = prefix[1:]  # drop the decoder start token
+        if self.eos_token_id in generated or self.pad_token_id in generated:
+            return [self.pad_token_id, self.eos_token_id]  # finished sequence in a batch
+        state = self._states.get(prefix)
+        if state is None:
+            parent = self._states.get(prefix[:-1]) if generated else None
+            if parent is None:
+                state = self.grammar.step(self.grammar.start, "".join(self._surfaces[t] for t in generated))
+            else:
+                state = self.grammar.step(parent, self._surfaces[generated[-1]])
+            self._states[prefix] = state
+        return self.allowed_tokens(state) or [self.eos_token_id]
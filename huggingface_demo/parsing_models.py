@@ -1,8 +1,46 @@
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForCausalLM
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
 import torch
+try:
+    from constrained_decoding import GrammarConstraint, StateGrammar, default_catalogue, representable_values
+except ImportError:  # imported as huggingface_demo.parsing_models from the repository root
+    from .constrained_decoding import GrammarConstraint, StateGrammar, default_catalogue, representable_values
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+
+def quantized_cache_path(model_path):
+    """Where the int8 copy of a local checkpoint is cached (None for hub model ids)."""
+    if not os.path.isdir(model_path):
+        return None
+    return os.path.join(model_path, f"int8_dynamic_torch{torch.__version__.split('+')[0]}.pt")
+
+
+def load_quantized_model(model_path):
+    """
+    Load a seq2seq checkpoint with dynamic int8 quantisation of its Linear layers, for CPU inference.
+    The quantised model is cached next to the checkpoint and rebuilt when the checkpoint is newer.
+    """
+    cache_path = quantized_cache_path(model_path)
+    if cache_path and os.path.exists(cache_path):
+        weights = [os.path.join(model_path, f) for f in os.listdir(model_path)
+                   if f.endswith((".safetensors", ".bin")) and not f.startswith("int8_")]
+        if all(os.path.getmtime(w) <= os.path.getmtime(cache_path) for w in weights):
+            return torch.load(cache_path, weights_only=False)
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if cache_path:
+        tmp_path = cache_path + ".tmp"
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, cache_path)
+    return model
+
 class ParsingModel():
     def __init__(self):
         pass
@@ -11,11 +49,39 @@ class ParsingModel():
         raise NotImplementedError()
 
 class GelatoParsingModel(ParsingModel):
-    def __init__(self, model_path="google-t5/t5-base"):
+    prefix = "dialogue state tracking"
+
+    def __init__(self, model_path="google-t5/t5-base", max_new_tokens=128, batch_size=16, quantize=False,
+                 constrained=False, catalogue=None):
+        """
+        quantize=True loads a dynamic int8 copy of the model (CPU only), see load_quantized_model.
+        constrained=True restricts decoding to the state grammar with slot values from `catalogue`
+        ((flavours, sizes, containers), default: the gelato_api menu) and stops as soon as the state is complete.
+        """
         super().__init__()
         self.model_path = model_path
+        self.max_new_tokens = max_new_tokens
+        self.batch_size = batch_size
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_path).to(device)
+        if quantize and device != "cpu":
+            print("int8 dynamic quantisation is CPU-only; loading the full-precision model.")
+            quantize = False
+        self.quantized = quantize
+        if quantize:
+            self.model = load_quantized_model(self.model_path)
+        else:
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_path).to(device)
+        self.model.eval()
+
+        self.constraint = None
+        if constrained:
+            flavours, sizes, containers = catalogue or default_catalogue()
+            grammar = StateGrammar(*(representable_values(self.tokenizer, values)
+                                     for values in (flavours, sizes, containers)))
+            self.constraint = GrammarConstraint(self.tokenizer, grammar)
+        self.decode_steps = 0
+        self.generated_tokens = 0
+        self.malformed_outputs = 0
 
     def history_to_string(self, history):
         assert isinstance(history, list)
@@ -39,20 +105,117 @@ class GelatoParsingModel(ParsingModel):
         return state
 
     def predict(self, history):
+        return self.predict_batch([history])[0]
+
+    def predict_batch(self, histories, batch_size=None):
+        """Predict the states of many dialogue histories at once; results are in input order."""
+        return self.predict_sources([self.history_to_string(history) for history in histories], batch_size)
+
+    def predict_sources(self, context_texts, batch_size=None):
+        """
+        Predict states for already flattened histories (the "source" strings of dst_data.json).
+        Inputs are sorted by token length and cut into buckets of `batch_size`, so each
+        padded batch wastes little compute on padding.
+        """
+        batch_size = batch_size or self.batch_size
+        inputs = [self.prefix + " : " + text for text in context_texts]
+        input_ids = self.tokenizer(inputs)["input_ids"]
+        order = sorted(range(len(inputs)), key=lambda i: len(input_ids[i]))
 
-        prefix = "dialogue state tracking"
-        context_text = self.history_to_string(history)
-        inputs = prefix + " : " + context_text
-        model_inputs = self.tokenizer([inputs], return_tensors="pt").to(device)
-        generated_ids = self.model.generate(**model_inputs,  max_new_tokens=512)
-        output = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True)[0]
+        outputs = [None] * len(inputs)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            model_inputs = self.tokenizer.pad({"input_ids": [input_ids[i] for i in bucket]},
+                                              return_tensors="pt").to(device)
+            generate_kwargs = {"max_new_tokens": self.max_new_tokens}
+            if self.constraint is not None:
+                self.constraint.reset()
+                generate_kwargs["prefix_allowed_tokens_fn"] = self.constraint
+            with torch.inference_mode():
+                generated_ids = self.model.generate(**model_inputs, **generate_kwargs)
+            self.decode_steps += generated_ids.shape[1] - 1
+            self.generated_tokens += int((generated_ids[:, 1:] != self.tokenizer.pad_token_id).sum())
+            decoded = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True,
+                                                  clean_up_tokenization_spaces=True)
+            for i, output in zip(bucket, decoded):
+                outputs[i] = output
+        return [self.parse_output(output) for output in outputs]
 
+    def parse_output(self, output):
         try:
             state = self.string_to_state(output)
-        except:
+        except ValueError:
+            # Only unconstrained decoding can produce this (e.g. a truncated or garbled state)
+            self.malformed_outputs += 1
             state = {"flavours": [], "size": "", "container": ""}
         return state
 
+
+class MicroBatcher:
+    """
+    Collects concurrent predict() calls into micro-batches for a batch function,
+    e.g. MicroBatcher(model.predict_batch). A batch is sent as soon as it holds
+    `max_batch_size` requests, or `max_wait_ms` after its first request arrived,
+    whichever comes first. Safe to call from many threads.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=10):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = []
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue one input (e.g. a dialogue history); returns a Future for its result."""
+        future = Future()
+        self._requests.put((item, future))
+        return future
+
+    def predict(self, item):
+        return self.submit(item).result()
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
+
+    def _next_batch(self):
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._requests.put(None)  # finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.predict_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
 if __name__ == '__main__':
     # dst_model = GelatoParsingModel()
     dst_model = GelatoParsingModel(model_path="./output/dst_model/checkpoint-best")
@@ -1,10 +1,17 @@
-import pandas as pd
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, \
-    DataCollatorForSeq2Seq, Seq2SeqTrainer, Seq2SeqTrainingArguments
+    DataCollatorForSeq2Seq, Seq2SeqTrainer, Seq2SeqTrainingArguments, TrainerCallback
 
+import argparse
+import hashlib
 import json
+import os
+import shutil
+import time
 from transformers import set_seed
-from datasets import Dataset, DatasetDict
+from datasets import Dataset, DatasetDict, load_from_disk
+
+prefix = "dialogue state tracking"
+
 
 def load_json_from_file(filename):
     try:
@@ -20,9 +27,95 @@ def save_json_to_file(json_object, file_path):
     with open(file_path, 'w') as file:
         json.dump(json_object, file, indent=4, ensure_ascii=False)
 
-def run_experiment():
 
-    model_name = "google-t5/t5-base"
+def dataset_cache_key(tokenizer, data_path, max_length):
+    """Hash of everything the tokenised dataset depends on: the data file, the tokenizer and the preprocessing."""
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as file:
+        digest.update(file.read())
+    try:
+        digest.update(tokenizer.backend_tokenizer.to_str().encode())
+    except AttributeError:  # slow tokenizer
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    digest.update(f"{type(tokenizer).__name__}|{prefix}|{max_length}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_tokenized_dataset(tokenizer, data_path="dst_data.json", cache_dir="./output/dataset_cache",
+                           num_proc=None, max_length=512):
+    """
+    Tokenised train/val/test splits with a "length" column (source tokens) for length-grouped batching.
+    The Arrow dataset is saved under cache_dir, keyed by dataset_cache_key, and loaded from there on
+    later runs. Tokenisation runs in `num_proc` processes (default: all CPUs).
+    """
+    cache_path = os.path.join(cache_dir, dataset_cache_key(tokenizer, data_path, max_length))
+    if os.path.isdir(cache_path):
+        print(f"Loading tokenised dataset from {cache_path}")
+        return load_from_disk(cache_path)
+
+    processed_data = load_json_from_file(data_path)
+    data_dic = DatasetDict({key: Dataset.from_list(data) for key, data in processed_data.items()})
+    print(data_dic)
+
+    def preprocess_function(examples):
+        inputs = [prefix + " : " + example for example in examples["source"]]
+        targets = [example for example in examples["target"]]
+        model_inputs = tokenizer(inputs, text_target=targets, max_length=int(max_length))
+        model_inputs["length"] = [len(ids) for ids in model_inputs["input_ids"]]
+        return model_inputs
+
+    num_proc = num_proc or os.cpu_count()
+    tokenized_dataset = DatasetDict({
+        # datasets refuses more processes than rows, and the val/test splits are tiny
+        key: data.map(preprocess_function, batched=True, num_proc=max(1, min(num_proc, len(data) // 64)),
+                      remove_columns=data.column_names)
+        for key, data in data_dic.items()
+    })
+
+    tmp_path = cache_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tokenized_dataset.save_to_disk(tmp_path)
+    os.replace(tmp_path, cache_path)
+    print(f"Saved tokenised dataset to {cache_path}")
+    return tokenized_dataset
+
+
+class EvalLossTimer(TrainerCallback):
+    """Records (seconds since training started, step, eval_loss) at every evaluation; optionally stops at a target loss."""
+
+    def __init__(self, target_loss=None):
+        self.target_loss = target_loss
+        self.history = []
+        self.start = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.start = time.perf_counter()
+
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        if not metrics or "eval_loss" not in metrics:
+            return
+        elapsed = time.perf_counter() - self.start
+        self.history.append((elapsed, state.global_step, metrics["eval_loss"]))
+        if self.target_loss is not None and metrics["eval_loss"] <= self.target_loss:
+            print(f"Reached eval loss {metrics['eval_loss']:.4f} <= {self.target_loss} "
+                  f"at step {state.global_step} after {elapsed:.1f}s")
+            control.should_training_stop = True
+
+    def time_to_loss(self, target_loss):
+        """Seconds until the eval loss first reached target_loss, or None."""
+        for elapsed, _, loss in self.history:
+            if loss <= target_loss:
+                return elapsed
+        return None
+
+
+def run_experiment(model_name="google-t5/t5-base", data_path="dst_data.json", output_dir="./output/dst_model",
+                   max_steps=5000, batch_size=32, learning_rate=1e-3, group_by_length=True, num_proc=None,
+                   cache_dir="./output/dataset_cache", eval_steps=None, target_eval_loss=None, save_model=True):
+    """
+    Fine-tune the dialogue state tracking model. Returns the training metrics (including
+    train_samples_per_second) and the EvalLossTimer, whose history has the eval loss over time.
+    """
     set_seed(10086)
 
     tokenizer = AutoTokenizer.from_pretrained(
@@ -30,45 +123,36 @@ def run_experiment():
         max_length = 512
     )
 
-    processed_data = load_json_from_file("dst_data.json")
-
-    for data_key, data in processed_data.items():
-        data = pd.DataFrame.from_dict(data)
-        data = Dataset.from_pandas(data)
-        processed_data[data_key] = data
-    data_dic = DatasetDict(processed_data)
-
-    print(data_dic)
-
-    prefix = "dialogue state tracking"
+    start = time.perf_counter()
+    tokenized_dataset = load_tokenized_dataset(tokenizer, data_path, cache_dir, num_proc)
+    print(f"Dataset ready in {time.perf_counter() - start:.1f}s")
 
     model = AutoModelForSeq2SeqLM.from_pretrained(model_name,
           max_length=512
     )
 
-    def preprocess_function(examples):
-
-        inputs = [prefix + " : " + example for example in examples["source"]]
-        targets = [example for example in examples["target"]]
-        model_inputs = tokenizer(inputs, text_target=targets, max_length=int(512))
-        return model_inputs
-
-    tokenized_dataset = data_dic.map(preprocess_function, batched=True)
-
+    # Pads each batch to its longest example only; with group_by_length those are of similar length
     data_collator = DataCollatorForSeq2Seq(tokenizer=tokenizer, model=model)
 
+    timer = EvalLossTimer(target_eval_loss)
     training_args = Seq2SeqTrainingArguments(
-        output_dir="./output/dst_model",
-        learning_rate=1e-3,
-        per_device_train_batch_size=32,
-        per_device_eval_batch_size=32,
+        output_dir=output_dir,
+        learning_rate=learning_rate,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=batch_size,
         weight_decay=0.01,
         save_total_limit=int(1),
         predict_with_generate=True,
-        max_steps=int(5000),
-        save_steps=int(5000),
-        save_strategy="steps",
+        prediction_loss_only=True,
+        max_steps=int(max_steps),
+        save_steps=int(max_steps),
+        save_strategy="steps" if save_model else "no",
+        eval_strategy="steps" if eval_steps else "no",
+        eval_steps=eval_steps,
+        group_by_length=group_by_length,
+        length_column_name="length",
         push_to_hub=False,
+        report_to="none",
         fp16=False,
         generation_max_length=512
     )
@@ -78,18 +162,39 @@ def run_experiment():
         args=training_args,
         train_dataset=tokenized_dataset["train"],
         eval_dataset=tokenized_dataset["val"],
-        tokenizer=tokenizer,
+        processing_class=tokenizer,
         data_collator=data_collator,
-        callbacks=[]
+        callbacks=[timer]
     )
 
-    trainer.train()
+    metrics = trainer.train().metrics
+    print(f"Training: {metrics['train_samples_per_second']:.1f} samples/s, {metrics['train_runtime']:.1f}s")
 
-    trainer.save_model("./output/dst_model/checkpoint-best")
+    if save_model:
+        trainer.save_model(os.path.join(output_dir, "checkpoint-best"))
+    return metrics, timer
 
 
 def main():
-    run_experiment()
+    parser = argparse.ArgumentParser(description="Fine-tune the T5 dialogue state tracking model.")
+    parser.add_argument("--model-name", default="google-t5/t5-base")
+    parser.add_argument("--data", default="dst_data.json")
+    parser.add_argument("--output-dir", default="./output/dst_model")
+    parser.add_argument("--max-steps", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--no-group-by-length", action="store_true",
+                        help="sample batches at random instead of grouping dialogues of similar length")
+    parser.add_argument("--num-proc", type=int, default=None, help="tokenisation processes (default: all CPUs)")
+    parser.add_argument("--cache-dir", default="./output/dataset_cache")
+    parser.add_argument("--eval-steps", type=int, default=None, help="evaluate on the val split every N steps")
+    parser.add_argument("--target-eval-loss", type=float, default=None, help="stop once the val loss reaches this")
+    args = parser.parse_args()
+
+    run_experiment(model_name=args.model_name, data_path=args.data, output_dir=args.output_dir,
+                   max_steps=args.max_steps, batch_size=args.batch_size, learning_rate=args.learning_rate,
+                   group_by_length=not args.no_group_by_length, num_proc=args.num_proc, cache_dir=args.cache_dir,
+                   eval_steps=args.eval_steps, target_eval_loss=args.target_eval_loss)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+
+
+def _iter_json_array(f, chunk_size: int = 1 << 16):
+    """Lazily yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace and separators, refilling the buffer as needed
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of file while reading JSON array.")
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("Expected a JSON array at the top level.")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            obj, end = None, None
+        if end is not None and not eof and not isinstance(obj, (dict, list)):
+            # A cut-off scalar can still decode ("[0." as 0, "[1e" as 1): it is only complete
+            # once a "," or "]" follows, so until then read more
+            nxt = end
+            while nxt < len(buf) and buf[nxt].isspace():
+                nxt += 1
+            if nxt == len(buf) or buf[nxt] not in ",]":
+                end = None
+        if end is None:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+
+        yield obj
+        buf, pos = buf[end:], 0
+
+
+def iter_records(path: str):
+    """
+    Lazily yield records from either a JSONL file (one JSON value per line)
+    or a file holding a single JSON array. Files ending in `.jsonl` are read as JSONL.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+
+def append_record(f, record):
+    """Write one record as a JSONL line and flush it, so it survives a crash."""
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+def load_completed_ids(path: str, key: str = "dialogue_id"):
+    """
+    Collect the `key` values already written to a JSONL output file.
+    A partially written last line (e.g. after a crash) is truncated away,
+    so that new records can be appended safely.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    good_bytes = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw.decode("utf-8")) if raw.endswith(b"\n") else None
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                record = None
+            if record is None:
+                if f.read(1):
+                    raise ValueError(f"Corrupted record in the middle of {path}")
+                break
+            done.add(record[key])
+            good_bytes += len(raw)
+
+    if good_bytes < os.path.getsize(path):
+        print(f"Truncating incomplete record at the end of {path}")
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    return done
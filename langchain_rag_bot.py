@@ -2,6 +2,7 @@ from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import PromptTemplate
+from openai_clients import load_api_key, get_http_client
 import os, json, sys
 
 
@@ -12,7 +13,8 @@ class LangChainRAGBot:
                  embedding_model="text-embedding-3-small",
                  key_path="openai.key",
                  kb_path="cambridge_knowledge_list.json"):
-        self._load_openai_key(key_path)
+        load_api_key(key_path)
+        http_client = get_http_client(key_path)
 
         if not os.path.exists(kb_path):
             sys.exit(f"Error: The knowledge base '{kb_path}' was not found.")
@@ -21,13 +23,13 @@ class LangChainRAGBot:
         texts = [doc["text"] for doc in knowledge_base]
         print(f"Knowledge base loaded with {len(texts)} entries.\n")
 
-        embeddings = OpenAIEmbeddings(model=embedding_model)
+        embeddings = OpenAIEmbeddings(model=embedding_model, http_client=http_client)
         splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
         docs = splitter.create_documents(texts)
         self.vectorstore = Chroma.from_documents(docs, embeddings)
         self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 3})
 
-        self.llm = ChatOpenAI(model=model_name)
+        self.llm = ChatOpenAI(model=model_name, http_client=http_client)
         self.prompt = PromptTemplate.from_template(
             "You are a helpful Cambridge student. "
             "Answer the question using the context below. "
@@ -41,14 +43,6 @@ class LangChainRAGBot:
 
         print("LangChain RAGBot initialised successfully.\n")
 
-    def _load_openai_key(self, key_path: str):
-        if not os.path.exists(key_path):
-            sys.exit(f"Error: The API key file '{key_path}' was not found.")
-        with open(key_path, "r", encoding="utf-8") as f:
-            api_key = f.read().strip()
-        os.environ["OPENAI_API_KEY"] = api_key
-        print("OpenAI API key loaded successfully.\n")
-
     def chat(self, user_input: str):
         docs = self.retriever.get_relevant_documents(user_input)
         context = "\n".join([d.page_content for d in docs])
@@ -0,0 +1,28 @@
+def percentile(values, q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation between the closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarise(values) -> dict:
+    """Count, mean, p50/p95/p99 and max of a list of measurements."""
+    values = list(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0
+    }
+
+
+def format_summary(name: str, summary: dict, unit: str = "ms") -> str:
+    return (f"{name:<28} n={summary['count']:<6} mean={summary['mean']:.2f}{unit} "
+            f"p50={summary['p50']:.2f}{unit} p95={summary['p95']:.2f}{unit} "
+            f"p99={summary['p99']:.2f}{unit} max={summary['max']:.2f}{unit}")
@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+import time
+from dialogue_system import DialogueSystem
+from fake_openai import FakeBackend, FakeOpenAI, FakeOpenAIServer, Latency
+from latency_stats import summarise, format_summary
+import openai_clients
+from turn_store import ResultMeta
+
+SYNTHETIC_UTTERANCES = [
+    "Hi! I'm planning to visit Cambridge next month.",
+    "Can you tell me a bit about the colleges?",
+    "Which college has the most beautiful gardens?",
+    "What's a Formal Hall?",
+    "Is King's College Chapel open to visitors?",
+    "Where can I go punting?",
+    "Can I have a double scoop of Caramel in a paper cup?",
+    "Actually, make that a cone please.",
+    "Do you have any vegan flavours?",
+    "Thanks, that's all!",
+]
+
+
+def _bot_factories(key_path: str, kb_path: str, gelato_pipeline: str = "sequential"):
+    """Constructors for the bots that can be load-tested; imports are lazy so optional deps stay optional."""
+    def parrot():
+        from parrot_bot import ParrotBot
+        return ParrotBot()
+
+    def gpt():
+        from gpt_bot import GPTBot
+        return GPTBot(key_path=key_path)
+
+    def rag():
+        from rag_bot import RAGBot
+        return RAGBot(key_path=key_path, kb_path=kb_path, embedding_model="fake-embedding")
+
+    def gelato():
+        from gelato_bot import GelatoBot
+        # Images stay in memory, so concurrent sessions don't race on one file
+        return GelatoBot(key_path=key_path, pipeline=gelato_pipeline, image_path=None)
+
+    def langchain():
+        from langchain_rag_bot import LangChainRAGBot
+        return LangChainRAGBot(key_path=key_path, kb_path=kb_path)
+
+    return {"parrot": parrot, "gpt": gpt, "rag": rag, "gelato": gelato, "langchain": langchain}
+
+
+def _run_session(bot, turns: int, utterances, seed: int):
+    """One synthetic conversation; returns (latency_s, cpu_s, ok) per turn, cpu_s being the calling thread's."""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(turns):
+        utterance = rng.choice(utterances)
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            result = bot.chat(utterance)
+            ok = True
+        except Exception:
+            result, ok = None, False
+        samples.append((time.perf_counter() - start, time.thread_time() - cpu_start, ok))
+        if ok and isinstance(bot, DialogueSystem):
+            bot.append_turn("user", utterance)
+            bot.append_turn("assistant", result["text"], meta=ResultMeta(result))
+    return samples
+
+
+def run_load_test(bot_factory, sessions: int = 10, turns: int = 5, utterances=None, seed: int = 0,
+                  quiet: bool = True, backend: FakeBackend = None) -> dict:
+    """
+    Drive `bot_factory()` bots with `sessions` concurrent synthetic conversations of `turns` turns.
+    Reports throughput, turn latency percentiles and the CPU time our own code spends per turn
+    (waiting on the backend does not count, client-side work does). That is the process CPU time
+    of the run per turn, so work on other threads (the speculative reply pool, embedding workers)
+    is included; whatever `backend`'s in-process HTTP server spent is subtracted. The per-turn
+    percentiles only cover the thread that called chat().
+    """
+    utterances = utterances or SYNTHETIC_UTTERANCES
+    sink = open(os.devnull, "w") if quiet else None
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        bot_factory()  # warm-up: imports, KB loading and embedding cache population
+        bots = [bot_factory() for _ in range(sessions)]
+        server_cpu_start = backend.server_cpu_seconds if backend is not None else 0.0
+        start, cpu_start = time.perf_counter(), time.process_time()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(lambda i: _run_session(bots[i], turns, utterances, seed + i),
+                                    range(sessions)))
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        if backend is not None:
+            cpu -= backend.server_cpu_seconds - server_cpu_start
+    if sink is not None:
+        sink.close()
+
+    samples = [s for session in results for s in session]
+    ok = [s for s in samples if s[2]]
+    return {
+        "sessions": sessions,
+        "turns": len(samples),
+        "errors": len(samples) - len(ok),
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": len(ok) / elapsed if elapsed else 0.0,
+        "latency_ms": summarise([1000 * s[0] for s in ok]),
+        "cpu_ms_per_turn": 1000 * cpu / len(samples) if samples else 0.0,
+        "thread_cpu_ms_per_turn": summarise([1000 * s[1] for s in ok]),
+    }
+
+
+def print_report(name: str, report: dict):
+    print(f"\n=== Load test: {name}, {report['sessions']} concurrent sessions ===")
+    print(f"Turns: {report['turns']} ({report['errors']} errors) in {report['elapsed_s']:.2f}s "
+          f"-> {report['throughput_turns_per_s']:.2f} turns/sec")
+    print(format_summary("Turn latency", report["latency_ms"]))
+    print(f"{'Framework CPU per turn':<28} {report['cpu_ms_per_turn']:.2f}ms (process, all threads)")
+    print(format_summary("  on the calling thread", report["thread_cpu_ms_per_turn"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against a simulated OpenAI backend.")
+    parser.add_argument("--bot", default="gpt", choices=["parrot", "gpt", "rag", "gelato", "langchain"])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="http", choices=["http", "inprocess"],
+                        help="localhost HTTP server (exercises the SDK and connection pool) or in-process fake client")
+    parser.add_argument("--gelato-pipeline", default="sequential", choices=["sequential", "speculative"])
+    parser.add_argument("--verbose", action="store_true", help="show the bots' own output")
+    args = parser.parse_args()
+
+    backend = FakeBackend(latency=Latency(args.latency, args.latency_ms), error_rate=args.error_rate, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        # Throwaway key and KB copy, so the real embedding cache is never touched
+        key_path = os.path.join(workdir, "openai.key")
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write("sk-fake-load-test")
+        kb_path = os.path.join(workdir, "knowledge.json")
+        shutil.copy("cambridge_knowledge_list.json", kb_path)
+
+        factory = _bot_factories(key_path, kb_path, args.gelato_pipeline)[args.bot]
+        if args.backend == "inprocess":
+            if args.bot == "langchain":
+                parser.error("LangChain builds its own clients; use --backend http.")
+            openai_clients.set_client(FakeOpenAI(backend))
+            report = run_load_test(factory, args.sessions, args.turns, seed=args.seed, quiet=not args.verbose)
+        else:
+            with FakeOpenAIServer(backend) as server:
+                os.environ["OPENAI_BASE_URL"] = server.base_url
+                os.environ["OPENAI_API_BASE"] = server.base_url  # used by LangChain
+                openai_clients.configure(max_connections=max(100, args.sessions * 2))
+                report = run_load_test(factory, args.sessions, args.turns, seed=args.seed, quiet=not args.verbose,
+                                       backend=backend)
+    finally:
+        openai_clients.reset_clients()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(f"{args.bot} via {args.backend} ({args.latency} {args.latency_ms:.0f}ms, error rate {args.error_rate})", report)
+    print(f"Backend requests: {backend.requests} ({backend.errors} injected errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import threading
+import weakref
+import httpx
+from openai import APIError, OpenAI, AsyncOpenAI
+from response_cache import wrap_client
+
+_lock = threading.Lock()
+_config = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "timeout": 60.0,
+    "connect_timeout": 10.0,
+    "max_retries": 2,
+}
+_api_keys = {}
+_http_clients = {}
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {api_key: AsyncOpenAI}
+_overrides = {}
+
+
+def configure(**options):
+    """
+    Tune the shared connection pool before (or between) uses, e.g.
+    configure(max_connections=200, max_keepalive_connections=50, timeout=30).
+    Existing clients are closed, so the next get_client() call picks up the new settings.
+    """
+    unknown = set(options) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown client options: {sorted(unknown)}")
+    reset_clients()
+    _config.update(options)
+
+
+def load_api_key(key_path: str = "openai.key") -> str:
+    """Read the API key from `key_path` once per process and export it as OPENAI_API_KEY when first read."""
+    with _lock:
+        if key_path not in _api_keys:
+            if not os.path.exists(key_path):
+                sys.exit(f"Error: The API key file '{key_path}' was not found.")
+            with open(key_path, "r", encoding="utf-8") as f:
+                _api_keys[key_path] = f.read().strip()
+            os.environ["OPENAI_API_KEY"] = _api_keys[key_path]
+            print("OpenAI API key loaded successfully.\n")
+        return _api_keys[key_path]
+
+
+def _limits():
+    return httpx.Limits(max_connections=_config["max_connections"],
+                        max_keepalive_connections=_config["max_keepalive_connections"],
+                        keepalive_expiry=_config["keepalive_expiry"])
+
+
+def _timeout():
+    return httpx.Timeout(_config["timeout"], connect=_config["connect_timeout"])
+
+
+def get_http_client(key_path: str = "openai.key") -> httpx.Client:
+    """The shared keep-alive HTTP pool, for libraries that accept an httpx client (e.g. LangChain)."""
+    api_key = load_api_key(key_path)
+    with _lock:
+        if api_key not in _http_clients:
+            _http_clients[api_key] = httpx.Client(limits=_limits(), timeout=_timeout())
+        return _http_clients[api_key]
+
+
+def get_client(key_path: str = "openai.key"):
+    """
+    The process-wide OpenAI client for `key_path`. All bots and the semantic
+    parser share it, and with it one warm keep-alive connection pool.
+    The client is wrapped with the opt-in response cache (see response_cache).
+    """
+    if "sync" in _overrides:
+        return _overrides["sync"]
+    api_key = load_api_key(key_path)
+    http_client = get_http_client(key_path)
+    with _lock:
+        if api_key not in _clients:
+            client = OpenAI(api_key=api_key, http_client=http_client, max_retries=_config["max_retries"])
+            _clients[api_key] = wrap_client(client)
+        return _clients[api_key]
+
+
+def get_async_client(key_path: str = "openai.key"):
+    """
+    The shared AsyncOpenAI client for `key_path` and the running event loop.
+    Async connection pools are tied to a loop, so each loop gets its own client; the registry
+    holds loops weakly, and clients of loops that have been closed are dropped.
+    """
+    if "async" in _overrides:
+        return _overrides["async"]
+    api_key = load_api_key(key_path)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for stale in [other for other in _async_clients.keys() if other.is_closed()]:
+            del _async_clients[stale]  # nothing left to aclose() on; the sockets go with the clients
+        clients = _async_clients.setdefault(loop, {})
+        if api_key not in clients:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            clients[api_key] = AsyncOpenAI(api_key=api_key, http_client=http_client,
+                                           max_retries=_config["max_retries"])
+        return clients[api_key]
+
+
+def _close_async_client(loop, client):
+    """Close an AsyncOpenAI client's connection pool on the loop it belongs to."""
+    if loop.is_closed():
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        loop.create_task(client.close())  # called from a coroutine on that loop: can't wait here
+    elif loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=10)
+    else:
+        loop.run_until_complete(client.close())
+
+
+async def stream_text(client, model: str, input_, parts: list = None):
+    """
+    responses.create(stream=True) on an AsyncOpenAI client, as an async generator of the
+    reply's text deltas. Each delta is also appended to `parts`, so the caller can join the full reply.
+    An `error` or `response.failed` event raises openai.APIError, like a failed non-streaming
+    request, rather than ending the stream as if the reply were complete.
+    """
+    stream = await client.responses.create(model=model, input=input_, stream=True)
+    async for event in stream:
+        if event.type == "response.output_text.delta":
+            if parts is not None:
+                parts.append(event.delta)
+            yield event.delta
+        elif event.type in ("error", "response.failed"):
+            error = event if event.type == "error" else getattr(event.response, "error", None)
+            message = getattr(error, "message", None) or "the model stopped without completing the reply"
+            raise APIError(f"Streamed response failed ({event.type}): {message}", request=None,
+                           body=getattr(event, "model_dump", lambda: None)())
+
+
+def set_client(client=None, async_client=None):
+    """Make get_client()/get_async_client() return the given clients, e.g. fakes for testing."""
+    if client is not None:
+        _overrides["sync"] = client
+    if async_client is not None:
+        _overrides["async"] = async_client
+
+
+def reset_clients():
+    """Close every shared client and drop any overrides."""
+    with _lock:
+        for http_client in _http_clients.values():
+            http_client.close()
+        _http_clients.clear()
+        _clients.clear()
+        async_clients = list(_async_clients.items())
+        _async_clients.clear()
+        _overrides.clear()
+    for loop, clients in async_clients:
+        for client in clients.values():
+            _close_async_client(loop, client)
@@ -1,7 +1,9 @@
 from dialogue_system import DialogueSystem
+import tracing
 
 class ParrotBot(DialogueSystem):
 
+    @tracing.turn
     def chat(self, utterance: str) -> dict:
         return {
             "text": utterance,
@@ -1,19 +1,7 @@
-from openai import OpenAI
-import os
-import sys
+from openai_clients import get_client
 
-def load_openai_key(key_path: str = "openai.key"):
-    if not os.path.exists(key_path):
-        sys.exit(f"Error: The API key file '{key_path}' was not found.")
-
-    with open(key_path, "r", encoding="utf-8") as f:
-        api_key = f.read().strip()
-
-    os.environ["OPENAI_API_KEY"] = api_key
-    print("OpenAI API key loaded successfully.")
-
-def test_openai_api():
-    client = OpenAI()
+def test_openai_api(key_path: str = "openai.key"):
+    client = get_client(key_path)
     response = client.responses.create(
         model="gpt-5-nano-2025-08-07",
         input="Write a one-sentence fun fact about Cambridge."
@@ -24,5 +12,4 @@ def test_openai_api():
     print("----------------------\n")
 
 if __name__ == "__main__":
-    load_openai_key()
     test_openai_api()
@@ -1,29 +1,58 @@
 from dialogue_system import DialogueSystem
-from openai import OpenAI
+from bulk_embedding import embed_in_chunks
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from history_manager import HistoryManager, make_llm_summariser
+from openai_clients import get_client, get_async_client, stream_text
+from vector_index import build_index
+import tracing
 import numpy as np
+import asyncio
 import json
+import logging
 import os
 import sys
 
+logger = logging.getLogger(__name__)
+
 
 class RAGBot(DialogueSystem):
     """
     A retrieval-augmented dialogue agent.
     It retrieves relevant knowledge snippets from a local knowledge base
     using OpenAI's embedding API before generating responses.
+
+    history_token_budget bounds the history tokens sent per turn (None: unbounded);
+    older turns are then folded into a rolling summary.
     """
 
     def __init__(self,
                  model: str = "gpt-5-nano-2025-08-07",
                  embedding_model: str = "text-embedding-3-small",
                  key_path: str = "openai.key",
-                 kb_path: str = "cambridge_knowledge_list.json"):
+                 kb_path: str = "cambridge_knowledge_list.json",
+                 index_backend: str = "exact",
+                 index_params: dict = None,
+                 query_cache: QueryEmbeddingCache = None,
+                 query_cache_size: int = 10000,
+                 query_cache_path: str = None,
+                 embedding_parallelism: int = 4,
+                 history_token_budget: int = None,
+                 keep_recent_turns: int = 6):
         super().__init__()
         self.model = model
         self.embedding_model = embedding_model
+        self.embedding_parallelism = embedding_parallelism
         self.kb_path = kb_path
-        self._load_openai_key(key_path)
-        self.client = OpenAI()
+        self.key_path = key_path
+        self.client = get_client(key_path)
+        if history_token_budget is not None:
+            self.set_history_manager(HistoryManager(history_token_budget, keep_recent_turns,
+                                                    summariser=make_llm_summariser(self.client, model)))
+
+        # --- Query embedding cache (pass one instance to share it between bots) ---
+        if query_cache is None:
+            query_cache = QueryEmbeddingCache(max_size=query_cache_size, path=query_cache_path)
+        self.query_cache = query_cache
 
         # --- Load Knowledge Base ---
         if not os.path.exists(kb_path):
@@ -33,66 +62,86 @@ class RAGBot(DialogueSystem):
         self.doc_texts = [d["text"] for d in self.knowledge_base]
         print(f"Knowledge base loaded with {len(self.doc_texts)} entries.\n")
 
-        # --- Embedding Cache Path ---
-        self.embedding_cache_path = os.path.splitext(kb_path)[0] + "_embeddings.npy"
-
-        # --- Load or Create Embeddings ---
-        if os.path.exists(self.embedding_cache_path):
-            print(f"Loading cached embeddings from {self.embedding_cache_path} ...")
-            self.doc_embeddings = np.load(self.embedding_cache_path)
-        else:
-            print("Computing embeddings for knowledge base ...")
-            self.doc_embeddings = self._embed_texts(self.doc_texts)
-            np.save(self.embedding_cache_path, self.doc_embeddings)
+        # --- Embedding Cache (keyed on embedding model + text) ---
+        self.embedding_cache_path = os.path.splitext(kb_path)[0] + "_embeddings"
+        self.embedding_cache = EmbeddingCache(self.embedding_cache_path, embedding_model)
+
+        # --- Embed only new or changed entries, drop removed ones ---
+        missing = self.embedding_cache.missing(self.doc_texts)
+        if missing:
+            print(f"Computing embeddings for {len(missing)} new or changed entries ...")
+            # Finished chunks go straight into the cache, so an interrupted cold start can resume
+            missing_texts = [self.doc_texts[i] for i in missing]
+            self._embed_texts(missing_texts, on_chunk=self.embedding_cache.add)
             print(f"Embeddings saved to cache: {self.embedding_cache_path}\n")
-
-    def _load_openai_key(self, key_path: str):
-        if not os.path.exists(key_path):
-            sys.exit(f"Error: The API key file '{key_path}' was not found.")
-        with open(key_path, "r", encoding="utf-8") as f:
-            api_key = f.read().strip()
-        os.environ["OPENAI_API_KEY"] = api_key
-        print("OpenAI API key loaded successfully.\n")
-
-    def _embed_texts(self, texts):
-        """Generate embeddings for a list of texts using OpenAI embedding API."""
-        response = self.client.embeddings.create(
-            model=self.embedding_model,
-            input=texts
+        else:
+            print(f"Loaded cached embeddings from {self.embedding_cache_path}\n")
+        self.embedding_cache.prune(self.doc_texts)
+
+        # --- Retrieval index over unit-normalised float32 vectors ---
+        # "exact" is brute-force cosine search; "ivf" is approximate, tuned via index_params["n_probe"]
+        self.index = build_index(
+            self.embedding_cache.matrix(self.doc_texts),
+            backend=index_backend,
+            cache_path=os.path.join(self.embedding_cache_path, f"index_{index_backend}.npz"),
+            fingerprint=self.embedding_cache.fingerprint(self.doc_texts),
+            **(index_params or {})
         )
-        embeddings = [item.embedding for item in response.data]
-        return np.array(embeddings)
 
+    def _embed_texts(self, texts, on_chunk=None):
+        """
+        Generate embeddings for a list of texts using OpenAI embedding API.
+        Large lists are split into chunks that are sent in parallel and retried on failure.
+        """
+        return embed_in_chunks(self.client, self.embedding_model, texts,
+                               parallelism=self.embedding_parallelism, on_chunk=on_chunk)
+
+    @tracing.traced("embed_query")
     def _embed_query(self, query):
-        """Generate embedding for a single query."""
+        """Generate embedding for a single query, served from the query cache when possible."""
+        return self.query_cache.get_or_compute(self.embedding_model, query, self._request_query_embedding)
+
+    def _request_query_embedding(self, query):
         response = self.client.embeddings.create(
             model=self.embedding_model,
             input=[query]
         )
-        return np.array(response.data[0].embedding)
+        return np.array(response.data[0].embedding, dtype=np.float32)
 
+    @tracing.traced("retrieve")
     def retrieve_context(self, query, top_k: int = 3):
         """Retrieve top-k most relevant snippets using cosine similarity."""
         query_emb = self._embed_query(query)
-        scores = np.dot(self.doc_embeddings, query_emb.T) / (
-            np.linalg.norm(self.doc_embeddings, axis=1) * np.linalg.norm(query_emb)
-        )
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        retrieved_texts = [self.doc_texts[i] for i in top_indices]
+        with tracing.span("search"):
+            top_indices, _ = self.index.search(query_emb, top_k)
+        retrieved_texts = [self.doc_texts[i] for i in top_indices[0] if i >= 0]
 
-        print("\nRetrieved Knowledge Snippets:")
-        for i, text in enumerate(retrieved_texts, 1):
-            print(f"[{i}] {text}")
-        print("------------------------------------------------------------\n")
+        if logger.isEnabledFor(logging.INFO):
+            snippets = "\n".join(f"[{i}] {text}" for i, text in enumerate(retrieved_texts, 1))
+            logger.info("Retrieved Knowledge Snippets:\n%s\n%s", snippets, "-" * 60)
 
         return "\n".join(retrieved_texts)
 
-    def chat(self, utterance: str) -> dict:
-        """Main chat logic: retrieve context → generate answer."""
-        # Step 1: Retrieve top relevant snippets
-        retrieved_context = self.retrieve_context(utterance)
-
-        # Step 2: Construct conversation with system prompt
+    def retrieve_batch(self, queries, top_k: int = 3):
+        """
+        Retrieve top-k snippets for many queries at once:
+        one embeddings request and one matrix multiply for the whole batch.
+        Returns a list of snippet lists, one per query.
+        """
+        if not queries:
+            return []
+        query_embs = [self.query_cache.get(self.embedding_model, q) for q in queries]
+        missing = [i for i, emb in enumerate(query_embs) if emb is None]
+        if missing:
+            new_embs = self._embed_texts([queries[i] for i in missing])
+            for i, emb in zip(missing, new_embs):
+                self.query_cache.put(self.embedding_model, queries[i], emb)
+                query_embs[i] = emb
+        top_indices, _ = self.index.search(np.stack(query_embs), top_k)
+        return [[self.doc_texts[i] for i in row if i >= 0] for row in top_indices]
+
+    def _messages(self, utterance: str, retrieved_context: str) -> list:
+        """Construct the conversation with the system prompt and retrieved context."""
         system_prompt = (
             "You are a friendly and knowledgeable Cambridge student who helps "
             "others learn about university life. "
@@ -102,15 +151,24 @@ class RAGBot(DialogueSystem):
         )
 
         messages = [{"role": "system", "content": system_prompt}]
-        for turn in self.conversation_history:
-            role = "assistant" if turn["speaker"] == "assistant" else "user"
-            messages.append({"role": role, "content": turn["utterance"]})
+        messages.extend(self.history_messages())
         messages.append({"role": "user", "content": utterance})
+        return messages
 
-        response = self.client.responses.create(
-            model=self.model,
-            input=messages
-        )
+    @tracing.turn
+    def chat(self, utterance: str) -> dict:
+        """Main chat logic: retrieve context → generate answer."""
+        # Step 1: Retrieve top relevant snippets
+        retrieved_context = self.retrieve_context(utterance)
+
+        # Step 2: Construct conversation with system prompt
+        messages = self._messages(utterance, retrieved_context)
+
+        with tracing.span("llm"):
+            response = self.client.responses.create(
+                model=self.model,
+                input=messages
+            )
 
         reply_text = response.output_text.strip()
 
@@ -119,7 +177,25 @@ class RAGBot(DialogueSystem):
             "retrieved_context": retrieved_context
         }
 
+    def _retrieve_and_build(self, utterance: str):
+        retrieved_context = self.retrieve_context(utterance)
+        return retrieved_context, self._messages(utterance, retrieved_context)
+
+    async def chat_stream(self, utterance: str, result: dict = None):
+        """
+        chat(), streaming the reply token by token. Retrieval and building the messages (which
+        may fold old turns into the summary with a blocking LLM call) run in a worker thread.
+        """
+        retrieved_context, messages = await asyncio.to_thread(self._retrieve_and_build, utterance)
+        parts = []
+        client = get_async_client(self.key_path)
+        async for delta in stream_text(client, self.model, messages, parts):
+            yield delta
+        if result is not None:
+            result.update(text="".join(parts).strip(), retrieved_context=retrieved_context)
+
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     bot = RAGBot()
     bot.start_a_chat()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_MODES = ("read_through", "write_through", "replay")
+
+
+class CacheMissError(RuntimeError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+class CachedResponse:
+    """Minimal stand-in for an OpenAI Response, rebuilt from the cache."""
+
+    def __init__(self, record: dict):
+        self.model = record.get("model")
+        self.output_text = record["output_text"]
+        self.cached = True
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk store of LLM responses.
+    Each entry is a small JSON file named after the hash of the full request
+    (model, input messages and generation parameters). When the store grows
+    beyond `max_bytes`, the least recently used entries are evicted.
+    Temporary files left behind by interrupted writes are swept on start-up and on eviction.
+    """
+
+    stale_tmp_seconds = 3600  # a *.tmp file this old belongs to a write that crashed
+
+    def __init__(self, cache_dir: str = ".llm_cache", max_bytes: int = 512 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._evicting = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sweep_tmp_files()
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(request: dict) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _files(self, suffix: str):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(suffix):
+                    yield os.path.join(root, name)
+
+    def _entries(self):
+        """(mtime, size, path) of every entry; entries deleted meanwhile are skipped."""
+        for path in self._files(".json"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def _sweep_tmp_files(self):
+        cutoff = time.time() - self.stale_tmp_seconds
+        for path in self._files(".tmp"):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            os.utime(path)  # mark as recently used for eviction
+        except FileNotFoundError:
+            return None  # never cached, or evicted (possibly between the read and the utime)
+        except json.JSONDecodeError:
+            return None
+        return record
+
+    def put(self, key: str, record: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete least recently used entries until the store is back under 90% of its budget.
+        The directory scan and the deletes run outside the lock; under it each victim is only
+        renamed aside, so a put() of the same key meanwhile is neither lost nor miscounted.
+        """
+        if not self._evicting.acquire(blocking=False):
+            return  # another thread is already evicting
+        try:
+            entries = sorted(self._entries())
+            target = 0.9 * self.max_bytes
+            victims = []
+            with self._lock:
+                for _, _, path in entries:
+                    if self._total_bytes <= target:
+                        break
+                    victim = f"{path}.evicted.tmp"
+                    try:
+                        size = os.path.getsize(path)
+                        os.replace(path, victim)
+                    except FileNotFoundError:
+                        continue
+                    self._total_bytes -= size
+                    victims.append(victim)
+            for victim in victims:
+                os.remove(victim)
+            self._sweep_tmp_files()
+        finally:
+            self._evicting.release()
+
+
+class _CachedResponses:
+    def __init__(self, responses, cache: ResponseCache, mode: str):
+        self._responses = responses
+        self._cache = cache
+        self._mode = mode
+
+    def create(self, **kwargs):
+        # Streaming responses are not cached
+        if kwargs.get("stream"):
+            return self._responses.create(**kwargs)
+
+        key = self._cache.key(kwargs)
+        if self._mode != "write_through":
+            record = self._cache.get(key)
+            if record is not None:
+                return CachedResponse(record)
+        if self._mode == "replay":
+            raise CacheMissError(f"No cached response for request {key[:12]} (replay mode).")
+
+        response = self._responses.create(**kwargs)
+        self._cache.put(key, {"model": kwargs.get("model"), "output_text": response.output_text})
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._responses, name)
+
+
+class CachedClient:
+    """
+    Wrap an OpenAI client so that `responses.create` goes through a ResponseCache.
+    Modes:
+        read_through  -- serve hits from the cache, call the API and store on a miss
+        write_through -- always call the API and refresh the cache
+        replay        -- serve from the cache only, raise CacheMissError on a miss
+    Everything else (e.g. embeddings) is passed through to the wrapped client.
+    """
+
+    def __init__(self, client, cache: ResponseCache, mode: str = "read_through"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}.")
+        self._client = client
+        self.responses = _CachedResponses(client.responses, cache, mode)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def wrap_client(client):
+    """
+    Opt-in response caching, configured through environment variables:
+        LLM_CACHE_MODE    -- read_through, write_through or replay (unset: no caching)
+        LLM_CACHE_DIR     -- cache directory, default .llm_cache
+        LLM_CACHE_MAX_MB  -- size budget before eviction, default 512
+    All clients wrapped in one process share a single store per directory.
+    """
+    mode = os.environ.get("LLM_CACHE_MODE")
+    if not mode:
+        return client
+    cache_dir = os.environ.get("LLM_CACHE_DIR", ".llm_cache")
+    with _caches_lock:
+        if cache_dir not in _caches:
+            max_bytes = int(float(os.environ.get("LLM_CACHE_MAX_MB", 512)) * 2**20)
+            _caches[cache_dir] = ResponseCache(cache_dir, max_bytes)
+    return CachedClient(client, _caches[cache_dir], mode)
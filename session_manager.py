@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dialogue_system import DialogueSystem
+from turn_store import ResultMeta
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Disk-backed store of evicted conversations: one JSON file per session, written atomically."""
+
+    def __init__(self, directory: str = "sessions"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        # Session ids come from clients; hash them rather than trust them as file names
+        return os.path.join(self.directory, hashlib.sha256(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def save(self, session_id: str, state: dict):
+        path = self._path(session_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"session_id": session_id, "state": state}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, session_id: str):
+        """The saved state, or None for an unknown session."""
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)["state"]
+        except FileNotFoundError:
+            return None
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class _Session:
+    __slots__ = ("bot", "last_used", "busy", "lock", "alock", "loading", "ended")
+
+    def __init__(self, bot=None):
+        self.bot = bot
+        self.last_used = 0.0
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.alock = None  # asyncio.Lock, created by the first chat_stream() turn
+        self.loading = None  # threading.Event while the bot is being created or rehydrated
+        self.ended = False  # end() was called while a turn was running
+
+
+class SessionManager:
+    """
+    Many concurrent conversations on one shared bot engine (one client, knowledge base and index).
+
+    Each session is a DialogueSystem.spawn() of the engine, holding only its own history.
+    Sessions idle for longer than `idle_ttl` seconds, and the least recently used ones beyond
+    `max_active`, are evicted to a SessionStore and rehydrated on their next turn.
+    Thread-safe; turns of the same session run one at a time, different sessions in parallel.
+    The manager lock only guards the session table: a session is loaded and saved outside it,
+    so one session's disk I/O never holds up turns of the others.
+    chat_stream() is the asyncio counterpart of chat(), for serving sessions from one event
+    loop (see chat_server); drive a given session through one of the two, not both at once.
+    """
+
+    def __init__(self, engine: DialogueSystem, store_dir: str = "sessions", max_active: int = 1000,
+                 idle_ttl: float = 1800.0, clock=time.monotonic):
+        self.engine = engine
+        self.store = SessionStore(store_dir)
+        self.max_active = max_active
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._sessions = OrderedDict()  # session_id -> _Session, least recently used first
+        self._saving = {}  # session_id -> _Session evicted from the table, still being written to the store
+        self._lock = threading.Lock()
+        self.created = self.rehydrated = self.evicted = 0
+
+    def _checkout(self, session_id: str) -> _Session:
+        """The session, marked busy; loaded from the store (outside the manager lock) if it isn't in memory."""
+        load = False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                # An evicted session still being saved is taken back rather than read back from disk
+                session = self._saving.pop(session_id, None)
+                if session is not None:
+                    self.evicted -= 1
+                else:
+                    session = _Session()
+                    session.loading = threading.Event()
+                    load = True
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.busy += 1
+            session.last_used = self.clock()
+            loading = session.loading
+            victims = self._select_victims()
+
+        try:
+            if load:
+                self._load(session_id, session)
+            elif loading is not None:
+                loading.wait()  # another thread is loading it
+                if session.bot is None:
+                    raise RuntimeError(f"Session {session_id!r} could not be loaded.")
+        except BaseException:
+            self._release(session_id, session)
+            self._save_victims(victims)
+            raise
+        # Only once the checkout has succeeded: saving other sessions can't fail it (see _save_victims)
+        self._save_victims(victims)
+        return session
+
+    def _load(self, session_id: str, session: _Session):
+        state = None
+        try:
+            bot = self.engine.spawn()
+            state = self.store.load(session_id)
+            if state is not None:
+                bot.load_state(state)
+            session.bot = bot
+        except BaseException:
+            with self._lock:
+                if self._sessions.get(session_id) is session:
+                    del self._sessions[session_id]
+            raise
+        finally:
+            with self._lock:
+                if session.bot is not None:
+                    if state is None:
+                        self.created += 1
+                    else:
+                        self.rehydrated += 1
+                session.loading.set()
+                session.loading = None
+
+    def _release(self, session_id: str, session: _Session):
+        with self._lock:
+            session.busy -= 1
+            session.last_used = self.clock()
+            forget = session.ended and not session.busy
+            if forget and self._sessions.get(session_id) is session:
+                del self._sessions[session_id]
+        if forget:
+            self.store.delete(session_id)
+
+    def _select_victims(self) -> list:
+        """
+        Take idle sessions past their TTL and, LRU first, sessions beyond max_active out of the
+        table; the caller saves them with _save_victims() after releasing the lock. Needs self._lock.
+        """
+        now = self.clock()
+        victims = []
+        for session_id, session in list(self._sessions.items()):
+            over_capacity = len(self._sessions) > self.max_active
+            if not over_capacity and now - session.last_used < self.idle_ttl:
+                break  # everything after this was used more recently
+            if session.busy:
+                continue  # mid-turn (or loading); evicted later
+            del self._sessions[session_id]
+            self._saving[session_id] = session
+            self.evicted += 1
+            victims.append((session_id, session))
+        return victims
+
+    def _save_victims(self, victims):
+        """
+        Write evicted sessions to the store, each under its own lock only. A session that fails
+        to save is logged and put back in the table, to be evicted again later; the others are
+        still written, and the caller (whose turn has nothing to do with them) sees no error.
+        """
+        for session_id, session in victims:
+            try:
+                with session.lock:
+                    self.store.save(session_id, session.bot.export_state())
+            except Exception:
+                logger.exception("Could not save evicted session %r; keeping it in memory", session_id)
+                with self._lock:
+                    if self._saving.get(session_id) is session:
+                        del self._saving[session_id]
+                        self._sessions.setdefault(session_id, session)
+                        self.evicted -= 1
+                continue
+            with self._lock:
+                if self._saving.get(session_id) is session:
+                    del self._saving[session_id]
+                ended = session.ended
+            if ended:
+                self.store.delete(session_id)  # end() ran while it was being written
+
+    def evict_idle(self):
+        """Run the eviction policy now (e.g. from a periodic timer); it also runs on every turn."""
+        with self._lock:
+            victims = self._select_victims()
+        self._save_victims(victims)
+
+    def chat(self, session_id: str, utterance: str) -> dict:
+        """One turn of `session_id`'s conversation; the user and assistant turns are added to its history."""
+        session = self._checkout(session_id)
+        try:
+            with session.lock:
+                result = session.bot.chat(utterance)
+                session.bot.append_turn("user", utterance)
+                session.bot.append_turn("assistant", result["text"], meta=ResultMeta(result))
+        finally:
+            self._release(session_id, session)
+        return result
+
+    async def chat_stream(self, session_id: str, utterance: str, result: dict = None):
+        """
+        chat() as an async generator of reply text deltas (see DialogueSystem.chat_stream).
+        The turns are added to the history once the reply is complete; `result` (if given) is
+        then filled with the chat() result. A stream closed early leaves the history unchanged.
+        """
+        session = await asyncio.to_thread(self._checkout, session_id)  # may rehydrate or evict: disk I/O
+        try:
+            if session.alock is None:
+                session.alock = asyncio.Lock()
+            async with session.alock:
+                turn = {}
+                async for delta in session.bot.chat_stream(utterance, turn):
+                    yield delta
+                with session.lock:
+                    session.bot.append_turn("user", utterance)
+                    session.bot.append_turn("assistant", turn["text"], meta=ResultMeta(turn))
+            if result is not None:
+                result.update(turn)
+        finally:
+            self._release(session_id, session)
+
+    def get_history(self, session_id: str):
+        """The session's history in DialogueSystem.get_history() form (rehydrating it if evicted)."""
+        session = self._checkout(session_id)
+        try:
+            with session.lock:
+                return session.bot.get_history()
+        finally:
+            self._release(session_id, session)
+
+    def end(self, session_id: str):
+        """
+        Forget a conversation, in memory and on disk. A session with a turn in progress is
+        forgotten once its running turns finish, so they are not cut off half-way.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._saving.get(session_id)
+            busy = False
+            if session is not None:
+                session.ended = True
+                busy = session.busy > 0
+                if not busy and self._sessions.get(session_id) is session:
+                    del self._sessions[session_id]
+        if not busy:
+            self.store.delete(session_id)
+
+    def flush(self):
+        """Persist every active session (e.g. before shutdown); they stay active."""
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for session_id, session in sessions:
+            with session.lock:
+                if session.bot is not None and not session.ended:  # None: still loading, nothing new to save
+                    self.store.save(session_id, session.bot.export_state())
+
+    def stats(self) -> dict:
+        return {"active": len(self._sessions), "created": self.created,
+                "rehydrated": self.rehydrated, "evicted": self.evicted}
@@ -0,0 +1,28 @@
+import io
+import json
+import pytest
+from jsonl_io import _iter_json_array
+
+DOCUMENTS = [
+    "[]",
+    "[0.1]",
+    "[0.1, {}]",
+    "[1e5, -2.5E-3, 10, 0]",
+    '[true, false, null, "a, ]", 3.25]',
+    ' [ {"a": [1, 2.0e1]}, [0.5, "x"], -0.0 , 7 ] ',
+    '[{"dialogue_id": "d1", "turns": ["hi", "bye"]}, 123456789.125, "\\u00e9"]',
+]
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_every_chunk_size_matches_json_loads(document):
+    expected = json.loads(document)
+    for chunk_size in range(1, len(document) + 2):
+        assert list(_iter_json_array(io.StringIO(document), chunk_size)) == expected, chunk_size
+
+
+@pytest.mark.parametrize("document", ["[0.", "[1, 2", '[{"a": 1}'])
+def test_truncated_file_raises(document):
+    for chunk_size in range(1, len(document) + 2):
+        with pytest.raises(ValueError):
+            list(_iter_json_array(io.StringIO(document), chunk_size))
@@ -0,0 +1,169 @@
+import contextvars
+import functools
+import os
+import time
+from latency_stats import summarise
+
+_enabled = os.environ.get("TRACE_STAGES", "") not in ("", "0")
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+def enable(on: bool = True):
+    """Turn stage tracing on or off process-wide (also set by TRACE_STAGES=1 in the environment)."""
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class Span:
+    """One timed stage; its children are the stages that ran inside it."""
+    __slots__ = ("name", "start", "seconds", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+        self.seconds = 0.0
+        self.children = []
+
+    def stages(self) -> dict:
+        """Milliseconds per stage path, e.g. {"turn": 812.0, "turn/retrieve": 95.1, "turn/retrieve/embed_query": 90.3}.
+        A stage that ran more than once in the span (e.g. two LLM calls) is summed."""
+        stages = {}
+        pending = [(self, self.name)]
+        while pending:
+            span, path = pending.pop()
+            stages[path] = stages.get(path, 0.0) + 1000 * span.seconds
+            pending.extend((child, f"{path}/{child.name}") for child in span.children)
+        return stages
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, name: str):
+        self.span = Span(name)
+
+    def __enter__(self) -> Span:
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self.span)
+        self.token = _current.set(self.span)
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, *exc):
+        self.span.seconds = time.perf_counter() - self.span.start
+        _current.reset(self.token)
+        return False
+
+
+class _NoSpan:
+    """What span() returns while tracing is off: entering and leaving it does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """
+    Time a stage of the current turn: `with tracing.span("retrieve"): ...`.
+    Spans nest through contextvars, so they follow the turn across function calls and
+    asyncio tasks (see in_context() for thread pools). Free apart from one flag check when tracing is off.
+    """
+    return _SpanContext(name) if _enabled else _NO_SPAN
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _SpanContext(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def turn(chat):
+    """
+    Decorator for a bot's chat(): runs it as the root "turn" span and adds the stage
+    timings to the result as result["stages_ms"] (see Span.stages), so they end up in the turn's meta.
+    """
+    @functools.wraps(chat)
+    def wrapper(self, *args, **kwargs):
+        if not _enabled or _current.get() is not None:
+            return chat(self, *args, **kwargs)  # tracing off, or a chat() nested in another turn
+        with _SpanContext("turn") as root:
+            result = chat(self, *args, **kwargs)
+        if isinstance(result, dict):
+            result["stages_ms"] = root.stages()
+        return result
+    return wrapper
+
+
+def in_context(fn):
+    """`fn` bound to the current context, so spans it opens on another thread nest under the current one."""
+    if not _enabled:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class StageStats:
+    """Aggregates the stages_ms of many turns: per-stage percentiles and folded stacks for flame graphs."""
+
+    def __init__(self):
+        self.samples = {}  # stage path -> [ms per turn]
+        self.turns = 0
+
+    def add(self, stages_ms: dict):
+        self.turns += 1
+        for path, ms in stages_ms.items():
+            self.samples.setdefault(path, []).append(ms)
+
+    def summary(self) -> dict:
+        return {path: summarise(values) for path, values in sorted(self.samples.items())}
+
+    def format(self) -> str:
+        lines = [f"{'stage':<36} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total s':>9}"]
+        for path, s in self.summary().items():
+            depth = path.count("/")
+            label = "  " * depth + path.rsplit("/", 1)[-1]
+            lines.append(f"{label:<36} {s['count']:>7} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f} "
+                         f"{s['mean'] * s['count'] / 1000:>9.2f}")
+        return "\n".join(lines)
+
+    def folded(self) -> list:
+        """
+        Folded stacks ("turn;retrieve;embed_query <self time in us>"), the input format of
+        flamegraph.pl and speedscope. Self time is a stage's total minus its children's; stages
+        that overlapped their siblings (e.g. the speculative Gelato reply) can exceed their parent
+        and are then clamped at zero.
+        """
+        totals = {path: sum(values) for path, values in self.samples.items()}
+        children = {}
+        for path, total in totals.items():
+            if "/" in path:
+                parent = path.rsplit("/", 1)[0]
+                children[parent] = children.get(parent, 0.0) + total
+        lines = []
+        for path, total in sorted(totals.items()):
+            self_us = int(1000 * max(0.0, total - children.get(path, 0.0)))
+            if self_us:
+                lines.append(f"{path.replace('/', ';')} {self_us}")
+        return lines
+
+    def write_folded(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded()) + "\n")
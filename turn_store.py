@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+from datetime import datetime
+from jsonl_io import append_record
+
+
+class Turn:
+    """
+    One dialogue turn, stored compactly: an epoch timestamp, an interned speaker string and
+    no per-turn dict. Meta is kept as given (a dict, or a zero-argument callable that builds
+    it, see ResultMeta) and only materialised when read.
+    Supports the old dict-style access (turn["speaker"], turn.get("meta")), so code written
+    against the {"timestamp", "speaker", "utterance", "meta"} dicts keeps working.
+    """
+    __slots__ = ("created", "speaker", "utterance", "_meta")
+    KEYS = ("timestamp", "speaker", "utterance", "meta")
+
+    def __init__(self, speaker: str, utterance: str, meta=None, created: float = None):
+        self.created = time.time() if created is None else created
+        self.speaker = sys.intern(speaker)
+        self.utterance = utterance
+        self._meta = meta or None
+
+    @property
+    def meta(self) -> dict:
+        if callable(self._meta):
+            self._meta = self._meta() or None
+        return self._meta or {}
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.created).strftime("%H:%M:%S")  # e.g. "10:20:02"
+
+    def __getitem__(self, key):
+        if key not in self.KEYS or (key == "meta" and not self.meta):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS and (key != "meta" or bool(self.meta))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def to_dict(self) -> dict:
+        """The turn in the original get_history() shape."""
+        turn = {"timestamp": self.timestamp, "speaker": self.speaker, "utterance": self.utterance}
+        if self.meta:
+            turn["meta"] = self.meta
+        return turn
+
+    def to_record(self) -> dict:
+        """The turn as a JSONL history record, with the full epoch time."""
+        record = {"time": self.created, "speaker": self.speaker, "utterance": self.utterance}
+        if self.meta:
+            record["meta"] = self.meta
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict):
+        return cls(record["speaker"], record["utterance"], record.get("meta"), record["time"])
+
+    def __repr__(self):
+        return f"Turn({self.speaker!r}, {self.utterance!r}, timestamp={self.timestamp!r})"
+
+
+class ResultMeta:
+    """Lazy meta for a chat() result: everything but "text", built only when a turn's meta is read."""
+    __slots__ = ("result",)
+
+    def __init__(self, result: dict):
+        self.result = result
+
+    def __call__(self) -> dict:
+        return {k: v for k, v in self.result.items() if k != "text"}
+
+
+class JsonlHistorySink:
+    """
+    Append-only JSONL history file: each turn is written once, as it happens, so persisting a
+    conversation costs O(1) per turn instead of rewriting the whole history.
+    Every record is flushed to the OS; with fsync_every=N the file is also fsynced every N
+    turns (and on close), trading a bounded window of turns lost on power failure for fewer fsyncs.
+    Read it back with jsonl_io.iter_records and Turn.from_record.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.turns_written = 0
+        self._unsynced = 0
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, turn: Turn):
+        append_record(self._file, turn.to_record())
+        self.turns_written += 1
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.fsync_every and self._unsynced:
+            self.sync()
+        self._file.close()
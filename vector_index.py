@@ -0,0 +1,184 @@
+import os
+import numpy as np
+
+
+def normalise(vectors):
+    """Return the vectors as unit-length float32 rows."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k: int):
+    """
+    Indices of the k highest scores in each row, best first.
+    Uses argpartition, so only the k winners are fully sorted.
+    """
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class ExactIndex:
+    """
+    Exact cosine-similarity search over a fixed set of document vectors.
+    Vectors are normalised to float32 once at build time, so each query
+    costs a single matrix product.
+    """
+
+    def __init__(self, vectors):
+        self.vectors = normalise(vectors)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k: int = 3):
+        """
+        Score one query vector or a (num_queries, dim) matrix of them.
+        Returns (indices, scores), both of shape (num_queries, k).
+        """
+        queries = normalise(np.atleast_2d(queries))
+        scores = queries @ self.vectors.T
+        indices = top_k(scores, k)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def _assign(vectors, centroids, batch_size: int = 65536):
+    """Index of the most similar centroid for every (unit-length) vector."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        block = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(vectors, n_lists: int, n_iter: int, rng):
+    """Spherical k-means: centroids are kept unit-length, similarity is the dot product."""
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[non_empty] = normalise(sums)
+        # Re-seed empty lists with random points so every list stays usable
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Approximate cosine-similarity search with an inverted-file (IVF) layout.
+    A k-means coarse quantiser splits the documents into `n_lists` clusters;
+    a query only scores the documents in its `n_probe` closest clusters.
+    `n_probe` is the recall/latency knob: n_probe == n_lists is exact search.
+    """
+
+    def __init__(self, vectors, n_lists: int = None, n_probe: int = 8, n_iter: int = 20,
+                 max_train_size: int = None, seed: int = 0, centroids=None, assignments=None):
+        vectors = normalise(vectors)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+        self.n_probe = n_probe
+
+        if centroids is None:
+            rng = np.random.default_rng(seed)
+            max_train_size = max_train_size or 64 * n_lists
+            sample = vectors
+            if len(vectors) > max_train_size:
+                sample = vectors[rng.choice(len(vectors), max_train_size, replace=False)]
+            centroids = _kmeans(sample, n_lists, n_iter, rng)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        if assignments is None:
+            assignments = _assign(vectors, self.centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int64)
+
+        # Store the vectors grouped by list, so each list is one contiguous block
+        self.order = np.argsort(self.assignments, kind="stable")
+        self.vectors = vectors[self.order]
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k: int = 3):
+        """
+        Same contract as ExactIndex.search. Rows are padded with index -1
+        when the probed lists hold fewer than k documents.
+        """
+        queries = normalise(np.atleast_2d(queries))
+        probes = top_k(queries @ self.centroids.T, self.n_probe)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for row, (query, lists) in enumerate(zip(queries, probes)):
+            spans = [(self.offsets[l], self.offsets[l + 1]) for l in lists]
+            positions = np.concatenate([np.arange(a, b) for a, b in spans])
+            if len(positions) == 0:
+                continue
+            candidate_scores = np.concatenate([self.vectors[a:b] @ query for a, b in spans])
+            best = top_k(candidate_scores[None, :], k)[0]
+            indices[row, :len(best)] = self.order[positions[best]]
+            scores[row, :len(best)] = candidate_scores[best]
+        return indices, scores
+
+    def save(self, path: str, fingerprint: str = ""):
+        """Persist the quantiser and list assignments; the vectors live in the embedding cache."""
+        np.savez(path, centroids=self.centroids, assignments=self.assignments,
+                 fingerprint=np.array(fingerprint))
+
+    @classmethod
+    def load(cls, path: str, vectors, fingerprint: str = "", n_lists: int = None, **params):
+        """
+        Rebuild an index from `path`, or return None if the saved quantiser does not fit
+        (different dimension or number of lists). If the documents changed since it was
+        saved, the trained centroids are reused and only the list assignments are recomputed.
+        """
+        with np.load(path) as saved:
+            centroids = saved["centroids"]
+            assignments = saved["assignments"]
+            saved_fingerprint = str(saved["fingerprint"])
+        if centroids.shape[1] != np.shape(vectors)[1] or (n_lists and n_lists != len(centroids)):
+            return None
+        if saved_fingerprint != fingerprint or len(assignments) != len(vectors):
+            assignments = None
+        return cls(vectors, centroids=centroids, assignments=assignments, **params)
+
+
+INDEX_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_index(vectors, backend: str = "exact", cache_path: str = None, fingerprint: str = "", **params):
+    """
+    Build a retrieval index over `vectors` with the given backend.
+    Backends with trained state (IVF) are loaded from / saved to `cache_path` when given;
+    `fingerprint` identifies the document set the saved state was built for.
+    """
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}', expected one of {sorted(INDEX_BACKENDS)}.")
+    index_cls = INDEX_BACKENDS[backend]
+    if index_cls is ExactIndex:
+        return ExactIndex(vectors)
+
+    index = None
+    if cache_path and os.path.exists(cache_path):
+        index = index_cls.load(cache_path, vectors, fingerprint, **params)
+    if index is None:
+        index = index_cls(vectors, **params)
+    if cache_path:
+        index.save(cache_path, fingerprint)
+    return index